@@ -110,7 +110,7 @@ echo ""
 # 测试安装
 echo "🧪 测试安装..."
 source venv/bin/activate
-if python3 -c "import yaml, schedule, requests, PIL; print('✅ 所有依赖模块导入成功')"; then
+if python3 -c "import yaml, requests, PIL; print('✅ 所有依赖模块导入成功')"; then
     echo "✅ 安装测试通过"
 else
     echo "❌ 安装测试失败，请检查依赖"
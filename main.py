@@ -7,44 +7,544 @@ AI识别总结工具主程序
 import os
 import sys
 import time
-import yaml
-import schedule
 import logging
 import signal
 from datetime import datetime, date, time as dt_time
-from threading import Thread, Event
+from threading import Thread, Event, RLock
 
 # 添加src目录到路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from screenshot_capture import ScreenshotCapture
-from ollama_client import OllamaClient
-from database_manager import DatabaseManager
+# 注意: PIL、requests等较重的依赖只在需要时导入，
+# 保证 --stats / --today 这类查询命令能够快速启动
+
+def load_config(config_path):
+    """加载配置文件"""
+    import yaml
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        return config
+    except Exception as e:
+        print(f"加载配置文件失败: {e}")
+        sys.exit(1)
+
+def print_stats(db_manager):
+    """打印统计信息和今日总结"""
+    print("\n📈 活动统计")
+    print("="*40)
+    
+    stats = db_manager.get_activity_stats()
+    if stats:
+        print(f"📅 统计周期: 最近{stats['period_days']}天")
+        print(f"📊 总活动次数: {stats['total_activities']}")
+        print(f"🗓️ 活跃天数: {stats['active_days']}")
+        print(f"📈 日均活动: {stats['avg_activities_per_day']}")
+        if stats['most_active_day']:
+            print(f"🔥 最活跃日期: {stats['most_active_day']} ({stats['most_active_day_count']}次)")
+    
+    # 显示今日总结
+    today = date.today()
+    summary = db_manager.get_daily_summary(today)
+    if summary:
+        print(f"\n📋 今日总结 ({today})")
+        print("="*40)
+        print(summary['summary'])
+    
+    print()
+
+def print_today(db_manager, recent=5):
+    """打印今日活动数量、最近的活动和今日总结"""
+    today = date.today()
+    print(f"\n📅 今日活动 ({today})")
+    print("="*40)
+    print(f"📊 活动记录: {db_manager.get_activity_count_by_date(today)} 条")
+    tracked_minutes = db_manager.get_tracked_seconds_by_date(today) // 60
+    if tracked_minutes:
+        print(f"⏱️ 记录时长: {tracked_minutes // 60}小时{tracked_minutes % 60}分钟")
+    
+    activities = db_manager.get_activities_by_date(today)[-recent:]
+    for activity in activities:
+        print(f"  {str(activity['timestamp'])[11:16]}  {activity['description'][:60]}")
+    
+    summary = db_manager.get_daily_summary(today)
+    if summary:
+        print(f"\n📋 今日总结")
+        print("="*40)
+        print(summary['summary'])
+    else:
+        print("\n今日暂无总结，可运行 python3 main.py --summary 生成")
+    print()
+
+def open_read_only_db(config):
+    """
+    打开只读的数据来源: 追踪器运行时走本地查询服务，
+    否则以只读方式打开数据库（不创建目录、不执行建表），数据库不存在时返回None
+    """
+    from query_client import open_query_backend
+    return open_query_backend(config)
+
+def print_period_summary(summary):
+    """打印周/月汇总"""
+    from rollup import PERIOD_NAMES
+    name = PERIOD_NAMES[summary['period_type']]
+    print(f"\n{'='*50}")
+    print(f"📊 {name}度总结 ({summary['period_start']} ~ {summary['period_end']}，共{summary['day_count']}天)")
+    print(f"{'='*50}")
+    print(summary['summary'])
+    print(f"{'='*50}\n")
+
+def run_export(config, args):
+    """流式导出活动记录和每日总结"""
+    from database_manager import DatabaseManager, EXPORT_COLUMNS
+    from exporter import Exporter
+    
+    if args.incremental and (args.from_date or args.to_date):
+        print("❌ --incremental 不能与 --from/--to 同时使用：增量导出按上次导出的位置继续，日期范围外的记录会被永久跳过")
+        return
+    
+    if not os.path.exists(config['storage']['database']):
+        print("暂无活动数据，请先启动追踪器")
+        return
+    
+    exporter = Exporter(config, DatabaseManager(config, read_only=True))
+    tables = list(EXPORT_COLUMNS) if args.table == 'all' else [args.table]
+    for table in tables:
+        output_path = args.output
+        # 导出多张表时 --output 表示输出目录
+        if output_path and len(tables) > 1:
+            output_path = os.path.join(output_path, os.path.basename(
+                exporter.default_output_path(table, args.format, args.incremental)))
+        result = exporter.export(
+            table, args.format, output_path,
+            start_date=date.fromisoformat(args.from_date) if args.from_date else None,
+            end_date=date.fromisoformat(args.to_date) if args.to_date else None,
+            incremental=args.incremental
+        )
+        if result is None:
+            print(f"❌ 导出 {table} 失败，详见日志")
+        elif result[0] is None:
+            print(f"✅ {table}: 没有新增记录")
+        else:
+            print(f"✅ {table}: {result[1]} 行 -> {result[0]}")
+
+def parse_date_range(args, default_days=7):
+    """--from/--to 指定的日期范围，默认截至今天的最近default_days天"""
+    from datetime import timedelta
+    end_date = date.fromisoformat(args.to_date) if args.to_date else date.today()
+    start_date = date.fromisoformat(args.from_date) if args.from_date else end_date - timedelta(days=default_days - 1)
+    return start_date, end_date
+
+PERIOD_LABELS = {'day': '天', 'week': '周', 'month': '月'}
+
+def format_hours(seconds):
+    return f"{(seconds or 0) / 3600:.1f}h"
+
+def print_breakdown(db_manager, start_date, end_date, period, top=10):
+    """打印日期范围内各类别和应用的时长"""
+    rows = db_manager.get_time_breakdown(start_date, end_date, 'total')
+    print(f"\n⏱️ 时间分布 ({start_date} ~ {end_date})")
+    print("="*40)
+    if not rows:
+        print("该范围内没有活动时间段")
+        return
+    
+    categories = {}
+    applications = {}
+    for row in rows:
+        category = row['category'] or '未分类'
+        categories[category] = categories.get(category, 0) + row['seconds']
+        if row['application']:
+            applications[row['application']] = applications.get(row['application'], 0) + row['seconds']
+    total = sum(categories.values())
+    print(f"📊 总时长: {format_hours(total)}")
+    for category, seconds in sorted(categories.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {category:<8} {format_hours(seconds):>7}  {seconds * 100 / max(total, 1):5.1f}%")
+    if applications:
+        print("\n🧰 应用")
+        for application, seconds in sorted(applications.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {application:<20} {format_hours(seconds):>7}")
+    
+    if period != 'total':
+        print(f"\n📅 按{PERIOD_LABELS[period]}")
+        periods = {}
+        for row in db_manager.get_time_breakdown(start_date, end_date, period):
+            bucket = periods.setdefault(row['period'], {})
+            category = row['category'] or '未分类'
+            bucket[category] = bucket.get(category, 0) + row['seconds']
+        for label, bucket in periods.items():
+            parts = '  '.join(f"{category} {format_hours(seconds)}"
+                              for category, seconds in sorted(bucket.items(), key=lambda item: item[1], reverse=True))
+            print(f"  {label}  {parts}")
+    print()
+
+def print_range_stats(stats, shades=' ░▒▓█'):
+    """打印范围统计和星期×小时热力图"""
+    from analytics import WEEKDAYS
+    if not stats:
+        print("获取统计数据失败，详见日志")
+        return
+    print(f"\n📈 活动统计 ({stats['start_date']} ~ {stats['end_date']}，共{stats['days']}天)")
+    print("="*40)
+    if not stats.get('total_seconds'):
+        print("该范围内没有活动记录")
+        return
+    print(f"⏱️ 总时长: {format_hours(stats['total_seconds'])}")
+    print(f"🗓️ 活跃天数: {stats['active_days']}，日均 {format_hours(stats['avg_seconds_per_active_day'])}")
+    busiest = stats['busiest_day']
+    print(f"🔥 最活跃日期: {busiest['date']} ({format_hours(busiest['seconds'])})")
+    print(f"🕘 最活跃时段: {stats['peak_hour']}:00 - {stats['peak_hour'] + 1}:00")
+    print(f"🔗 连续活跃: 当前 {stats['current_streak']} 天，最长 {stats['longest_streak']} 天")
+    
+    print("\n🌡️ 热力图（行: 星期，列: 0-23点）")
+    peak = max(max(row) for row in stats['heatmap']) or 1
+    print("     " + ''.join(str(hour % 10) for hour in range(24)))
+    for weekday, row in zip(WEEKDAYS, stats['heatmap']):
+        cells = ''.join(shades[min(len(shades) - 1, -(-seconds * (len(shades) - 1) // peak))] for seconds in row)
+        print(f"  {weekday}  {cells}")
+    
+    print("\n🏷️ 类别")
+    for category, seconds in stats['categories'].items():
+        print(f"  {category:<8} {format_hours(seconds):>7}  {seconds * 100 / stats['total_seconds']:5.1f}%")
+    trend = stats['category_trend']
+    if len(trend) > 1:
+        print("\n📅 每周趋势")
+        for week, categories in trend.items():
+            parts = '  '.join(f"{category} {format_hours(seconds)}"
+                              for category, seconds in sorted(categories.items(), key=lambda item: item[1], reverse=True))
+            print(f"  {week}  {parts}")
+    print()
+
+def run_classify(config, args):
+    """分类尚未分类的历史记录，--force 时先清除范围内已有的分类"""
+    from database_manager import DatabaseManager
+    from classifier import ActivityClassifier
+    
+    db_manager = DatabaseManager(config)
+    ollama_client = None
+    if config.get('classification', {}).get('llm_fallback', True):
+        from ollama_client import OllamaClient
+        ollama_client = OllamaClient(config)
+    classifier = ActivityClassifier(config, ollama_client)
+    
+    if args.force:
+        start_date = date.fromisoformat(args.from_date) if args.from_date else None
+        end_date = date.fromisoformat(args.to_date) if args.to_date else None
+        print(f"已清除 {db_manager.reset_classifications(start_date, end_date)} 条分类结果")
+    total = 0
+    while True:
+        count = classifier.classify_pending(db_manager)
+        if not count:
+            break
+        total += count
+        print(f"  已分类 {total} 条...")
+    stats = classifier.get_stats()
+    print(f"✅ 分类完成: {total} 条（规则 {stats['rule_hits']}，模型 {stats['llm_hits']}，未知 {stats['unknown']}）")
+    if ollama_client is not None:
+        ollama_client.encoder.shutdown()
+
+def run_migrate_descriptions(config):
+    """把已有的活动记录原地转换为描述字典存储，按配置压缩长期未出现的描述，最后整理数据库文件"""
+    from database_manager import DatabaseManager
+    from description_codec import zstd_available
+    
+    db_manager = DatabaseManager(config)
+    size_before = os.path.getsize(db_manager.db_path)
+    converted = db_manager.migrate_descriptions(progress=lambda count: print(f"  已转换 {count} 条..."))
+    if converted < 0:
+        print("❌ 迁移中断，详见日志；再次运行会从未转换的记录继续")
+        return False
+    
+    compress_after_days = config.get('descriptions', {}).get('compress_after_days', 0)
+    if compress_after_days and zstd_available():
+        print(f"  已压缩 {db_manager.compress_descriptions(compress_after_days)} 条超过{compress_after_days}天未出现的描述")
+    elif compress_after_days:
+        print("  未安装zstandard，跳过压缩（pip install zstandard）")
+    
+    db_manager.vacuum()
+    stats = db_manager.get_description_stats()
+    size_after = os.path.getsize(db_manager.db_path)
+    print(f"✅ 迁移完成: 转换 {converted} 条记录，{stats.get('references', 0)} 条记录共引用 "
+          f"{stats.get('unique_descriptions', 0)} 条不同描述（其中 {stats.get('compressed', 0)} 条已压缩）")
+    print(f"   数据库文件: {size_before / 1024 / 1024:.1f}MB -> {size_after / 1024 / 1024:.1f}MB")
+    return True
+
+def run_soak_test(config_path, ticks):
+    """
+    内存浸泡测试: 用合成截图和模拟的Ollama服务连续执行完整的分析流程，检查内存不随运行时间增长
+    数据写入临时目录，结束后删除
+    返回: 是否通过
+    """
+    import shutil
+    import tempfile
+    import yaml
+    from soak import StubOllamaServer, SyntheticFrames, SoakRunner, soak_config
+    
+    config = load_config(config_path)
+    work_dir = tempfile.mkdtemp(prefix='activity_tracker_soak_')
+    server = StubOllamaServer(config['ollama']['model'])
+    server.start()
+    tracker = None
+    try:
+        soak_path = os.path.join(work_dir, 'config.yaml')
+        with open(soak_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(soak_config(config, work_dir, server.url), f, allow_unicode=True)
+        
+        tracker = ActivityTracker(soak_path)
+        # 用合成截图代替屏幕截图，其余流程与实际运行相同
+        tracker.screenshot_capture.get_screenshot_for_analysis = SyntheticFrames().next_frame
+        runner = SoakRunner(
+            tracker.analyze_current_activity, ticks,
+            tolerance_mb=config.get('memory', {}).get('soak_tolerance_mb', 16),
+            watchdog=tracker.memory_watchdog
+        )
+        passed, _ = runner.run()
+        print(f"模拟服务共收到 {server.requests} 次分析请求（{server.bytes_received / 1024 / 1024:.1f}MB）")
+        return passed
+    finally:
+        if tracker is not None:
+            tracker.image_encoder.shutdown()
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def ingest_config(config):
+    """分析节点的配置: 多客户端记录写入单独的数据库"""
+    import copy
+    
+    config = copy.deepcopy(config)
+    storage = config['storage']
+    storage['database'] = config.get('ingest', {}).get('database', os.path.join(storage['data_dir'], 'ingest.db'))
+    return config
+
+def wait_for_signal(stop_event):
+    """阻塞直到收到SIGINT/SIGTERM"""
+    def handler(signum, frame):
+        logging.getLogger(__name__).info(f"接收到信号 {signum}，准备停止...")
+        stop_event.set()
+    
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+    while not stop_event.wait(1):
+        pass
+
+def run_ingest_server(config_path):
+    """分析节点模式: 接收采集端上传的截图，用本机Ollama分析后写入多客户端数据库"""
+    from ollama_client import OllamaClient
+    from database_manager import DatabaseManager
+    from ingest_server import IngestServer
+    from logging_setup import setup_logging, shutdown_logging
+    
+    config = ingest_config(load_config(config_path))
+    setup_logging(config)
+    ollama_client = OllamaClient(config)
+    server = IngestServer(config, ollama_client, DatabaseManager(config))
+    if not server.start():
+        return False
+    
+    print(f"\n🚀 分析节点已启动: http://{server.host}:{server.port}")
+    print(f"🗄️ 记录写入 {config['storage']['database']}")
+    print("按 Ctrl+C 停止运行\n")
+    try:
+        wait_for_signal(Event())
+    finally:
+        server.stop()
+        ollama_client.encoder.shutdown()
+        shutdown_logging()
+    return True
+
+def run_agent(config_path):
+    """轻量采集端模式: 只截图、去重并上传到分析节点"""
+    from capture_agent import CaptureAgent
+    from logging_setup import setup_logging, shutdown_logging
+    
+    config = load_config(config_path)
+    setup_logging(config)
+    agent = CaptureAgent(config)
+    stop_event = Event()
+    
+    def handler(signum, frame):
+        agent.logger.info(f"接收到信号 {signum}，准备停止...")
+        stop_event.set()
+        agent.stop()
+    
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+    print(f"\n🚀 采集端 {agent.client_id} 已启动，上传到 {agent.server_url}")
+    print("按 Ctrl+C 停止运行\n")
+    try:
+        agent.run(stop_event)
+    finally:
+        shutdown_logging()
+
+def run_ingest_test(config_path, agents, ticks=30):
+    """
+    多客户端接入测试: 在本机启动模拟的Ollama服务和分析节点，多个采集端线程并发上传合成截图，
+    检查每个客户端的帧都被分析并写入各自的记录
+    返回: 是否通过
+    """
+    import shutil
+    import secrets
+    import tempfile
+    from soak import StubOllamaServer, SyntheticFrames, soak_config
+    from ollama_client import OllamaClient
+    from database_manager import DatabaseManager
+    from image_encoder import ImageEncoder
+    from ingest_server import IngestServer
+    from capture_agent import CaptureAgent
+    from logging_setup import setup_logging, shutdown_logging
+    
+    config = load_config(config_path)
+    work_dir = tempfile.mkdtemp(prefix='activity_tracker_ingest_')
+    stub = StubOllamaServer(config['ollama']['model'])
+    stub.start()
+    config = soak_config(config, work_dir, stub.url)
+    config['ingest'] = dict(config.get('ingest', {}), host='127.0.0.1', port=0,
+                            token=secrets.token_hex(16), database=f"{work_dir}/ingest.db")
+    config = ingest_config(config)
+    setup_logging(config)
+    
+    encoder = ImageEncoder(config)
+    ollama_client = OllamaClient(config, encoder)
+    server = IngestServer(config, ollama_client, DatabaseManager(config))
+    try:
+        if not server.start():
+            print("❌ 分析节点启动失败")
+            return False
+        
+        clients = []
+        for index in range(agents):
+            agent_config = dict(config, agent=dict(
+                config.get('agent', {}),
+                server_url=f"http://127.0.0.1:{server.port}",
+                client_id=f"agent-{index + 1}",
+                token=config['ingest']['token'],
+                spool_dir=f"{work_dir}/agent_spool_{index + 1}"
+            ))
+            # 每个画面连续出现3次，覆盖只上传哈希的重复帧；各采集端画面相同，覆盖跨客户端的分析缓存
+            frames = SyntheticFrames(size=(960, 600), repeat=3)
+            clients.append(CaptureAgent(agent_config, frames.next_frame, encoder))
+        
+        print(f"🧪 多客户端接入测试: {agents} 个采集端，每个上传 {ticks} 帧")
+        start = time.time()
+        
+        def upload(agent):
+            for _ in range(ticks):
+                agent.tick()
+        
+        threads = [Thread(target=upload, args=(agent,)) for agent in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        idle = server.wait_idle(timeout=120)
+        
+        status = server.get_status()
+        stats = {row['client_id']: row for row in server.db_manager.get_client_stats(date.today())}
+        passed = idle
+        for agent in clients:
+            client = status['clients'].get(agent.client_id, {})
+            row = stats.get(agent.client_id, {'activities': 0, 'tracked_seconds': 0})
+            sent = agent.stats['uploaded'] + agent.stats['hash_only']
+            handled = client.get('analyzed', 0) + client.get('cached', 0) + client.get('extended', 0)
+            ok = (agent.stats['captured'] == ticks and agent.stats['spooled'] == 0
+                  and handled == sent and row['activities'] > 0)
+            passed = passed and ok
+            print(
+                f"  {'✅' if ok else '❌'} {agent.client_id}: 上传 {agent.stats['uploaded']} 帧 + 哈希 {agent.stats['hash_only']} 帧，"
+                f"分析 {client.get('analyzed', 0)} / 缓存命中 {client.get('cached', 0)} / 延长 {client.get('extended', 0)}，"
+                f"记录 {row['activities']} 条，时长 {row['tracked_seconds']} 秒"
+            )
+        print(
+            f"{'✅' if passed else '❌'} 用时 {time.time() - start:.1f}s，模拟服务收到 {stub.requests} 次分析请求，"
+            f"分析缓存 {status['cache']}"
+        )
+        return passed
+    finally:
+        server.stop()
+        encoder.shutdown()
+        stub.stop()
+        shutdown_logging()
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 class ActivityTracker:
     def __init__(self, config_path='config.yaml'):
         """初始化活动追踪器"""
         # 加载配置
-        self.config = self._load_config(config_path)
-        
-        # 设置日志
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('activity_tracker.log'),
-                logging.StreamHandler()
-            ]
-        )
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        
+        from screenshot_capture import ScreenshotCapture
+        from ollama_client import OllamaClient
+        from database_manager import DatabaseManager
+        from frame_spool import FrameSpool, CatchUpWorker
+        from image_encoder import ImageEncoder
+        from preflight import PreflightChecker
+        from query_server import QueryServer
+        from rollup import RollupBuilder
+        from sessionizer import Sessionizer
+        from scheduler import Scheduler
+        from logging_setup import setup_logging
+        from memory_watchdog import MemoryWatchdog
+        from classifier import ActivityClassifier
+        from analytics import Analytics
+        
+        # 设置日志: 写入文件和控制台都在单独的监听线程中完成
+        setup_logging(self.config)
         self.logger = logging.getLogger(__name__)
         
         # 初始化组件
-        self.screenshot_capture = ScreenshotCapture(self.config)
-        self.ollama_client = OllamaClient(self.config)
+        # 截图、分析和离线缓存共用一个编码进程池
+        self.image_encoder = ImageEncoder(self.config)
+        self.screenshot_capture = ScreenshotCapture(self.config, self.image_encoder)
+        self.ollama_client = OllamaClient(self.config, self.image_encoder)
         self.db_manager = DatabaseManager(self.config)
         
+        # 离线帧缓存: Ollama不可用时暂存截图，恢复后补录
+        self.frame_spool = FrameSpool(self.config, self.image_encoder)
+        self.catchup_worker = CatchUpWorker(
+            self.config,
+            self.frame_spool,
+            self.ollama_client.is_available,
+            self.ollama_client.analyze_screenshot,
+            self._record_catchup
+        )
+        self.last_catchup = None
+        
+        # 启动预检（并发执行，结果跨追踪器实例缓存）
+        self.preflight = PreflightChecker(self.config, self.ollama_client, self.screenshot_capture)
+        self.available_models = None
+        
+        # 活动时间段: 实时采样和补录帧各自按时间顺序合并
+        self.sessionizer = Sessionizer(self.config, self.db_manager)
+        self.catchup_sessionizer = Sessionizer(self.config, self.db_manager, resume=False)
+        
+        # 周/月汇总: 由每日总结分层生成
+        self.rollup = RollupBuilder(self.config, self.ollama_client, self.db_manager)
+        
+        # 活动分类: 后台把新记录归类为（应用, 类别），规则匹配不到时问文本模型
+        self.classifier = ActivityClassifier(self.config, self.ollama_client)
+        
+        # 定时任务调度器（单调时钟，截图分析、总结和清理在各自的执行器中运行）
+        self.scheduler = Scheduler(self.config)
+        
+        # 范围统计与热力图: 基于增量更新的按小时汇总表
+        self.analytics = Analytics(self.config, self.db_manager)
+        
+        # 本地查询服务: 命令行和GUI通过它读取数据，不再各自打开数据库
+        self.query_server = QueryServer(self.config, self.db_manager, self.get_live_metrics, self.analytics)
+        
+        # 内存监控: 定期报告各组件的内存占用，超出预算时释放缓存
+        self.memory_watchdog = MemoryWatchdog(self.config)
+        self.memory_watchdog.register('encoder_pool', self.image_encoder.get_pooled_bytes, self.image_encoder.release_buffers)
+        self.memory_watchdog.register('query_cache', self.query_server.cache.get_size, self.query_server.cache.clear)
+        
+        # 配置热加载: 新配置在两次截图分析之间整体切换
+        self.config_lock = RLock()
+        self.config_watcher = None
+        
         # 运行状态
         self.running = False
+        self.started_at = None
         self.stop_event = Event()
         
         # 记录上一次分析结果，避免重复记录相同活动
@@ -53,45 +553,50 @@ class ActivityTracker:
         
         self.logger.info("活动追踪器初始化完成")
     
-    def _load_config(self, config_path):
-        """加载配置文件"""
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-            return config
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
-            sys.exit(1)
-    
     def analyze_current_activity(self):
         """分析当前活动"""
+        # 持有配置锁，保证一次分析中使用的模型、提示词和存储路径来自同一份配置
+        with self.config_lock:
+            self._analyze_current_activity()
+    
+    def _analyze_current_activity(self):
+        image = None
         try:
             # 捕获截图
+            captured_at = datetime.now()
             image = self.screenshot_capture.get_screenshot_for_analysis()
             if not image:
                 self.logger.warning("截图捕获失败，跳过本次分析")
                 return
             
-            # AI分析
-            analysis = self.ollama_client.analyze_screenshot(image)
+            # AI分析，必须在下一次截图之前结束，避免任务堆积
+            analysis = self.ollama_client.analyze_screenshot(image, deadline=self._capture_deadline())
             if not analysis:
-                self.logger.warning("AI分析失败，跳过本次记录")
+                # 后端不可用或过载时写入离线缓存，恢复后按原始时间补录
+                if self.frame_spool.put(image, captured_at):
+                    self.logger.warning("AI分析失败，截图已写入离线缓存等待补录")
+                    self.catchup_worker.wake()
+                else:
+                    self.logger.warning("AI分析失败，跳过本次记录")
                 return
             
-            # 检查是否与上次分析结果相似，避免重复记录
+            # 检查是否与上次分析结果相似，避免重复记录（相似的采样仍计入当前活动时间段）；
+            # 画面哈希只在开启模型路由时由路由计算，关闭时不为此额外处理整屏像素
+            router = self.ollama_client.router
+            frame_hash = router.last_frame_hash if router.enabled else None
             if self._is_similar_activity(analysis):
                 self.logger.debug("活动与上次相似，跳过记录")
+                self.sessionizer.observe(analysis, captured_at, frame_hash=frame_hash)
                 return
             
-            # 保存截图（如果配置要求）
+            # 保存截图（如果配置要求），直接复用分析用的那一帧
             screenshot_path = None
             if self.config['screenshot']['save_screenshots']:
-                screenshot_path, success = self.screenshot_capture.capture_screenshot()
-                if not success:
-                    screenshot_path = None
+                screenshot_path = self.screenshot_capture.save_image(image, captured_at)
             
             # 存储到数据库
-            success = self.db_manager.add_activity(analysis, screenshot_path)
+            success = self.db_manager.add_activity(analysis, screenshot_path, timestamp=captured_at)
+            self.sessionizer.observe(analysis, captured_at, screenshot_path, frame_hash)
             if success:
                 self.logger.info(f"新活动记录: {analysis[:100]}...")
                 self.last_analysis = analysis
@@ -99,6 +604,42 @@ class ActivityTracker:
             
         except Exception as e:
             self.logger.error(f"分析活动时出错: {str(e)}")
+        finally:
+            # 立即释放整屏像素，不等垃圾回收
+            if image is not None:
+                image.close()
+    
+    def _capture_deadline(self):
+        """本次分析的截止时刻: 下一次截图时刻减去写库等收尾工作预留的时间"""
+        next_run = self.scheduler.next_run('capture')
+        now = time.monotonic()
+        if next_run is None or next_run <= now:
+            # 不是由调度器触发（手动分析）时按截图间隔计算
+            next_run = now + self.config['screenshot']['interval_minutes'] * 60
+        return next_run - self.config['ollama'].get('deadline_margin', 2)
+    
+    def _record_catchup(self, analysis, captured_at, frame_path):
+        """保存补录帧的分析结果，使用原始截图时间"""
+        # 与上一条补录结果比较，避免补录时产生重复记录
+        if self.last_catchup:
+            last_analysis, last_time = self.last_catchup
+            if (0 <= (captured_at - last_time).total_seconds() < 300
+                    and self._calculate_similarity(analysis, last_analysis) > 0.8):
+                self.logger.debug("补录活动与上一条相似，跳过记录")
+                self.catchup_sessionizer.observe(analysis, captured_at)
+                return
+        
+        screenshot_path = None
+        if self.config['screenshot']['save_screenshots']:
+            screenshot_path = os.path.join(
+                self.screenshot_capture.screenshots_dir,
+                f"screenshot_{captured_at.strftime('%Y%m%d_%H%M%S')}.jpg"
+            )
+            os.replace(frame_path, screenshot_path)
+        
+        if self.db_manager.add_activity(analysis, screenshot_path, timestamp=captured_at):
+            self.last_catchup = (analysis, captured_at)
+        self.catchup_sessionizer.observe(analysis, captured_at, screenshot_path)
     
     def _is_similar_activity(self, current_analysis):
         """判断当前分析结果是否与上次相似"""
@@ -141,8 +682,9 @@ class ActivityTracker:
             
             self.logger.info(f"开始生成 {today} 的每日总结，共 {len(activities)} 条活动记录")
             
-            # 使用AI生成总结
-            summary = self.ollama_client.generate_daily_summary(activities)
+            # 使用AI生成总结，优先使用合并后的活动时间段（包含被去重的采样，条数也少得多）
+            spans = self.db_manager.get_spans_by_date(today)
+            summary = self.ollama_client.generate_daily_summary(spans or activities)
             if summary:
                 # 保存总结
                 success = self.db_manager.save_daily_summary(today, summary)
@@ -157,49 +699,91 @@ class ActivityTracker:
                     self.logger.error("每日总结保存失败")
             else:
                 self.logger.error("每日总结生成失败")
+            
+            # 周期最后一天顺带生成本周/本月汇总
+            if self.config.get('rollup', {}).get('auto', True):
+                for period_summary in self.rollup.build_completed_periods(today):
+                    print_period_summary(period_summary)
+            
+            # 输出模型冷/热启动统计
+            self.ollama_client.models.log_metrics()
                 
         except Exception as e:
             self.logger.error(f"生成每日总结时出错: {str(e)}")
     
     def setup_schedule(self):
         """设置定时任务"""
-        # 设置截图和分析的定时任务
+        from scheduler import Job
+        
+        catch_up = self.config.get('scheduler', {}).get('catch_up', {})
+        
+        # 截图分析任务，启动时立即执行一次；错过的截图无法补拍，默认跳过
         interval = self.config['screenshot']['interval_minutes']
-        schedule.every(interval).minutes.do(self.analyze_current_activity)
+        self.scheduler.add_job(Job(
+            'capture', self.analyze_current_activity, 'capture',
+            interval=interval * 60, catch_up=catch_up.get('capture', 'skip'), run_immediately=True
+        ))
         
-        # 设置每日总结任务
+        # 每日总结任务，错过时（例如设定时间处于休眠）补跑一次
         summary_time = self.config['summary']['daily_summary_time']
-        schedule.every().day.at(summary_time).do(self.generate_daily_summary)
+        self.scheduler.add_job(Job(
+            'summary', self.generate_daily_summary, 'summary',
+            at=summary_time, catch_up=catch_up.get('summary', 'once')
+        ))
+        
+        # 数据清理任务（每周执行一次）
+        self.scheduler.add_job(Job(
+            'cleanup', self.db_manager.cleanup_old_data, 'maintenance',
+            interval=7 * 24 * 3600, catch_up=catch_up.get('cleanup', 'once')
+        ))
         
-        # 设置数据清理任务（每周执行一次）
-        schedule.every().week.do(self.db_manager.cleanup_old_data)
+        # 活动分类任务，每次处理一批尚未分类的记录
+        self.scheduler.add_job(Job(
+            'classify', lambda: self.classifier.classify_pending(self.db_manager), 'maintenance',
+            interval=self.classifier.interval, catch_up='skip'
+        ))
+        
+        # 按小时汇总任务，只重算有新时间段的日期
+        self.scheduler.add_job(Job(
+            'analytics', self.analytics.refresh, 'maintenance',
+            interval=self.analytics.refresh_interval, catch_up='skip'
+        ))
+        
+        # 内存检查任务，错过的检查没有意义
+        self.scheduler.add_job(Job(
+            'memory', self.memory_watchdog.check, 'maintenance',
+            interval=self.memory_watchdog.interval, catch_up='skip'
+        ))
         
         self.logger.info(f"定时任务已设置: 每{interval}分钟分析一次，每天{summary_time}生成总结")
     
     def check_dependencies(self):
         """检查依赖是否满足"""
         self.logger.info("检查系统依赖...")
+        results = self.preflight.run()
         
         # 检查Ollama连接
-        if not self.ollama_client.test_connection():
-            self.logger.error("无法连接到Ollama服务")
-            print("\n❌ Ollama连接失败！")
-            print("请确保:")
-            print("1. Ollama已安装并运行")
-            print("2. 已下载llava模型: ollama pull llava")
-            print("3. Ollama服务运行在 http://localhost:11434")
-            return False
+        ollama_result = results['ollama']
+        self.available_models = ollama_result.details.get('models')
+        if not ollama_result.ok:
+            if self.frame_spool.enabled and self.available_models is None:
+                # 连接不上时照常截图，等Ollama恢复后补录；模型未安装则补录也不会成功，直接退出
+                self.logger.warning(f"{ollama_result.message}，截图将写入离线缓存")
+                print("\n⚠️ Ollama暂不可用，截图会先缓存到本地，服务恢复后自动补录")
+            else:
+                self.logger.error(ollama_result.message)
+                print("\n❌ Ollama连接失败！")
+                print("请确保:")
+                print("1. Ollama已安装并运行")
+                print("2. 已下载llava模型: ollama pull llava")
+                print("3. Ollama服务运行在 http://localhost:11434")
+                return False
         
         # 检查截图权限（macOS）
-        try:
-            test_image = self.screenshot_capture.get_screenshot_for_analysis()
-            if test_image is None:
-                self.logger.error("截图功能测试失败")
-                print("\n❌ 截图权限不足！")
-                print("请在 系统偏好设置 > 安全性与隐私 > 隐私 > 屏幕录制 中添加终端权限")
-                return False
-        except Exception as e:
-            self.logger.error(f"截图测试失败: {str(e)}")
+        if not results['capture'].ok:
+            self.logger.error(results['capture'].message)
+            print("\n❌ 截图权限不足！")
+            print("请在 系统偏好设置 > 安全性与隐私 > 隐私 > 屏幕录制 中添加终端权限")
             return False
         
         self.logger.info("✅ 所有依赖检查通过")
@@ -210,6 +794,9 @@ class ActivityTracker:
         if not self.check_dependencies():
             return False
         
+        # 在后台预加载视觉模型（复用预检得到的模型列表），不阻塞启动
+        Thread(target=self.ollama_client.preload_models, args=(self.available_models,), daemon=True).start()
+        
         # 设置定时任务
         self.setup_schedule()
         
@@ -218,55 +805,125 @@ class ActivityTracker:
         signal.signal(signal.SIGTERM, self._signal_handler)
         
         self.running = True
+        self.started_at = time.time()
+        self.query_server.start()
+        
+        # 监视配置文件，修改后自动热加载
+        reload_config = self.config.get('reload', {})
+        if reload_config.get('enabled', True):
+            from config_watcher import ConfigWatcher
+            self.config_watcher = ConfigWatcher(self.config_path, self.apply_config, reload_config.get('interval', 2))
+            self.config_watcher.start()
+        
+        # 启动补录线程，处理上次运行遗留或离线期间缓存的帧
+        self.catchup_worker.start()
         
         print("\n🚀 AI活动追踪器已启动")
         print(f"📸 每{self.config['screenshot']['interval_minutes']}分钟自动截图分析")
         print(f"📊 每天{self.config['summary']['daily_summary_time']}生成总结")
         print("按 Ctrl+C 停止运行\n")
         
-        # 立即执行一次分析
-        self.analyze_current_activity()
-        
-        # 主循环
+        # 主循环: 睡到下一个任务到期，截图分析任务启动时立即执行一次
         try:
-            while self.running and not self.stop_event.is_set():
-                schedule.run_pending()
-                time.sleep(1)
+            self.scheduler.run(self.stop_event)
         except KeyboardInterrupt:
             pass
         
+        if self.config_watcher:
+            self.config_watcher.stop()
+        self.scheduler.log_metrics()
+        self.scheduler.shutdown()
+        self.catchup_worker.stop()
+        self.query_server.stop()
+        self.image_encoder.shutdown()
         self.logger.info("活动追踪器已停止")
         return True
     
+    def get_live_metrics(self):
+        """返回追踪器的实时运行指标，供本地查询服务使用"""
+        return {
+            'running': self.running,
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0,
+            'last_analysis': self.last_analysis,
+            'last_analysis_time': self.last_analysis_time,
+            'spool_pending': len(self.frame_spool.pending()) if self.frame_spool.enabled else 0,
+            'router': self.ollama_client.router.get_stats() if self.ollama_client.router.enabled else None,
+            'models': self.ollama_client.models.get_metrics(),
+            'backends': self.ollama_client.pool.get_status(),
+            'calls': self.ollama_client.get_call_metrics(),
+            'jobs': self.scheduler.get_metrics(),
+            'memory': self.memory_watchdog.get_metrics(),
+            'classifier': self.classifier.get_stats(),
+            'analytics': self.analytics.get_stats(),
+        }
+    
+    def apply_config(self, new_config):
+        """
+        热加载配置（已由ConfigWatcher校验），应用到运行中的各组件，无需重启
+        """
+        from config_watcher import changed_sections, RESTART_SECTIONS
+        from sessionizer import Sessionizer
+        from rollup import RollupBuilder
+        
+        sections = changed_sections(self.config, new_config)
+        if not sections:
+            return
+        old_config = self.config
+        
+        # 等待进行中的截图分析结束后整体切换
+        with self.config_lock:
+            self.screenshot_capture.apply_config(new_config)
+            self.ollama_client.apply_config(new_config)
+            if self.db_manager.apply_config(new_config):
+                # 数据库切换后从新数据库续接活动时间段
+                self.sessionizer = Sessionizer(new_config, self.db_manager)
+                self.catchup_sessionizer = Sessionizer(new_config, self.db_manager, resume=False)
+            else:
+                self.sessionizer.apply_config(new_config)
+                self.catchup_sessionizer.apply_config(new_config)
+            self.rollup = RollupBuilder(new_config, self.ollama_client, self.db_manager)
+            self.memory_watchdog.apply_config(new_config)
+            self.classifier.apply_config(new_config)
+            self.analytics.apply_config(new_config)
+            self.config = new_config
+        
+        if 'logging' in sections:
+            import logging_setup
+            logging_setup.apply_config(new_config)
+        
+        # 调整定时任务，已排程的下一次执行按新设置重新计算
+        interval = new_config['screenshot']['interval_minutes']
+        if interval != old_config['screenshot']['interval_minutes']:
+            self.scheduler.reschedule('capture', interval=interval * 60)
+        summary_time = new_config['summary']['daily_summary_time']
+        if summary_time != old_config['summary']['daily_summary_time']:
+            self.scheduler.reschedule('summary', at=summary_time)
+        if self.classifier.interval != old_config.get('classification', {}).get('interval', 300):
+            self.scheduler.reschedule('classify', interval=self.classifier.interval)
+        if self.analytics.refresh_interval != old_config.get('analytics', {}).get('refresh_interval', 300):
+            self.scheduler.reschedule('analytics', interval=self.analytics.refresh_interval)
+        if self.memory_watchdog.interval != old_config.get('memory', {}).get('check_interval', 300):
+            self.scheduler.reschedule('memory', interval=self.memory_watchdog.interval)
+        
+        self.logger.info(f"配置已热加载: {', '.join(sorted(sections))}")
+        restart_sections = sections & set(RESTART_SECTIONS)
+        if restart_sections:
+            self.logger.warning(f"以下配置需要重启后生效: {', '.join(sorted(restart_sections))}")
+    
+    def stop(self):
+        """请求停止追踪器，调度循环会立即醒来退出"""
+        self.running = False
+        self.stop_event.set()
+        self.scheduler.stop()
+    
     def _signal_handler(self, signum, frame):
         """信号处理器"""
         self.logger.info(f"接收到信号 {signum}，准备停止...")
-        self.running = False
-        self.stop_event.set()
+        self.stop()
     
     def show_stats(self):
         """显示统计信息"""
-        print("\n📈 活动统计")
-        print("="*40)
-        
-        stats = self.db_manager.get_activity_stats()
-        if stats:
-            print(f"📅 统计周期: 最近{stats['period_days']}天")
-            print(f"📊 总活动次数: {stats['total_activities']}")
-            print(f"🗓️ 活跃天数: {stats['active_days']}")
-            print(f"📈 日均活动: {stats['avg_activities_per_day']}")
-            if stats['most_active_day']:
-                print(f"🔥 最活跃日期: {stats['most_active_day']} ({stats['most_active_day_count']}次)")
-        
-        # 显示今日总结
-        today = date.today()
-        summary = self.db_manager.get_daily_summary(today)
-        if summary:
-            print(f"\n📋 今日总结 ({today})")
-            print("="*40)
-            print(summary['summary'])
-        
-        print()
+        print_stats(self.db_manager)
 
 def main():
     """主函数"""
@@ -275,21 +932,109 @@ def main():
     parser = argparse.ArgumentParser(description='AI活动识别总结工具')
     parser.add_argument('--config', default='config.yaml', help='配置文件路径')
     parser.add_argument('--stats', action='store_true', help='显示统计信息')
+    parser.add_argument('--range', dest='stats_range', metavar='RANGE',
+                        help='与 --stats 一起使用: 统计范围，如 30、12w、1y 或 2024-01-01:2024-03-31')
     parser.add_argument('--summary', action='store_true', help='生成今日总结')
+    parser.add_argument('--today', action='store_true', help='显示今日活动和总结')
+    parser.add_argument('--reanalyze', action='store_true', help='重新分析已保存的截图')
+    parser.add_argument('--from', dest='from_date', help='起始日期 (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='to_date', help='结束日期 (YYYY-MM-DD)')
+    parser.add_argument('--restart', action='store_true', help='忽略检查点，从头重新分析')
+    parser.add_argument('--rollup', choices=['week', 'month'], help='生成周/月汇总（--from 指定周期内的日期，默认今天）')
+    parser.add_argument('--force', action='store_true', help='即使每日总结没有变化也重新生成汇总')
+    parser.add_argument('--export', action='store_true', help='导出活动记录和每日总结')
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'csv', 'parquet'], help='导出格式')
+    parser.add_argument('--table', default='all', choices=['activities', 'daily_summaries', 'all'], help='导出的数据表')
+    parser.add_argument('--output', help='导出文件路径（导出全部表时为目录）')
+    parser.add_argument('--incremental', action='store_true', help='只导出上次导出之后新增的记录')
+    parser.add_argument('--breakdown', nargs='?', const='total', choices=['total', 'day', 'week', 'month'],
+                        help='按类别和应用统计 --from/--to 范围内的时长（默认最近7天），可按天/周/月分组')
+    parser.add_argument('--classify', action='store_true', help='分类尚未分类的历史记录（--force 清除后重新分类）')
+    parser.add_argument('--migrate-descriptions', action='store_true',
+                        help='把已有的活动记录转换为描述字典存储（可中断，再次运行继续）')
+    parser.add_argument('--soak-test', type=int, nargs='?', const=2000, metavar='N',
+                        help='内存浸泡测试: 用合成截图连续执行N次分析（默认2000），检查内存是否平稳')
+    parser.add_argument('--serve', action='store_true', help='分析节点模式: 接收多个采集端上传的截图并分析')
+    parser.add_argument('--agent', action='store_true', help='轻量采集端模式: 只截图去重并上传到分析节点')
+    parser.add_argument('--ingest-test', type=int, nargs='?', const=3, metavar='N',
+                        help='多客户端接入测试: N个采集端（默认3）并发上传到本机的分析节点和模拟的Ollama服务')
     
     args = parser.parse_args()
     
-    # 创建活动追踪器
-    tracker = ActivityTracker(args.config)
+    # 只读查询走轻量路径，不构建完整的追踪器
+    if args.stats or args.today:
+        config = load_config(args.config)
+        db_manager = open_read_only_db(config)
+        if db_manager is None:
+            print("暂无活动数据，请先启动追踪器")
+        elif args.stats and args.stats_range:
+            from analytics import parse_range, get_range_stats
+            try:
+                start_date, end_date = parse_range(args.stats_range)
+            except ValueError as e:
+                parser.error(f"无效的统计范围 {args.stats_range}: {e}")
+            print_range_stats(get_range_stats(db_manager, config, start_date, end_date))
+        elif args.stats:
+            print_stats(db_manager)
+        else:
+            print_today(db_manager)
+        return
     
-    if args.stats:
-        tracker.show_stats()
+    if args.breakdown:
+        db_manager = open_read_only_db(load_config(args.config))
+        if db_manager is None:
+            print("暂无活动数据，请先启动追踪器")
+        else:
+            start_date, end_date = parse_date_range(args)
+            print_breakdown(db_manager, start_date, end_date, args.breakdown)
         return
     
+    if args.export:
+        run_export(load_config(args.config), args)
+        return
+    
+    if args.classify:
+        run_classify(load_config(args.config), args)
+        return
+    
+    if args.migrate_descriptions:
+        sys.exit(0 if run_migrate_descriptions(load_config(args.config)) else 1)
+    
+    if args.soak_test:
+        sys.exit(0 if run_soak_test(args.config, args.soak_test) else 1)
+    
+    if args.ingest_test:
+        sys.exit(0 if run_ingest_test(args.config, args.ingest_test) else 1)
+    
+    if args.serve:
+        sys.exit(0 if run_ingest_server(args.config) else 1)
+    
+    if args.agent:
+        run_agent(args.config)
+        return
+    
+    # 创建活动追踪器
+    tracker = ActivityTracker(args.config)
+    
     if args.summary:
         tracker.generate_daily_summary()
         return
     
+    if args.rollup:
+        anchor_date = date.fromisoformat(args.from_date) if args.from_date else None
+        period_summary = tracker.rollup.build(args.rollup, anchor_date, force=args.force)
+        if period_summary:
+            print_period_summary(period_summary)
+        else:
+            print("没有可用的每日总结或汇总生成失败，详见日志")
+        return
+    
+    if args.reanalyze:
+        from reanalyzer import Reanalyzer, parse_date
+        reanalyzer = Reanalyzer(tracker.config, tracker.ollama_client, tracker.db_manager)
+        reanalyzer.run(parse_date(args.from_date), parse_date(args.to_date), restart=args.restart)
+        return
+    
     # 启动主程序
     tracker.start()
 
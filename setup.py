@@ -24,7 +24,7 @@ ICON_FILE = "assets/icon.icns"  # You can create this later
 # Include all necessary files (proper format for setuptools)
 DATA_FILES = [
     (".", ["config.yaml", "requirements.txt", "README.md"]),
-    ("src", ["src/__init__.py", "src/database_manager.py", "src/ollama_client.py", "src/screenshot_capture.py", "src/gui_app.py"]),
+    ("src", ["src/__init__.py", "src/database_manager.py", "src/ollama_client.py", "src/screenshot_capture.py", "src/gui_app.py", "src/model_router.py", "src/backend_pool.py", "src/model_manager.py", "src/frame_spool.py", "src/reanalyzer.py", "src/image_encoder.py", "src/preflight.py", "src/log_view.py", "src/gui_data.py", "src/thumbnail_cache.py", "src/timeline_view.py", "src/query_server.py", "src/query_client.py", "src/exporter.py", "src/rollup.py", "src/prompt_compactor.py", "src/sessionizer.py", "src/scheduler.py", "src/config_watcher.py", "src/logging_setup.py", "src/memory_watchdog.py", "src/soak.py", "src/circuit_breaker.py", "src/ingest_server.py", "src/capture_agent.py", "src/classifier.py", "src/analytics.py", "src/analytics_view.py", "src/description_codec.py"]),
 ]
 
 # Python modules to include
@@ -33,7 +33,6 @@ PACKAGES = [
     'yaml',
     'PIL',
     'requests',
-    'schedule',
     'sqlite3',
     'threading',
     'datetime',
@@ -75,8 +74,8 @@ APP_OPTIONS = {
         'PIL',
         'PIL.Image',
         'PIL.ImageGrab',
+        'PIL.ImageTk',
         'requests',
-        'schedule',
         'sqlite3',
         'threading',
         'datetime',
@@ -119,7 +118,6 @@ setup(
     install_requires=[
         'Pillow>=10.0.1',
         'requests>=2.31.0',
-        'schedule>=1.2.0',
         'PyYAML>=6.0.1',
         'py2app>=0.28.0',
     ],
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+活动分析模块
+基于按小时汇总表统计任意日期范围的活动时长、星期×小时热力图、连续活跃天数和各类别趋势，
+查询一年的数据也不读取原始记录；结果按数据库写入版本缓存在内存中
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+WEEKDAYS = ['一', '二', '三', '四', '五', '六', '日']
+
+
+def parse_range(value, today=None):
+    """
+    解析统计范围
+    参数: value - 天数（"30"、"30d"）、周/月/年（"12w"、"3m"、"1y"）或日期区间（"2024-01-01:2024-03-31"）
+    返回: (起始日期, 结束日期)
+    """
+    today = today or date.today()
+    value = value.strip().lower()
+    if ':' in value:
+        start, end = value.split(':', 1)
+        start_date, end_date = date.fromisoformat(start), date.fromisoformat(end)
+        if start_date > end_date:
+            raise ValueError(f"起始日期晚于结束日期: {value}")
+        return start_date, end_date
+    units = {'d': 1, 'w': 7, 'm': 30, 'y': 365}
+    unit = units.get(value[-1:], None)
+    count = int(value[:-1] if unit else value)
+    if count <= 0:
+        raise ValueError(f"统计范围必须大于0: {value}")
+    return today - timedelta(days=count * (unit or 1) - 1), today
+
+
+class Analytics:
+    def __init__(self, config, db_manager):
+        self.db_manager = db_manager
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.logger = logging.getLogger(__name__)
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        analytics_config = config.get('analytics', {})
+        # 一天的活动时长达到该值（分钟）才计入连续活跃天数
+        self.streak_minutes = analytics_config.get('streak_minutes', 30)
+        self.refresh_interval = analytics_config.get('refresh_interval', 300)
+        self.cache_entries = analytics_config.get('cache_entries', 32)
+        with self.lock:
+            self.cache.clear()
+
+    def refresh(self):
+        """增量重算有变化的日期的按小时汇总，返回重算的天数"""
+        if getattr(self.db_manager, 'read_only', False):
+            return 0
+        return self.db_manager.refresh_hourly_buckets()
+
+    def get_range_stats(self, start_date, end_date):
+        """
+        统计日期范围（含首尾）内的活动
+        返回: 统计字典，时长单位为秒；heatmap为7×24（周一到周日 × 0到23点）
+        """
+        self.refresh()
+        key = (start_date, end_date)
+        version = self.db_manager.write_version
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == version:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        stats = self._compute(start_date, end_date)
+        with self.lock:
+            self.cache[key] = (version, stats)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return stats
+
+    def _compute(self, start_date, end_date):
+        db = self.db_manager
+        daily = {date.fromisoformat(str(day)): seconds
+                 for day, seconds in db.get_hourly_aggregate(start_date, end_date, 'day')}
+
+        heatmap = [[0] * 24 for _ in WEEKDAYS]
+        for weekday, hour, seconds in db.get_hourly_aggregate(start_date, end_date, 'heatmap'):
+            # SQLite中0为周日，这里改为周一在前
+            heatmap[(weekday + 6) % 7][hour] = seconds
+
+        categories = {(category or '未分类'): seconds
+                      for category, seconds in db.get_hourly_aggregate(start_date, end_date, 'category')}
+        trend = OrderedDict()
+        for week, category, seconds in db.get_hourly_aggregate(start_date, end_date, 'week_category'):
+            trend.setdefault(week, {})[category or '未分类'] = seconds
+
+        total = sum(daily.values())
+        hourly_totals = [sum(row[hour] for row in heatmap) for hour in range(24)]
+        busiest = max(daily.items(), key=lambda item: item[1]) if daily else None
+        current_streak, longest_streak = self._streaks(daily, start_date, end_date)
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': (end_date - start_date).days + 1,
+            'total_seconds': total,
+            'active_days': len(daily),
+            'avg_seconds_per_active_day': round(total / len(daily)) if daily else 0,
+            'busiest_day': {'date': busiest[0], 'seconds': busiest[1]} if busiest else None,
+            'peak_hour': hourly_totals.index(max(hourly_totals)) if total else None,
+            'current_streak': current_streak,
+            'longest_streak': longest_streak,
+            'heatmap': heatmap,
+            'categories': dict(sorted(categories.items(), key=lambda item: item[1], reverse=True)),
+            'category_trend': trend,
+        }
+
+    def _streaks(self, daily, start_date, end_date):
+        """
+        连续活跃天数
+        返回: (截至结束日期的当前连续天数, 范围内最长连续天数)；结束日期当天尚未达标时从前一天算起
+        """
+        threshold = self.streak_minutes * 60
+        longest = run = 0
+        day = start_date
+        while day <= end_date:
+            run = run + 1 if daily.get(day, 0) >= threshold else 0
+            longest = max(longest, run)
+            day += timedelta(days=1)
+
+        current = 0
+        day = end_date
+        if daily.get(day, 0) < threshold:
+            day -= timedelta(days=1)
+        while day >= start_date and daily.get(day, 0) >= threshold:
+            current += 1
+            day -= timedelta(days=1)
+        return current, longest
+
+    def get_stats(self):
+        with self.lock:
+            return {'entries': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+
+def get_range_stats(source, config, start_date, end_date):
+    """
+    从读取后端统计: 追踪器运行时由追踪器计算（使用其缓存），否则在本进程读取数据库
+    参数: source - open_query_backend返回的QueryClient或DatabaseManager
+    """
+    from query_client import QueryClient
+    if isinstance(source, QueryClient):
+        return source.get_range_stats(start_date, end_date)
+    return Analytics(config, source).get_range_stats(start_date, end_date)
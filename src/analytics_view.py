@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+活动热力图视图模块
+在画布上绘制星期×小时的活动热力图和各类别时长，统计在后台查询
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from analytics import WEEKDAYS, parse_range, get_range_stats
+
+RANGES = [('最近7天', '7d'), ('最近30天', '30d'), ('最近90天', '90d'), ('最近一年', '1y')]
+CELL_SIZE = 22
+LEFT_MARGIN = 36
+TOP_MARGIN = 24
+BAR_WIDTH = 320
+
+
+def _shade(ratio):
+    """按时长比例在浅色到深蓝之间取色"""
+    low, high = (235, 242, 250), (20, 80, 160)
+    color = [round(a + (b - a) * ratio) for a, b in zip(low, high)]
+    return '#%02x%02x%02x' % tuple(color)
+
+
+class AnalyticsWindow:
+    def __init__(self, root, data_layer, config):
+        self.data_layer = data_layer
+        self.config = config
+
+        self.window = tk.Toplevel(root)
+        self.window.title("活动热力图")
+        self.window.geometry("640x520")
+
+        control_frame = ttk.Frame(self.window)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        self.range_var = tk.StringVar(value=RANGES[1][0])
+        selector = ttk.Combobox(control_frame, textvariable=self.range_var, state="readonly",
+                                values=[label for label, _ in RANGES], width=10)
+        selector.pack(side="left")
+        selector.bind("<<ComboboxSelected>>", lambda event: self.load())
+        self.summary_label = ttk.Label(control_frame, text="")
+        self.summary_label.pack(side="left", padx=10)
+
+        self.canvas = tk.Canvas(self.window, background="white", highlightthickness=0)
+        self.canvas.pack(fill="both", expand=True, padx=10, pady=5)
+
+        self.load()
+
+    def load(self):
+        value = dict(RANGES)[self.range_var.get()]
+        start_date, end_date = parse_range(value)
+        self.summary_label.config(text="加载中...")
+        self.data_layer.query(
+            ('analytics', start_date, end_date),
+            lambda db: get_range_stats(db, self.config, start_date, end_date),
+            lambda stats: self._on_stats(value, stats),
+            lambda error: self.summary_label.config(text=f"获取数据失败: {str(error)}")
+        )
+
+    def _on_stats(self, value, stats):
+        if not self.window.winfo_exists() or value != dict(RANGES)[self.range_var.get()]:
+            return
+        self.canvas.delete("all")
+        if not stats or not stats.get('total_seconds'):
+            self.summary_label.config(text="该范围内没有活动记录")
+            return
+        self.summary_label.config(
+            text=f"共 {stats['total_seconds'] / 3600:.1f} 小时，活跃 {stats['active_days']} 天，"
+                 f"连续活跃 {stats['current_streak']} 天（最长 {stats['longest_streak']} 天）"
+        )
+        bottom = self._draw_heatmap(stats['heatmap'])
+        self._draw_categories(stats['categories'], stats['total_seconds'], bottom + 30)
+
+    def _draw_heatmap(self, heatmap):
+        peak = max(max(row) for row in heatmap) or 1
+        for hour in range(0, 24, 3):
+            self.canvas.create_text(LEFT_MARGIN + hour * CELL_SIZE + CELL_SIZE / 2, TOP_MARGIN - 10,
+                                    text=str(hour), fill="#666666")
+        for row_index, (weekday, row) in enumerate(zip(WEEKDAYS, heatmap)):
+            y = TOP_MARGIN + row_index * CELL_SIZE
+            self.canvas.create_text(LEFT_MARGIN - 16, y + CELL_SIZE / 2, text=f"周{weekday}", fill="#333333")
+            for hour, seconds in enumerate(row):
+                x = LEFT_MARGIN + hour * CELL_SIZE
+                self.canvas.create_rectangle(x + 1, y + 1, x + CELL_SIZE - 1, y + CELL_SIZE - 1,
+                                             fill=_shade(seconds / peak), outline="")
+        return TOP_MARGIN + len(heatmap) * CELL_SIZE
+
+    def _draw_categories(self, categories, total, top):
+        longest = max(categories.values()) or 1
+        for index, (category, seconds) in enumerate(categories.items()):
+            y = top + index * (CELL_SIZE + 4)
+            width = BAR_WIDTH * seconds / longest
+            self.canvas.create_text(LEFT_MARGIN + 40, y + CELL_SIZE / 2, text=category, anchor="e", fill="#333333")
+            self.canvas.create_rectangle(LEFT_MARGIN + 50, y, LEFT_MARGIN + 50 + width, y + CELL_SIZE,
+                                         fill="#4a7fc1", outline="")
+            self.canvas.create_text(LEFT_MARGIN + 58 + width, y + CELL_SIZE / 2, anchor="w", fill="#333333",
+                                    text=f"{seconds / 3600:.1f}h ({seconds * 100 / total:.0f}%)")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Ollama后端池模块
+支持多个Ollama后端的健康检查、负载均衡、并发限制以及自动摘除/恢复
+"""
+
+import time
+import logging
+import threading
+import requests
+
+DEFAULT_GROUPS = ('vision', 'text')
+
+
+class NoBackendAvailable(requests.exceptions.ConnectionError):
+    """没有可用的后端（全部被摘除、并发名额已满或已到截止时刻），请求没有发出"""
+
+
+class Backend:
+    def __init__(self, url, max_concurrency=2, groups=None):
+        self.url = url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.groups = set(groups or DEFAULT_GROUPS)
+
+        self.outstanding = 0
+        self.ewma_latency = None
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.models = []
+
+    def is_available(self, now):
+        """后端当前是否可以接收请求（被摘除的后端在冷却期过后允许试探）"""
+        if self.healthy:
+            return self.outstanding < self.max_concurrency
+        return now >= self.ejected_until and self.outstanding == 0
+
+    def record_latency(self, latency, alpha=0.3):
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'max_concurrency': self.max_concurrency,
+            'ewma_latency': round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            'consecutive_failures': self.consecutive_failures,
+            'groups': sorted(self.groups),
+        }
+
+
+class BackendPool:
+    def __init__(self, config):
+        ollama_config = config['ollama']
+        pool_config = ollama_config.get('pool', {})
+
+        self.strategy = pool_config.get('strategy', 'least_outstanding')
+        self.max_failures = pool_config.get('max_failures', 3)
+        self.eject_seconds = pool_config.get('eject_seconds', 30)
+        self.health_interval = pool_config.get('health_interval', 15)
+        self.health_timeout = pool_config.get('health_timeout', 2)
+        self.acquire_timeout = pool_config.get('acquire_timeout', 10)
+        default_concurrency = pool_config.get('max_concurrency', 2)
+
+        self.backends = []
+        for entry in self._normalize_urls(ollama_config['base_url']):
+            if isinstance(entry, dict):
+                self.backends.append(Backend(
+                    entry['url'],
+                    max_concurrency=entry.get('max_concurrency', default_concurrency),
+                    groups=entry.get('groups')
+                ))
+            else:
+                self.backends.append(Backend(entry, max_concurrency=default_concurrency))
+
+        self.condition = threading.Condition()
+        self.health_thread = None
+        self.stop_event = threading.Event()
+
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _normalize_urls(base_url):
+        if isinstance(base_url, (list, tuple)):
+            return list(base_url)
+        return [base_url]
+
+    def _group_backends(self, group):
+        in_group = [b for b in self.backends if group is None or group in b.groups]
+        # 没有后端声明该分组时退回到全部后端
+        return in_group or self.backends
+
+    def _candidates(self, group, now):
+        return [b for b in self._group_backends(group) if b.is_available(now)]
+
+    def _score(self, backend):
+        latency = backend.ewma_latency if backend.ewma_latency is not None else 1.0
+        if self.strategy == 'latency_weighted':
+            return (backend.outstanding + 1) * latency
+        return (backend.outstanding / backend.max_concurrency, latency)
+
+    def acquire(self, group=None, timeout=None):
+        """
+        选择一个后端并占用一个并发名额
+        返回: Backend对象，超时返回None
+        """
+        deadline = time.time() + (timeout if timeout is not None else self.acquire_timeout)
+        with self.condition:
+            while True:
+                now = time.time()
+                candidates = self._candidates(group, now)
+                if candidates:
+                    backend = min(candidates, key=self._score)
+                    backend.outstanding += 1
+                    return backend
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                # 分组内的后端都已被摘除时立即失败，等待只对并发已满的情况有意义
+                if all(not b.healthy and now < b.ejected_until for b in self._group_backends(group)):
+                    return None
+                self.condition.wait(min(remaining, 1.0))
+
+    def release(self, backend, success, latency=None):
+        """
+        释放并发名额并记录请求结果
+        参数: success - 请求是否成功，None表示请求没有发出，不计入后端的成功或失败
+        """
+        with self.condition:
+            backend.outstanding -= 1
+            if success is None:
+                pass
+            elif success:
+                if latency is not None:
+                    backend.record_latency(latency)
+                backend.consecutive_failures = 0
+                if not backend.healthy:
+                    backend.healthy = True
+                    self.logger.info(f"后端已恢复: {backend.url}")
+            else:
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.max_failures:
+                    self._eject(backend)
+            self.condition.notify_all()
+
+    def _eject(self, backend):
+        backend.ejected_until = time.time() + self.eject_seconds
+        if backend.healthy:
+            backend.healthy = False
+            self.logger.warning(f"后端连续失败{backend.consecutive_failures}次，已摘除: {backend.url}")
+
+    def request(self, method, path, group=None, acquire_timeout=None, deadline=None, **kwargs):
+        """
+        通过负载均衡选择的后端发送HTTP请求
+        参数:
+            acquire_timeout: 等待并发名额的最长时间，默认使用配置值
+            deadline: 截止时刻（time.monotonic()），等待名额和HTTP请求共用这段时间，
+                      HTTP超时不超过获得名额之后剩余的时间
+        返回: requests.Response；没有可用后端时抛出NoBackendAvailable（ConnectionError的子类）
+        """
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            acquire_timeout = remaining if acquire_timeout is None else min(acquire_timeout, remaining)
+        backend = self.acquire(group, acquire_timeout)
+        if backend is None:
+            raise NoBackendAvailable("没有可用的Ollama后端")
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.release(backend, None)
+                raise NoBackendAvailable("等待Ollama后端时已到截止时刻")
+            kwargs['timeout'] = min(kwargs.get('timeout') or remaining, remaining)
+
+        start = time.time()
+        success = False
+        try:
+            response = requests.request(method, f"{backend.url}{path}", **kwargs)
+            # 5xx视为后端故障，4xx属于请求本身的问题
+            success = response.status_code < 500
+            return response
+        finally:
+            self.release(backend, success, time.time() - start if success else None)
+
+    def check_health(self, timeout=None):
+        """检查所有后端，恢复已健康的后端并摘除无响应的后端"""
+        healthy_count = 0
+        for backend in self.backends:
+            try:
+                response = requests.get(f"{backend.url}/api/tags", timeout=timeout or self.health_timeout)
+                ok = response.status_code == 200
+                if ok:
+                    backend.models = [m['name'] for m in response.json().get('models', [])]
+            except Exception:
+                ok = False
+
+            with self.condition:
+                if ok:
+                    healthy_count += 1
+                    backend.consecutive_failures = 0
+                    if not backend.healthy:
+                        backend.healthy = True
+                        self.logger.info(f"后端健康检查通过，重新加入: {backend.url}")
+                else:
+                    backend.consecutive_failures = max(backend.consecutive_failures, self.max_failures)
+                    self._eject(backend)
+                self.condition.notify_all()
+        return healthy_count
+
+    def start_health_checks(self):
+        """启动后台健康检查线程"""
+        if self.health_thread and self.health_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self.health_thread.start()
+
+    def stop_health_checks(self):
+        self.stop_event.set()
+
+    def _health_loop(self):
+        while not self.stop_event.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                self.logger.error(f"后端健康检查出错: {str(e)}")
+
+    def get_status(self):
+        """返回所有后端的状态"""
+        with self.condition:
+            return [backend.to_dict() for backend in self.backends]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+轻量采集端模块
+只负责截图和去重: 画面与上一次上传的帧几乎相同时只上传画面哈希，否则压缩为JPEG上传到分析节点；
+分析节点不可用时截图暂存在本地离线缓存，恢复后按顺序补传
+"""
+
+import os
+import socket
+import logging
+from datetime import datetime
+
+from frame_spool import FrameSpool
+from image_encoder import ImageEncoder
+from model_router import compute_frame_hash, hamming_distance
+
+# 分析节点接受后的响应状态
+ACCEPTED = 'queued'
+
+
+class CaptureAgent:
+    def __init__(self, config, frame_source=None, encoder=None):
+        """
+        参数:
+            config: 配置字典
+            frame_source: 返回PIL Image的截图函数，默认截取屏幕
+            encoder: 共用的ImageEncoder（可选）
+        """
+        agent_config = config.get('agent', {})
+        self.config = config
+        self.server_url = agent_config.get('server_url', 'http://127.0.0.1:8766').rstrip('/')
+        self.client_id = agent_config.get('client_id') or socket.gethostname().split('.')[0]
+        self.token = agent_config.get('token')
+        # 画面哈希距离不超过该值时视为重复帧，只上传哈希
+        self.dedup_distance = agent_config.get('dedup_distance', 3)
+        self.quality = agent_config.get('quality', 70)
+        self.max_width = agent_config.get('max_width', 1600)
+        self.timeout = agent_config.get('timeout', 10)
+        # 每次成功上传后最多补传的离线缓存帧数
+        self.backlog_per_tick = agent_config.get('backlog_per_tick', 5)
+
+        self.encoder = encoder or ImageEncoder(config)
+        if frame_source is None:
+            from screenshot_capture import ScreenshotCapture
+            frame_source = ScreenshotCapture(config, self.encoder).get_screenshot_for_analysis
+        self.frame_source = frame_source
+
+        # 离线缓存与本机追踪器的缓存分开存放
+        spool_dir = agent_config.get('spool_dir', os.path.join(config['storage']['data_dir'], 'agent_spool'))
+        spool_config = dict(config, spool=dict(config.get('spool', {}), dir=spool_dir))
+        self.spool = FrameSpool(spool_config, self.encoder)
+
+        self.session = None
+        self.scheduler = None
+        self.last_hash = None
+        self.stats = {'captured': 0, 'uploaded': 0, 'hash_only': 0, 'spooled': 0, 'backlog_sent': 0}
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_session(self):
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+            if self.token:
+                self.session.headers['Authorization'] = f"Bearer {self.token}"
+            self.session.headers['X-Client-Id'] = self.client_id
+        return self.session
+
+    def _send(self, captured_at, frame_hash, jpeg_bytes=None):
+        """
+        上传一帧，jpeg_bytes为None时只上传画面哈希
+        返回: 分析节点返回的状态（queued/extended/need_frame/busy），连接失败时返回None
+        """
+        import requests
+        headers = {
+            'X-Captured-At': captured_at.isoformat(),
+            'X-Frame-Hash': format(frame_hash, 'x'),
+            'Content-Type': 'image/jpeg',
+        }
+        try:
+            response = self._get_session().post(
+                f"{self.server_url}/v1/frames",
+                data=jpeg_bytes or b'',
+                headers=headers,
+                timeout=self.timeout
+            )
+            if response.status_code in (200, 202, 409, 429, 503):
+                return response.json().get('status')
+            self.logger.error(f"上传失败: {response.status_code}, {response.text[:200]}")
+            return None
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"无法连接分析节点 {self.server_url}: {str(e)}")
+            return None
+
+    def _encode(self, image):
+        return self.encoder.encode_jpeg(image, quality=self.quality, max_width=self.max_width)
+
+    def tick(self):
+        """截图、去重并上传一帧"""
+        image = None
+        try:
+            captured_at = datetime.now()
+            image = self.frame_source()
+            if not image:
+                self.logger.warning("截图捕获失败，跳过本次上传")
+                return
+            self.stats['captured'] += 1
+            frame_hash = compute_frame_hash(image)
+
+            # 分析节点按截图顺序合并时间段: 先补传离线缓存中更早的帧，缓存没有补完时当前帧也进入缓存排队
+            if self.spool.pending() and not self._upload_backlog():
+                self._spool(image, captured_at)
+                return
+
+            duplicate = (self.last_hash is not None
+                         and hamming_distance(frame_hash, self.last_hash) <= self.dedup_distance)
+            status = self._send(captured_at, frame_hash) if duplicate else 'need_frame'
+            if status == 'need_frame':
+                jpeg_bytes = self._encode(image)
+                status = self._send(captured_at, frame_hash, jpeg_bytes) if jpeg_bytes else None
+                if status == ACCEPTED:
+                    self.stats['uploaded'] += 1
+                    # 后续帧与最近一次完整上传的帧比较，避免缓慢变化的画面一直被当作重复帧
+                    self.last_hash = frame_hash
+            elif status == ACCEPTED:
+                self.stats['hash_only'] += 1
+
+            if status != ACCEPTED:
+                # 分析节点不可用或繁忙: 暂存到本地，恢复后补传
+                self._spool(image, captured_at)
+        except Exception as e:
+            self.logger.error(f"采集上传时出错: {str(e)}")
+        finally:
+            if image is not None:
+                image.close()
+
+    def _spool(self, image, captured_at):
+        if self.spool.put(image, captured_at):
+            self.stats['spooled'] += 1
+        self.last_hash = None
+
+    def _upload_backlog(self):
+        """
+        按截图顺序补传离线缓存中的帧，每次最多backlog_per_tick帧
+        返回: 缓存是否已全部补传
+        """
+        for name in self.spool.pending()[:self.backlog_per_tick]:
+            try:
+                image, captured_at, _ = self.spool.load(name)
+            except Exception as e:
+                self.logger.error(f"读取缓存帧失败，已丢弃 {name}: {str(e)}")
+                self.spool.remove(name)
+                continue
+            try:
+                frame_hash = compute_frame_hash(image)
+                jpeg_bytes = self._encode(image)
+            finally:
+                image.close()
+            if self._send(captured_at, frame_hash, jpeg_bytes) != ACCEPTED:
+                return False
+            self.spool.remove(name)
+            self.stats['backlog_sent'] += 1
+        return not self.spool.pending()
+
+    def run(self, stop_event):
+        """按截图间隔持续采集上传，直到stop_event被设置"""
+        from scheduler import Scheduler, Job
+
+        interval = self.config['screenshot']['interval_minutes']
+        self.scheduler = Scheduler(self.config)
+        self.scheduler.add_job(Job('capture', self.tick, 'capture', interval=interval * 60,
+                                   catch_up='skip', run_immediately=True))
+        self.logger.info(f"采集端 {self.client_id} 已启动，每{interval}分钟上传到 {self.server_url}")
+        try:
+            self.scheduler.run(stop_event)
+        finally:
+            self.scheduler.shutdown()
+            self.encoder.shutdown()
+            self.logger.info(f"采集端已停止: {self.stats}")
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+熔断与自适应超时模块
+后端连续失败时熔断，熔断期间请求立即失败，冷却后放行少量试探请求（半开），试探成功才恢复；
+请求超时按实际观测到的延迟分位数计算，而不是固定值
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, reset_timeout=30, max_reset_timeout=300, half_open_requests=1):
+        """
+        参数:
+            name: 熔断器名称（用于日志）
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后多久进入半开状态（秒），每次试探失败加倍
+            max_reset_timeout: 熔断时长上限（秒）
+            half_open_requests: 半开状态下同时放行的试探请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.half_open_requests = half_open_requests
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_duration = reset_timeout
+        self.opened_at = None
+        self.probes = 0
+        self.rejected = 0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def allow(self):
+        """
+        请求前调用，返回是否放行；放行后必须调用record_success或record_failure，没有真正发出请求时调用release
+        """
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_duration:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self.probes = 0
+                self.logger.info(f"熔断器 {self.name} 进入半开状态，放行试探请求")
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_requests:
+                    self.rejected += 1
+                    return False
+                self.probes += 1
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self.logger.info(f"熔断器 {self.name} 试探成功，恢复正常")
+                self.state = CLOSED
+                self.open_duration = self.reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                # 试探失败: 重新熔断，时长加倍
+                self.open_duration = min(self.open_duration * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.open_duration = self.reset_timeout
+                self._open()
+
+    def release(self):
+        """放行后没有真正发出请求时调用，归还半开状态的试探名额"""
+        with self.lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self.logger.warning(
+            f"熔断器 {self.name} 连续失败{self.consecutive_failures}次，熔断 {self.open_duration:.0f} 秒"
+        )
+
+    def retry_in(self):
+        """距离下一次试探的秒数，未熔断时返回0"""
+        with self.lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.open_duration - (time.monotonic() - self.opened_at))
+
+    def get_state(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'open_duration': self.open_duration,
+            }
+
+
+class AdaptiveTimeout:
+    def __init__(self, config):
+        """
+        参数: config - ollama.adaptive_timeout 配置段
+        """
+        self.enabled = config.get('enabled', True)
+        self.percentile = config.get('percentile', 95)
+        self.multiplier = config.get('multiplier', 2.0)
+        self.min_timeout = config.get('min_timeout', 10)
+        # 样本不足时使用配置的固定超时
+        self.min_samples = config.get('min_samples', 10)
+        self.samples = deque(maxlen=config.get('window', 100))
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        """记录一次成功请求的耗时；超时的请求以所用超时作为样本，使超时逐步放宽"""
+        with self.lock:
+            self.samples.append(latency)
+
+    def _percentile(self, percentile):
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+    def get(self, max_timeout):
+        """
+        当前超时时间: 延迟分位数乘以系数，限制在 [min_timeout, max_timeout] 之间
+        """
+        with self.lock:
+            if not self.enabled or len(self.samples) < self.min_samples:
+                return max_timeout
+            value = self._percentile(self.percentile) * self.multiplier
+        return min(max(value, self.min_timeout), max_timeout)
+
+    def get_stats(self, max_timeout):
+        with self.lock:
+            if not self.samples:
+                return {'samples': 0, 'timeout': max_timeout}
+            stats = {
+                'samples': len(self.samples),
+                'p50': round(self._percentile(50), 3),
+                'p95': round(self._percentile(95), 3),
+                'p99': round(self._percentile(99), 3),
+            }
+        stats['timeout'] = round(self.get(max_timeout), 1)
+        return stats
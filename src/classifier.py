@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+活动分类模块
+把活动描述归类为（应用, 类别），写入activities和activity_spans的索引列，按类别/应用统计时长时直接在SQL中聚合；
+配置的规则预编译为一个正则表达式，规则匹配不到的描述批量交给文本模型判断
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+from database_manager import CLASSIFIED_TABLES
+
+# 规则和模型都无法判断时的分类，避免反复重试
+UNKNOWN = ('未知', '其他')
+
+DEFAULT_CATEGORIES = ['开发', '文档', '沟通', '会议', '浏览', '设计', '娱乐', '其他']
+
+
+class ActivityClassifier:
+    def __init__(self, config, ollama_client=None):
+        """
+        参数:
+            config: 配置字典
+            ollama_client: 用于规则匹配不到时的模型判断（可选）
+        """
+        self.ollama_client = ollama_client
+        self.lock = threading.Lock()
+        # 模型判断结果按描述缓存，相同描述只问一次
+        self.cache = OrderedDict()
+        self.cache_entries = 2048
+        self.rule_hits = 0
+        self.llm_hits = 0
+        self.unknown = 0
+
+        self.logger = logging.getLogger(__name__)
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        classify_config = config.get('classification', {})
+        self.enabled = classify_config.get('enabled', True)
+        self.interval = classify_config.get('interval', 300)
+        self.batch_size = classify_config.get('batch_size', 500)
+        self.llm_fallback = classify_config.get('llm_fallback', True)
+        self.llm_batch = classify_config.get('llm_batch', 20)
+        self.categories = classify_config.get('categories') or DEFAULT_CATEGORIES
+        matcher, targets = self._compile(classify_config.get('rules') or [])
+        with self.lock:
+            self.matcher, self.targets = matcher, targets
+            self.cache.clear()
+
+    def _compile(self, rules):
+        """
+        把全部规则合并为一个正则表达式，每条规则一个命名分组
+        返回: (编译后的正则或None, [(应用, 类别)])
+        """
+        groups = []
+        targets = []
+        for rule in rules:
+            patterns = rule.get('patterns') or [re.escape(rule['application'])]
+            try:
+                re.compile('|'.join(patterns))
+            except re.error as e:
+                self.logger.error(f"分类规则 {rule.get('application')} 的正则表达式无效，已跳过: {str(e)}")
+                continue
+            groups.append(f"(?P<r{len(targets)}>{'|'.join(patterns)})")
+            targets.append((rule['application'], rule.get('category', '其他')))
+        if not groups:
+            return None, targets
+        return re.compile('|'.join(groups), re.IGNORECASE), targets
+
+    def match(self, description):
+        """
+        按规则分类，多条规则都匹配时取配置中靠前的一条
+        返回: (应用, 类别)，没有规则匹配时返回None
+        """
+        with self.lock:
+            matcher, targets = self.matcher, self.targets
+        if matcher is None or not description:
+            return None
+        best = None
+        for found in matcher.finditer(description):
+            index = int(found.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if index == 0:
+                    break
+        return targets[best] if best is not None else None
+
+    def classify(self, descriptions):
+        """
+        批量分类
+        返回: 与输入顺序一致的 [(应用, 类别)]
+        """
+        results = [None] * len(descriptions)
+        unresolved = OrderedDict()
+        for index, description in enumerate(descriptions):
+            result = self.match(description)
+            if result is not None:
+                self.rule_hits += 1
+            else:
+                with self.lock:
+                    result = self.cache.get(description)
+                if result is not None:
+                    self.llm_hits += 1
+            if result is not None:
+                results[index] = result
+            else:
+                unresolved.setdefault(description, []).append(index)
+
+        if unresolved and self.llm_fallback and self.ollama_client is not None:
+            pending = list(unresolved)
+            for start in range(0, len(pending), self.llm_batch):
+                batch = pending[start:start + self.llm_batch]
+                for description, result in zip(batch, self._ask_model(batch)):
+                    if result is None:
+                        continue
+                    self._remember(description, result)
+                    indexes = unresolved.pop(description)
+                    self.llm_hits += len(indexes)
+                    for index in indexes:
+                        results[index] = result
+
+        for indexes in unresolved.values():
+            self.unknown += len(indexes)
+            for index in indexes:
+                results[index] = UNKNOWN
+        return results
+
+    def _remember(self, description, result):
+        with self.lock:
+            self.cache[description] = result
+            self.cache.move_to_end(description)
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+
+    def _ask_model(self, descriptions):
+        """
+        让文本模型一次判断一批描述
+        返回: 与输入顺序一致的 [(应用, 类别) 或 None]
+        """
+        lines = '\n'.join(f"{index + 1}. {description[:200]}" for index, description in enumerate(descriptions))
+        prompt = (
+            f"下面是屏幕活动描述，请判断每条描述中用户使用的应用程序，并从以下类别中选择一个: {'、'.join(self.categories)}。\n"
+            f"每条输出一行，格式为: 序号|应用|类别，不要输出其他内容。\n\n{lines}"
+        )
+        response = self.ollama_client.generate_text(prompt)
+        results = [None] * len(descriptions)
+        if not response:
+            return results
+        for line in response.splitlines():
+            parts = [part.strip() for part in line.strip().split('|')]
+            if len(parts) != 3:
+                continue
+            try:
+                index = int(parts[0].rstrip('.')) - 1
+            except ValueError:
+                continue
+            if not 0 <= index < len(descriptions) or not parts[1]:
+                continue
+            category = parts[2] if parts[2] in self.categories else '其他'
+            results[index] = (parts[1][:64], category)
+        return results
+
+    def classify_pending(self, db_manager, limit=None):
+        """
+        分类数据库中尚未分类的活动记录和时间段
+        返回: 本次分类的行数
+        """
+        if not self.enabled:
+            return 0
+        total = 0
+        for table in CLASSIFIED_TABLES:
+            rows = db_manager.get_unclassified(table, limit or self.batch_size)
+            if not rows:
+                continue
+            results = self.classify([description for _, description in rows])
+            updates = [(application, category, row_id)
+                       for (row_id, _), (application, category) in zip(rows, results)]
+            if db_manager.set_classifications(table, updates):
+                total += len(updates)
+        if total:
+            self.logger.info(f"已分类 {total} 条记录（规则 {self.rule_hits}，模型 {self.llm_hits}，未知 {self.unknown}）")
+        return total
+
+    def get_stats(self):
+        with self.lock:
+            cached = len(self.cache)
+        return {
+            'rules': len(self.targets),
+            'rule_hits': self.rule_hits,
+            'llm_hits': self.llm_hits,
+            'unknown': self.unknown,
+            'cached': cached,
+        }
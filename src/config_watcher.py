@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+配置热加载模块
+定期检查配置文件是否变化，校验通过后交给回调应用到运行中的组件；
+校验失败时保留当前配置
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime
+
+# 修改后需要重启才能生效的配置段
+RESTART_SECTIONS = ('encoder', 'spool', 'api', 'preflight', 'gui')
+
+
+def validate_config(config):
+    """
+    校验配置
+    返回: 错误信息列表，为空表示通过
+    """
+    errors = []
+    if not isinstance(config, dict):
+        return ["配置文件内容不是有效的字典"]
+
+    for section in ('ollama', 'screenshot', 'storage', 'analysis', 'summary'):
+        if not isinstance(config.get(section), dict):
+            errors.append(f"缺少配置段: {section}")
+    if errors:
+        return errors
+
+    screenshot = config['screenshot']
+    interval = screenshot.get('interval_minutes')
+    if not isinstance(interval, (int, float)) or interval <= 0:
+        errors.append("screenshot.interval_minutes 必须大于0")
+    quality = screenshot.get('screenshot_quality', 85)
+    if not isinstance(quality, int) or not 1 <= quality <= 100:
+        errors.append("screenshot.screenshot_quality 必须在1-100之间")
+
+    ollama = config['ollama']
+    if not ollama.get('model'):
+        errors.append("ollama.model 不能为空")
+    if not isinstance(ollama.get('base_url'), (str, list)) or not ollama.get('base_url'):
+        errors.append("ollama.base_url 必须是地址或地址列表")
+    timeout = ollama.get('timeout')
+    if not isinstance(timeout, (int, float)) or timeout <= 0:
+        errors.append("ollama.timeout 必须大于0")
+
+    try:
+        datetime.strptime(str(config['summary'].get('daily_summary_time', '')), "%H:%M")
+    except ValueError:
+        errors.append("summary.daily_summary_time 必须是 HH:MM 格式")
+
+    for key in ('data_dir', 'database', 'screenshots_dir'):
+        if not config['storage'].get(key):
+            errors.append(f"storage.{key} 不能为空")
+
+    if not config['analysis'].get('system_prompt'):
+        errors.append("analysis.system_prompt 不能为空")
+
+    return errors
+
+
+def changed_sections(old_config, new_config):
+    """返回内容发生变化的顶层配置段"""
+    keys = set(old_config) | set(new_config)
+    return {key for key in keys if old_config.get(key) != new_config.get(key)}
+
+
+class ConfigWatcher:
+    def __init__(self, config_path, on_change, interval=2):
+        """
+        参数:
+            config_path: 配置文件路径
+            on_change: 配置变化且校验通过时的回调，参数为新配置字典
+            interval: 检查间隔（秒）
+        """
+        self.config_path = config_path
+        self.on_change = on_change
+        self.interval = interval
+
+        self.signature = self._signature()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.logger = logging.getLogger(__name__)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.config_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"检查配置文件时出错: {str(e)}")
+
+    def check(self):
+        """
+        配置文件变化时加载、校验并应用
+        返回: 是否应用了新配置
+        """
+        import yaml
+
+        signature = self._signature()
+        if signature is None or signature == self.signature:
+            return False
+        self.signature = signature
+
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+        except Exception as e:
+            self.logger.error(f"配置文件解析失败，保留当前配置: {str(e)}")
+            return False
+
+        errors = validate_config(config)
+        if errors:
+            self.logger.error(f"配置校验失败，保留当前配置: {'; '.join(errors)}")
+            return False
+
+        self.on_change(config)
+        return True
@@ -6,30 +6,106 @@
 
 import sqlite3
 import os
+import hashlib
 import logging
-from datetime import datetime, date
-from typing import List, Dict, Optional
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Optional, Tuple, Iterator
+
+from description_codec import DescriptionCodec, zstd_available
+
+# 可导出的表及其列
+EXPORT_COLUMNS = {
+    'activities': ('id', 'timestamp', 'date', 'description', 'screenshot_path', 'created_at'),
+    'daily_summaries': ('id', 'date', 'summary', 'activity_count', 'created_at'),
+}
+
+# 读取活动记录时关联描述字典表: 规范化存储的描述从descriptions读取（压缩的由description_text解压），
+# 尚未迁移的旧记录直接读取activities中的原文
+ACTIVITY_TABLE = 'activities LEFT JOIN descriptions ON descriptions.id = activities.description_id'
+ACTIVITY_DESCRIPTION = ('COALESCE(descriptions.text, description_text(descriptions.data, descriptions.dict_id), '
+                        'activities.description)')
+
+# 带（应用, 类别）分类列的表
+CLASSIFIED_TABLES = ('activities', 'activity_spans')
+
+# 按时长统计时的分组周期
+BREAKDOWN_PERIODS = {
+    'day': 'date',
+    'week': "strftime('%Y-W%W', date)",
+    'month': "strftime('%Y-%m', date)",
+    'total': "'total'",
+}
+
+# 按小时汇总表的分组方式
+HOURLY_GROUPS = {
+    'day': 'date',
+    # strftime('%w') 中0为周日
+    'heatmap': "CAST(strftime('%w', date) AS INTEGER), hour",
+    'category': 'category',
+    'week_category': "strftime('%Y-W%W', date), category",
+}
 
 class DatabaseManager:
-    def __init__(self, config):
+    def __init__(self, config, read_only=False):
+        """
+        参数:
+            config: 配置字典
+            read_only: 只读模式，供命令行快速查询使用，不创建目录、不执行建表语句
+        """
         self.config = config
         self.db_path = config['storage']['database']
         self.data_dir = config['storage']['data_dir']
+        self.read_only = read_only
+        self.logger = logging.getLogger(__name__)
+        
+        # 每次写入后递增，供进程内缓存判断数据是否变化
+        self.write_version = 0
+        # 已加载的描述压缩字典 {字典ID: DescriptionCodec}
+        self._codecs = {}
+        
+        if read_only:
+            return
         
         # 确保数据目录存在
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
-        
         # 初始化数据库
         self._init_database()
     
+    def apply_config(self, config):
+        """
+        热加载配置: 数据库路径变化时初始化新数据库并切换，之后的读写都使用新路径
+        返回: 数据库路径是否发生变化
+        """
+        db_path = config['storage']['database']
+        data_dir = config['storage']['data_dir']
+        self.config = config
+        if db_path == self.db_path:
+            return False
+        
+        old_path = self.db_path
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self._init_database()
+        # 让进程内的查询缓存失效
+        self.write_version += 1
+        self.logger.info(f"数据库已切换: {old_path} -> {db_path}")
+        return True
+    
+    def _connect(self):
+        """打开数据库连接，只读模式下以只读URI打开"""
+        if self.read_only:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True)
+        else:
+            conn = sqlite3.connect(self.db_path)
+        conn.create_function('description_text', 2, self._description_text)
+        return conn
+    
     def _init_database(self):
         """初始化数据库表"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 创建活动记录表
@@ -55,9 +131,95 @@ class DatabaseManager:
                     )
                 ''')
                 
+                # 活动时间段: 连续相似的采样合并为一段，记录起止时间和时长
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS activity_spans (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        date DATE NOT NULL,
+                        start_time DATETIME NOT NULL,
+                        end_time DATETIME NOT NULL,
+                        duration_seconds INTEGER NOT NULL,
+                        sample_count INTEGER NOT NULL,
+                        description TEXT NOT NULL,
+                        screenshot_path TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # 每日总结的压缩摘要，用于周/月汇总，source_hash对应所依据的每日总结
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS day_digests (
+                        date DATE PRIMARY KEY,
+                        digest TEXT NOT NULL,
+                        source_hash TEXT NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # 周/月汇总表，source_hash对应所依据的全部每日总结
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS period_summaries (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        period_type TEXT NOT NULL,
+                        period_start DATE NOT NULL,
+                        period_end DATE NOT NULL,
+                        summary TEXT NOT NULL,
+                        day_count INTEGER NOT NULL,
+                        source_hash TEXT NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE (period_type, period_start)
+                    )
+                ''')
+                
+                # 描述字典表: 相同的描述只保存一份，活动记录通过description_id引用；
+                # 长期未再出现的描述可用训练的zstd字典压缩，此时text为NULL，压缩内容在data中
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS descriptions (
+                        id INTEGER PRIMARY KEY,
+                        hash BLOB UNIQUE NOT NULL,
+                        text TEXT,
+                        data BLOB,
+                        dict_id INTEGER,
+                        refcount INTEGER NOT NULL DEFAULT 0,
+                        last_used DATE
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS description_dicts (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        data BLOB NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # 多客户端采集时记录来源客户端，本机追踪器写入的记录为NULL
+                self._ensure_column(cursor, 'activities', 'client_id', 'TEXT')
+                self._ensure_column(cursor, 'activity_spans', 'client_id', 'TEXT')
+                # 活动分类（应用, 类别），由ActivityClassifier后台补齐，NULL表示尚未分类
+                for table in CLASSIFIED_TABLES:
+                    self._ensure_column(cursor, table, 'application', 'TEXT')
+                    self._ensure_column(cursor, table, 'category', 'TEXT')
+                # 规范化存储的活动记录description为空串，描述在descriptions表中
+                self._ensure_column(cursor, 'activities', 'description_id', 'INTEGER')
+                self._init_description_triggers(cursor)
+                
                 # 创建索引
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_date ON activities(date)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_timestamp ON activities(timestamp)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_date ON activity_spans(date)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_client ON activities(client_id, date)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_client ON activity_spans(client_id, date)')
+                # 重新分析按截图路径回写
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_screenshot ON activities(screenshot_path)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_spans_screenshot ON activity_spans(screenshot_path)')
+                # 按日期范围统计各类别/应用时长时只读索引
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_spans_category
+                    ON activity_spans(date, category, application, duration_seconds)
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_category ON activities(date, category, application)')
+                
+                self._init_hourly_tables(cursor)
                 
                 conn.commit()
                 self.logger.info("数据库初始化成功")
@@ -65,26 +227,93 @@ class DatabaseManager:
         except Exception as e:
             self.logger.error(f"数据库初始化失败: {str(e)}")
     
-    def add_activity(self, description: str, screenshot_path: Optional[str] = None) -> bool:
+    @staticmethod
+    def _init_hourly_tables(cursor):
+        """
+        按小时汇总的活动时长，供长时间范围的统计使用，不随旧数据清理删除；
+        时间段新增或更新时触发器把日期标记为待重算，由refresh_hourly_buckets增量重算
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS hourly_activity (
+                date DATE NOT NULL,
+                hour INTEGER NOT NULL,
+                category TEXT NOT NULL DEFAULT '',
+                seconds INTEGER NOT NULL,
+                spans INTEGER NOT NULL,
+                PRIMARY KEY (date, hour, category)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE TABLE IF NOT EXISTS hourly_dirty_dates (date DATE PRIMARY KEY)')
+        for event in ('INSERT', 'UPDATE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_spans_{event.lower()}_hourly AFTER {event} ON activity_spans
+                BEGIN
+                    INSERT OR IGNORE INTO hourly_dirty_dates (date) VALUES (NEW.date);
+                END
+            ''')
+        # 旧数据库第一次升级时重算全部已有的时间段
+        cursor.execute('SELECT 1 FROM hourly_activity LIMIT 1')
+        if cursor.fetchone() is None:
+            cursor.execute('INSERT OR IGNORE INTO hourly_dirty_dates (date) SELECT DISTINCT date FROM activity_spans')
+    
+    @staticmethod
+    def _init_description_triggers(cursor):
+        """由触发器维护描述的引用计数，插入、删除和重新分析活动记录的任何路径都不会漏记"""
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_activities_description_insert
+            AFTER INSERT ON activities WHEN NEW.description_id IS NOT NULL
+            BEGIN
+                UPDATE descriptions SET refcount = refcount + 1, last_used = MAX(COALESCE(last_used, NEW.date), NEW.date)
+                WHERE id = NEW.description_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_activities_description_delete
+            AFTER DELETE ON activities WHEN OLD.description_id IS NOT NULL
+            BEGIN
+                UPDATE descriptions SET refcount = refcount - 1 WHERE id = OLD.description_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_activities_description_update
+            AFTER UPDATE OF description_id ON activities WHEN OLD.description_id IS NOT NEW.description_id
+            BEGIN
+                UPDATE descriptions SET refcount = refcount - 1 WHERE id = OLD.description_id;
+                UPDATE descriptions SET refcount = refcount + 1, last_used = MAX(COALESCE(last_used, NEW.date), NEW.date)
+                WHERE id = NEW.description_id;
+            END
+        ''')
+    
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, column_type: str):
+        """旧数据库缺少该列时补上"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+    
+    def add_activity(self, description: str, screenshot_path: Optional[str] = None,
+                     timestamp: Optional[datetime] = None) -> bool:
         """
         添加活动记录
         参数:
             description: 活动描述
             screenshot_path: 截图路径（可选）
+            timestamp: 截图时间（可选，补录时传入原始截图时间，默认当前时间）
         返回: 是否成功
         """
         try:
-            current_time = datetime.now()
+            current_time = timestamp or datetime.now()
             current_date = current_time.date()
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO activities (timestamp, date, description, screenshot_path)
-                    VALUES (?, ?, ?, ?)
-                ''', (current_time, current_date, description, screenshot_path))
+                    INSERT INTO activities (timestamp, date, description, description_id, screenshot_path)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (current_time, current_date, *self._stored_description(cursor, description), screenshot_path))
                 
                 conn.commit()
+                self.write_version += 1
                 self.logger.info(f"活动记录已添加: {description[:50]}...")
                 return True
                 
@@ -92,6 +321,400 @@ class DatabaseManager:
             self.logger.error(f"添加活动记录失败: {str(e)}")
             return False
     
+    def add_activities(self, records: List[Tuple[datetime, str, Optional[str], Optional[str]]]) -> bool:
+        """
+        在一个事务中批量添加活动记录
+        参数: records - [(截图时间, 描述, 截图路径, 客户端ID)]
+        返回: 是否成功
+        """
+        if not records:
+            return True
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO activities (timestamp, date, description, description_id, screenshot_path, client_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(timestamp, timestamp.date(), *self._stored_description(cursor, description),
+                       screenshot_path, client_id)
+                      for timestamp, description, screenshot_path, client_id in records])
+                
+                conn.commit()
+                self.write_version += 1
+                self.logger.info(f"批量添加了 {len(records)} 条活动记录")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"批量添加活动记录失败: {str(e)}")
+            return False
+    
+    def open_span(self, description: str, start_time: datetime, end_time: datetime,
+                  screenshot_path: Optional[str] = None, client_id: Optional[str] = None) -> Optional[int]:
+        """
+        新建一个活动时间段
+        参数:
+            description: 代表性描述
+            start_time: 第一帧的截图时间
+            end_time: 时间段结束时间（最后一帧的截图时间加一个采样间隔）
+            screenshot_path: 代表性截图路径（可选）
+            client_id: 来源客户端（多客户端采集时）
+        返回: 时间段ID，失败时返回None
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO activity_spans
+                    (date, start_time, end_time, duration_seconds, sample_count, description, screenshot_path, client_id)
+                    VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                ''', (start_time.date(), start_time, end_time,
+                      int((end_time - start_time).total_seconds()), description, screenshot_path, client_id))
+                
+                conn.commit()
+                self.write_version += 1
+                return cursor.lastrowid
+                
+        except Exception as e:
+            self.logger.error(f"新建活动时间段失败: {str(e)}")
+            return None
+    
+    def extend_span(self, span_id: int, start_time: datetime, end_time: datetime,
+                    sample_count: int, screenshot_path: Optional[str] = None) -> bool:
+        """
+        延长活动时间段
+        参数:
+            span_id: 时间段ID
+            start_time: 时间段开始时间
+            end_time: 新的结束时间
+            sample_count: 累计采样数
+            screenshot_path: 时间段还没有截图时补上
+        返回: 是否成功
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE activity_spans
+                    SET end_time = ?, duration_seconds = ?, sample_count = ?,
+                        screenshot_path = COALESCE(screenshot_path, ?)
+                    WHERE id = ?
+                ''', (end_time, int((end_time - start_time).total_seconds()), sample_count,
+                      screenshot_path, span_id))
+                
+                conn.commit()
+                self.write_version += 1
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"更新活动时间段失败: {str(e)}")
+            return False
+    
+    def get_last_span(self, client_id: Optional[str] = None) -> Optional[Dict]:
+        """获取最近的一个活动时间段（本机或指定客户端），用于重启后续接"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, start_time, end_time, sample_count, description, screenshot_path
+                    FROM activity_spans
+                    WHERE client_id IS ?
+                    ORDER BY end_time DESC
+                    LIMIT 1
+                ''', (client_id,))
+                
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'id': row[0],
+                        'start_time': row[1],
+                        'end_time': row[2],
+                        'sample_count': row[3],
+                        'description': row[4],
+                        'screenshot_path': row[5]
+                    }
+                return None
+                
+        except Exception as e:
+            self.logger.error(f"获取活动时间段失败: {str(e)}")
+            return None
+    
+    def get_spans_by_date(self, target_date: date) -> List[Dict]:
+        """
+        获取指定日期的活动时间段，按开始时间排序
+        参数: target_date - 目标日期
+        返回: 时间段列表
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT start_time, end_time, duration_seconds, sample_count, description, screenshot_path
+                    FROM activity_spans
+                    WHERE date = ?
+                    ORDER BY start_time
+                ''', (target_date,))
+                
+                return [
+                    {
+                        'start_time': row[0],
+                        'end_time': row[1],
+                        'duration_seconds': row[2],
+                        'sample_count': row[3],
+                        'description': row[4],
+                        'screenshot_path': row[5]
+                    }
+                    for row in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"获取活动时间段失败: {str(e)}")
+            return []
+    
+    def get_tracked_seconds_by_date(self, target_date: date) -> int:
+        """获取指定日期记录到的活动总时长（秒）"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COALESCE(SUM(duration_seconds), 0) FROM activity_spans WHERE date = ?
+                ''', (target_date,))
+                return cursor.fetchone()[0]
+                
+        except Exception as e:
+            self.logger.error(f"获取活动时长失败: {str(e)}")
+            return 0
+    
+    def apply_reanalysis(self, records: List[Tuple[datetime, str, str]]) -> bool:
+        """
+        在一个事务中批量回写重新分析的结果
+        参数: records - [(截图时间, 新描述, 截图路径)]，已有记录按截图路径更新，否则按截图时间插入；
+              以该截图为代表的活动时间段一并更新描述
+        返回: 是否成功
+        """
+        if not records:
+            return True
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                rows = [(captured_at, *self._stored_description(cursor, description), screenshot_path, description)
+                        for captured_at, description, screenshot_path in records]
+                # 描述变化后需要重新分类
+                cursor.executemany('''
+                    UPDATE activities SET description = ?, description_id = ?, application = NULL, category = NULL
+                    WHERE screenshot_path = ?
+                ''', [(stored, description_id, path) for _, stored, description_id, path, _ in rows])
+                updated = cursor.rowcount
+                cursor.executemany('''
+                    INSERT INTO activities (timestamp, date, description, description_id, screenshot_path)
+                    SELECT ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM activities WHERE screenshot_path = ?)
+                ''', [(captured_at, captured_at.date(), stored, description_id, path, path)
+                      for captured_at, stored, description_id, path, _ in rows])
+                inserted = cursor.rowcount
+                cursor.executemany('''
+                    UPDATE activity_spans SET description = ?, application = NULL, category = NULL
+                    WHERE screenshot_path = ?
+                ''', [(description, path) for _, _, _, path, description in rows])
+                spans = cursor.rowcount
+                
+                conn.commit()
+                self.write_version += 1
+                self.logger.info(f"重新分析结果已回写: 更新 {updated} 条, 新增 {inserted} 条, 时间段 {spans} 个")
+                return True
+        
+        except Exception as e:
+            self.logger.error(f"回写重新分析结果失败: {str(e)}")
+            return False
+    
+    def get_unclassified(self, table: str, limit: int = 500) -> List[Tuple[int, str]]:
+        """
+        获取尚未分类的记录
+        参数:
+            table: activities 或 activity_spans
+            limit: 最多返回的行数
+        返回: [(id, 描述)]，按id排序
+        """
+        if table not in CLASSIFIED_TABLES:
+            raise ValueError(f"不支持分类的表: {table}")
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                if table == 'activities':
+                    source, description = ACTIVITY_TABLE, ACTIVITY_DESCRIPTION
+                else:
+                    source, description = table, 'description'
+                cursor.execute(f'''
+                    SELECT {table}.id, {description} FROM {source}
+                    WHERE category IS NULL
+                    ORDER BY {table}.id
+                    LIMIT ?
+                ''', (limit,))
+                return cursor.fetchall()
+                
+        except Exception as e:
+            self.logger.error(f"获取未分类记录失败: {str(e)}")
+            return []
+    
+    def set_classifications(self, table: str, rows: List[Tuple[str, str, int]]) -> bool:
+        """
+        批量写入分类结果
+        参数:
+            table: activities 或 activity_spans
+            rows: [(应用, 类别, id)]
+        返回: 是否成功
+        """
+        if table not in CLASSIFIED_TABLES:
+            raise ValueError(f"不支持分类的表: {table}")
+        try:
+            with self._connect() as conn:
+                conn.executemany(f'UPDATE {table} SET application = ?, category = ? WHERE id = ?', rows)
+                conn.commit()
+                self.write_version += 1
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"写入分类结果失败: {str(e)}")
+            return False
+    
+    def reset_classifications(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+        """
+        清除日期范围内的分类结果（修改分类规则后重新分类）
+        返回: 清除的行数
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                count = 0
+                for table in CLASSIFIED_TABLES:
+                    cursor.execute(f'''
+                        UPDATE {table} SET application = NULL, category = NULL
+                        WHERE date >= COALESCE(?, date) AND date <= COALESCE(?, date)
+                    ''', (start_date, end_date))
+                    count += cursor.rowcount
+                conn.commit()
+                self.write_version += 1
+                return count
+                
+        except Exception as e:
+            self.logger.error(f"清除分类结果失败: {str(e)}")
+            return 0
+    
+    def get_time_breakdown(self, start_date: date, end_date: date, period: str = 'total') -> List[Dict]:
+        """
+        按（周期, 类别, 应用）汇总日期范围内（含首尾）的活动时长，在SQL中聚合
+        参数:
+            start_date: 起始日期
+            end_date: 结束日期
+            period: 分组周期 day/week/month/total
+        返回: [{'period', 'category', 'application', 'seconds'}]，按周期和时长排序，未分类的记录类别为None
+        """
+        period_expr = BREAKDOWN_PERIODS.get(period)
+        if period_expr is None:
+            raise ValueError(f"不支持的统计周期: {period}")
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {period_expr} AS period, category, application, SUM(duration_seconds) AS seconds
+                    FROM activity_spans
+                    WHERE date BETWEEN ? AND ?
+                    GROUP BY period, category, application
+                    ORDER BY period, seconds DESC
+                ''', (start_date, end_date))
+                
+                return [
+                    {'period': row[0], 'category': row[1], 'application': row[2], 'seconds': row[3]}
+                    for row in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"统计分类时长失败: {str(e)}")
+            return []
+    
+    @staticmethod
+    def _split_by_hour(spans, target_date):
+        """
+        把一天的时间段按小时切分
+        参数: spans - [(开始时间, 结束时间, 类别)]
+        返回: {(小时, 类别): [秒数, 时间段数]}
+        """
+        day_start = datetime.combine(target_date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        buckets = {}
+        for start_time, end_time, category in spans:
+            start = max(datetime.fromisoformat(str(start_time)), day_start)
+            # 跨过午夜的部分不计入（属于下一天的时间段）
+            end = min(datetime.fromisoformat(str(end_time)), day_end)
+            while start < end:
+                hour_end = min(start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1), end)
+                bucket = buckets.setdefault((start.hour, category or ''), [0, 0])
+                bucket[0] += (hour_end - start).total_seconds()
+                bucket[1] += 1
+                start = hour_end
+        return buckets
+    
+    def refresh_hourly_buckets(self) -> int:
+        """
+        重算被标记为待重算的日期的按小时汇总
+        返回: 重算的天数
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT date FROM hourly_dirty_dates')
+                dates = [row[0] for row in cursor.fetchall()]
+                for day in dates:
+                    cursor.execute('DELETE FROM hourly_dirty_dates WHERE date = ?', (day,))
+                    cursor.execute('''
+                        SELECT start_time, end_time, category FROM activity_spans WHERE date = ?
+                    ''', (day,))
+                    buckets = self._split_by_hour(cursor.fetchall(), date.fromisoformat(str(day)))
+                    # 时间段已被清理的日期保留原有汇总
+                    if not buckets:
+                        continue
+                    cursor.execute('DELETE FROM hourly_activity WHERE date = ?', (day,))
+                    cursor.executemany('''
+                        INSERT INTO hourly_activity (date, hour, category, seconds, spans)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [(day, hour, category, int(round(seconds)), count)
+                          for (hour, category), (seconds, count) in buckets.items()])
+                conn.commit()
+                if dates:
+                    self.write_version += 1
+                return len(dates)
+                
+        except Exception as e:
+            self.logger.error(f"更新按小时汇总失败: {str(e)}")
+            return 0
+    
+    def get_hourly_aggregate(self, start_date: date, end_date: date, group: str) -> List[Tuple]:
+        """
+        从按小时汇总表统计日期范围内（含首尾）的活动时长，不读取原始记录
+        参数:
+            start_date: 起始日期
+            end_date: 结束日期
+            group: 分组方式，见HOURLY_GROUPS
+        返回: [(分组列..., 秒数)]，按分组列排序
+        """
+        columns = HOURLY_GROUPS.get(group)
+        if columns is None:
+            raise ValueError(f"不支持的分组方式: {group}")
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {columns}, SUM(seconds)
+                    FROM hourly_activity
+                    WHERE date BETWEEN ? AND ?
+                    GROUP BY {columns}
+                    ORDER BY {columns}
+                ''', (start_date, end_date))
+                return cursor.fetchall()
+                
+        except Exception as e:
+            self.logger.error(f"获取按小时汇总失败: {str(e)}")
+            return []
+    
     def get_activities_by_date(self, target_date: date) -> List[Dict]:
         """
         获取指定日期的活动记录
@@ -99,11 +722,11 @@ class DatabaseManager:
         返回: 活动记录列表
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT timestamp, description, screenshot_path
-                    FROM activities
+                cursor.execute(f'''
+                    SELECT timestamp, {ACTIVITY_DESCRIPTION}, screenshot_path
+                    FROM {ACTIVITY_TABLE}
                     WHERE date = ?
                     ORDER BY timestamp
                 ''', (target_date,))
@@ -122,6 +745,139 @@ class DatabaseManager:
             self.logger.error(f"获取活动记录失败: {str(e)}")
             return []
     
+    def get_activities_by_range(self, start_date: date, end_date: date) -> List[Dict]:
+        """
+        获取日期范围内（含首尾）的活动记录
+        参数:
+            start_date: 起始日期
+            end_date: 结束日期
+        返回: 活动记录列表
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT timestamp, {ACTIVITY_DESCRIPTION}, screenshot_path
+                    FROM {ACTIVITY_TABLE}
+                    WHERE date BETWEEN ? AND ?
+                    ORDER BY timestamp
+                ''', (start_date, end_date))
+                
+                return [
+                    {'timestamp': row[0], 'description': row[1], 'screenshot_path': row[2]}
+                    for row in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"获取活动记录失败: {str(e)}")
+            return []
+    
+    def iter_export_rows(self, table: str, start_date: Optional[date] = None,
+                         end_date: Optional[date] = None, after_id: int = 0,
+                         chunk_size: int = 1000) -> Iterator[List[Tuple]]:
+        """
+        按ID顺序分块读取表中的行，内存占用与导出范围无关
+        参数:
+            table: 表名，见EXPORT_COLUMNS
+            start_date: 起始日期（含），None表示不限
+            end_date: 结束日期（含），None表示不限
+            after_id: 只读取ID大于该值的行，用于增量导出
+            chunk_size: 每块的行数
+        返回: 每次产出一块行元组，列顺序与EXPORT_COLUMNS一致
+        """
+        columns = [f'{table}.{column}' for column in EXPORT_COLUMNS[table]]
+        source = table
+        if table == 'activities':
+            columns[EXPORT_COLUMNS[table].index('description')] = ACTIVITY_DESCRIPTION
+            source = ACTIVITY_TABLE
+        conditions = [f'{table}.id > ?']
+        params = [after_id]
+        if start_date is not None:
+            conditions.append('date >= ?')
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append('date <= ?')
+            params.append(end_date)
+        
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {', '.join(columns)}
+                FROM {source}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {table}.id
+            ''', params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def search_activities(self, keyword: str, limit: int = 50) -> List[Dict]:
+        """
+        按关键词搜索活动描述（按时间倒序）
+        参数:
+            keyword: 关键词
+            limit: 最多返回条数
+        返回: 活动记录列表
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT timestamp, {ACTIVITY_DESCRIPTION}, screenshot_path
+                    FROM {ACTIVITY_TABLE}
+                    WHERE {ACTIVITY_DESCRIPTION} LIKE ?
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                ''', (f"%{keyword}%", limit))
+                
+                return [
+                    {'timestamp': row[0], 'description': row[1], 'screenshot_path': row[2]}
+                    for row in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"搜索活动记录失败: {str(e)}")
+            return []
+    
+    def get_activity_count_by_date(self, target_date: date) -> int:
+        """获取指定日期的活动记录数量"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*) FROM activities WHERE date = ?', (target_date,))
+                return cursor.fetchone()[0]
+                
+        except Exception as e:
+            self.logger.error(f"获取活动数量失败: {str(e)}")
+            return 0
+    
+    def get_client_stats(self, target_date: date) -> List[Dict]:
+        """
+        按客户端统计指定日期的活动记录数和记录时长（多客户端采集）
+        返回: [{'client_id', 'activities', 'tracked_seconds'}]，本机记录的client_id为None
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT client_id, COUNT(*) FROM activities WHERE date = ? GROUP BY client_id
+                ''', (target_date,))
+                stats = {row[0]: {'client_id': row[0], 'activities': row[1], 'tracked_seconds': 0}
+                         for row in cursor.fetchall()}
+                cursor.execute('''
+                    SELECT client_id, SUM(duration_seconds) FROM activity_spans WHERE date = ? GROUP BY client_id
+                ''', (target_date,))
+                for client_id, seconds in cursor.fetchall():
+                    stats.setdefault(client_id, {'client_id': client_id, 'activities': 0, 'tracked_seconds': 0})
+                    stats[client_id]['tracked_seconds'] = seconds
+                return sorted(stats.values(), key=lambda item: item['client_id'] or '')
+                
+        except Exception as e:
+            self.logger.error(f"获取客户端统计失败: {str(e)}")
+            return []
+    
     def get_today_activities(self) -> List[Dict]:
         """获取今天的活动记录"""
         return self.get_activities_by_date(date.today())
@@ -136,10 +892,9 @@ class DatabaseManager:
         """
         try:
             # 获取当日活动数量
-            activities = self.get_activities_by_date(target_date)
-            activity_count = len(activities)
+            activity_count = self.get_activity_count_by_date(target_date)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 使用REPLACE来更新或插入
@@ -149,6 +904,7 @@ class DatabaseManager:
                 ''', (target_date, summary, activity_count))
                 
                 conn.commit()
+                self.write_version += 1
                 self.logger.info(f"每日总结已保存: {target_date}")
                 return True
                 
@@ -163,7 +919,7 @@ class DatabaseManager:
         返回: 总结信息字典或None
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT summary, activity_count, created_at
@@ -185,6 +941,127 @@ class DatabaseManager:
             self.logger.error(f"获取每日总结失败: {str(e)}")
             return None
     
+    def get_daily_summaries_in_range(self, start_date: date, end_date: date) -> List[Dict]:
+        """
+        获取日期范围内（含首尾）的每日总结，按日期排序
+        参数:
+            start_date: 起始日期
+            end_date: 结束日期
+        返回: 总结信息列表
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT date, summary, activity_count
+                    FROM daily_summaries
+                    WHERE date BETWEEN ? AND ?
+                    ORDER BY date
+                ''', (start_date, end_date))
+                
+                return [
+                    {'date': row[0], 'summary': row[1], 'activity_count': row[2]}
+                    for row in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            self.logger.error(f"获取每日总结失败: {str(e)}")
+            return []
+    
+    def get_day_digest(self, target_date: date) -> Optional[Dict]:
+        """
+        获取指定日期的每日摘要
+        返回: {'digest', 'source_hash'} 或None
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT digest, source_hash FROM day_digests WHERE date = ?
+                ''', (target_date,))
+                
+                row = cursor.fetchone()
+                if row:
+                    return {'digest': row[0], 'source_hash': row[1]}
+                return None
+                
+        except Exception as e:
+            self.logger.error(f"获取每日摘要失败: {str(e)}")
+            return None
+    
+    def save_day_digest(self, target_date: date, digest: str, source_hash: str) -> bool:
+        """保存每日摘要"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    REPLACE INTO day_digests (date, digest, source_hash)
+                    VALUES (?, ?, ?)
+                ''', (target_date, digest, source_hash))
+                
+                conn.commit()
+                self.write_version += 1
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"保存每日摘要失败: {str(e)}")
+            return False
+    
+    def get_period_summary(self, period_type: str, period_start: date) -> Optional[Dict]:
+        """
+        获取周/月汇总
+        参数:
+            period_type: 'week' 或 'month'
+            period_start: 周期起始日期
+        返回: 汇总信息字典或None
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT period_end, summary, day_count, source_hash, created_at
+                    FROM period_summaries
+                    WHERE period_type = ? AND period_start = ?
+                ''', (period_type, period_start))
+                
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'period_type': period_type,
+                        'period_start': period_start,
+                        'period_end': row[0],
+                        'summary': row[1],
+                        'day_count': row[2],
+                        'source_hash': row[3],
+                        'created_at': row[4]
+                    }
+                return None
+                
+        except Exception as e:
+            self.logger.error(f"获取周期汇总失败: {str(e)}")
+            return None
+    
+    def save_period_summary(self, period_type: str, period_start: date, period_end: date,
+                            summary: str, day_count: int, source_hash: str) -> bool:
+        """保存周/月汇总"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    REPLACE INTO period_summaries
+                    (period_type, period_start, period_end, summary, day_count, source_hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (period_type, period_start, period_end, summary, day_count, source_hash))
+                
+                conn.commit()
+                self.write_version += 1
+                self.logger.info(f"周期汇总已保存: {period_type} {period_start}")
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"保存周期汇总失败: {str(e)}")
+            return False
+    
     def get_activity_stats(self, days: int = 7) -> Dict:
         """
         获取活动统计信息
@@ -192,7 +1069,7 @@ class DatabaseManager:
         返回: 统计信息字典
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 总活动数
@@ -242,7 +1119,7 @@ class DatabaseManager:
         参数: days_to_keep - 保留天数（默认30天）
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 删除旧的活动记录
@@ -253,16 +1130,217 @@ class DatabaseManager:
                 
                 deleted_activities = cursor.rowcount
                 
-                # 删除旧的总结
+                # 删除旧的总结: 周/月汇总依据当期全部的每日总结，
+                # 保留从截止日期所在月份的第一天（再往前6天覆盖跨月的周）开始的总结
                 cursor.execute('''
                     DELETE FROM daily_summaries
-                    WHERE date < date('now', '-{} days')
+                    WHERE date < date('now', '-{} days', 'start of month', '-6 days')
                 '''.format(days_to_keep))
                 
                 deleted_summaries = cursor.rowcount
                 
+                # 删除旧的活动时间段
+                cursor.execute('''
+                    DELETE FROM activity_spans
+                    WHERE date < date('now', '-{} days')
+                '''.format(days_to_keep))
+                
+                # 删除不再被引用的描述（引用计数由触发器在删除活动记录时扣减）
+                cursor.execute('DELETE FROM descriptions WHERE refcount <= 0')
+                
                 conn.commit()
+                self.write_version += 1
                 self.logger.info(f"数据清理完成: 删除了 {deleted_activities} 条活动记录, {deleted_summaries} 条总结")
                 
         except Exception as e:
-            self.logger.error(f"数据清理失败: {str(e)}")
\ No newline at end of file
+            self.logger.error(f"数据清理失败: {str(e)}")
+            return
+        
+        if self.config.get('descriptions', {}).get('compress_after_days', 0):
+            self.compress_descriptions()    
+    def _stored_description(self, cursor, description: str) -> Tuple[str, Optional[int]]:
+        """
+        活动记录中实际写入的描述
+        返回: (description列的值, description_id)；规范化存储时描述写入字典表，description列为空串
+        """
+        if not self.config.get('descriptions', {}).get('normalize', True):
+            return description, None
+        digest = hashlib.blake2b(description.encode('utf-8'), digest_size=16).digest()
+        cursor.execute('INSERT OR IGNORE INTO descriptions (hash, text) VALUES (?, ?)', (digest, description))
+        cursor.execute('SELECT id FROM descriptions WHERE hash = ?', (digest,))
+        return '', cursor.fetchone()[0]
+    
+    def _description_text(self, data, dict_id):
+        """SQL函数description_text: 解压压缩的描述，未压缩时返回NULL"""
+        if data is None:
+            return None
+        codec = self._codecs.get(dict_id)
+        if codec is None:
+            with self._connect() as conn:
+                row = conn.execute('SELECT data FROM description_dicts WHERE id = ?', (dict_id,)).fetchone()
+            codec = self._codecs[dict_id] = DescriptionCodec(dict_id, row[0])
+        return codec.decompress(data)
+    
+    def migrate_descriptions(self, batch_size: Optional[int] = None, progress=None) -> int:
+        """
+        把旧的活动记录原地转换为规范化存储，每批一个事务，中断后再次运行从未转换的记录继续
+        参数:
+            batch_size: 每批转换的行数
+            progress: 每批完成后调用 progress(已转换行数)
+        返回: 转换的行数，失败时返回-1
+        """
+        batch_size = batch_size or self.config.get('descriptions', {}).get('batch_size', 1000)
+        converted = 0
+        last_id = 0
+        try:
+            while True:
+                with self._connect() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT id, description FROM activities
+                        WHERE id > ? AND description_id IS NULL
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (last_id, batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    digests = {}
+                    updates = []
+                    for row_id, description in rows:
+                        digest = digests.get(description)
+                        if digest is None:
+                            digest = digests[description] = hashlib.blake2b(
+                                description.encode('utf-8'), digest_size=16).digest()
+                        updates.append((digest, row_id))
+                    cursor.executemany('INSERT OR IGNORE INTO descriptions (hash, text) VALUES (?, ?)',
+                                       [(digest, description) for description, digest in digests.items()])
+                    cursor.executemany('''
+                        UPDATE activities
+                        SET description_id = (SELECT id FROM descriptions WHERE hash = ?), description = ''
+                        WHERE id = ?
+                    ''', updates)
+                    conn.commit()
+                converted += len(rows)
+                last_id = rows[-1][0]
+                self.write_version += 1
+                if progress:
+                    progress(converted)
+            
+            if converted:
+                self.logger.info(f"描述迁移完成: 转换了 {converted} 条活动记录")
+            return converted
+            
+        except Exception as e:
+            self.logger.error(f"描述迁移失败（已转换 {converted} 条，再次运行会继续）: {str(e)}")
+            return -1
+    
+    def _latest_codec(self, conn) -> Optional[DescriptionCodec]:
+        """最新的压缩字典，还没有时用已有描述训练一个"""
+        descriptions_config = self.config.get('descriptions', {})
+        row = conn.execute('SELECT id, data FROM description_dicts ORDER BY id DESC LIMIT 1').fetchone()
+        if row is None:
+            samples = [text for (text,) in conn.execute('''
+                SELECT text FROM descriptions WHERE text IS NOT NULL ORDER BY RANDOM() LIMIT ?
+            ''', (descriptions_config.get('dict_samples', 5000),))]
+            data = DescriptionCodec.train(samples, descriptions_config.get('dict_size_kb', 64) * 1024)
+            if data is None:
+                return None
+            cursor = conn.execute('INSERT INTO description_dicts (data) VALUES (?)', (data,))
+            conn.commit()
+            row = (cursor.lastrowid, data)
+        codec = self._codecs.get(row[0])
+        if codec is None:
+            codec = self._codecs[row[0]] = DescriptionCodec(row[0], row[1])
+        return codec
+    
+    def compress_descriptions(self, older_than_days: Optional[int] = None) -> int:
+        """
+        用zstd字典压缩超过指定天数未再出现的描述，只保留比原文小的压缩结果
+        参数: older_than_days - 默认使用配置中的compress_after_days
+        返回: 压缩的描述数
+        """
+        descriptions_config = self.config.get('descriptions', {})
+        if older_than_days is None:
+            older_than_days = descriptions_config.get('compress_after_days', 0)
+        if not zstd_available():
+            self.logger.warning("未安装zstandard，跳过描述压缩（pip install zstandard）")
+            return 0
+        batch_size = descriptions_config.get('batch_size', 1000)
+        compressed = 0
+        try:
+            with self._connect() as conn:
+                codec = self._latest_codec(conn)
+                if codec is None:
+                    return 0
+                last_id = 0
+                while True:
+                    rows = conn.execute('''
+                        SELECT id, text FROM descriptions
+                        WHERE id > ? AND text IS NOT NULL AND last_used < date('now', ?)
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (last_id, f'-{older_than_days} days', batch_size)).fetchall()
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    updates = []
+                    for row_id, text in rows:
+                        data = codec.compress(text)
+                        if len(data) < len(text.encode('utf-8')):
+                            updates.append((data, codec.dict_id, row_id))
+                    conn.executemany('UPDATE descriptions SET data = ?, dict_id = ?, text = NULL WHERE id = ?', updates)
+                    conn.commit()
+                    compressed += len(updates)
+            
+            if compressed:
+                self.write_version += 1
+                self.logger.info(f"已压缩 {compressed} 条描述")
+            return compressed
+            
+        except Exception as e:
+            self.logger.error(f"压缩描述失败: {str(e)}")
+            return compressed
+    
+    def get_description_stats(self) -> Dict:
+        """描述存储情况: 未迁移的活动记录数、字典中的描述数、已压缩数及各自占用的字节数"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(description AS BLOB))), 0)
+                    FROM activities WHERE description_id IS NULL
+                ''')
+                legacy_rows, legacy_bytes = cursor.fetchone()
+                cursor.execute('''
+                    SELECT COUNT(*), COUNT(data), COALESCE(SUM(refcount), 0),
+                           COALESCE(SUM(COALESCE(LENGTH(CAST(text AS BLOB)), LENGTH(data))), 0)
+                    FROM descriptions
+                ''')
+                unique, compressed, references, stored_bytes = cursor.fetchone()
+                return {
+                    'legacy_rows': legacy_rows,
+                    'legacy_bytes': legacy_bytes,
+                    'unique_descriptions': unique,
+                    'compressed': compressed,
+                    'references': references,
+                    'stored_bytes': stored_bytes,
+                }
+                
+        except Exception as e:
+            self.logger.error(f"获取描述存储统计失败: {str(e)}")
+            return {}
+    
+    def vacuum(self) -> bool:
+        """整理数据库文件，回收迁移和清理释放的空间"""
+        try:
+            conn = self._connect()
+            try:
+                conn.execute('VACUUM')
+            finally:
+                conn.close()
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"整理数据库失败: {str(e)}")
+            return False
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+活动描述压缩模块
+活动描述大多是相似的短句，单独压缩几乎没有收益；用从已有描述训练的zstd字典压缩后通常只剩原来的几分之一。
+需要安装zstandard（pip install zstandard），未安装时不压缩
+"""
+
+import logging
+
+# 样本太少时训练出的字典没有意义，zstd也会直接报错
+MIN_TRAINING_SAMPLES = 100
+
+
+def zstd_available():
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class DescriptionCodec:
+    def __init__(self, dict_id, dict_data, level=9):
+        """
+        参数:
+            dict_id: 字典在description_dicts表中的ID，写入每条压缩的描述
+            dict_data: 训练得到的字典内容
+            level: 压缩级别
+        """
+        import zstandard
+        self.zstd = zstandard
+        self.dict_id = dict_id
+        self.dictionary = zstandard.ZstdCompressionDict(dict_data)
+        self.level = level
+
+    @staticmethod
+    def train(samples, dict_size):
+        """
+        从描述样本训练字典
+        返回: 字典内容，样本不足或训练失败时返回None
+        """
+        logger = logging.getLogger(__name__)
+        if len(samples) < MIN_TRAINING_SAMPLES:
+            logger.info(f"描述样本只有 {len(samples)} 条，暂不训练压缩字典")
+            return None
+        import zstandard
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, [sample.encode('utf-8') for sample in samples])
+            return dictionary.as_bytes()
+        except zstandard.ZstdError as e:
+            logger.warning(f"训练描述压缩字典失败: {str(e)}")
+            return None
+
+    def compress(self, text):
+        # 压缩器和解压器不能跨线程共用，每次新建（字典只在第一次使用时加载）
+        return self.zstd.ZstdCompressor(level=self.level, dict_data=self.dictionary).compress(text.encode('utf-8'))
+
+    def decompress(self, data):
+        return self.zstd.ZstdDecompressor(dict_data=self.dictionary).decompress(data).decode('utf-8')
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+数据导出模块
+把活动记录和每日总结流式导出为JSONL、CSV或Parquet（需要安装pyarrow），
+按块读取和写入，内存占用与导出范围无关；支持基于水位线的增量导出
+"""
+
+import os
+import csv
+import json
+import logging
+from datetime import datetime
+
+from database_manager import EXPORT_COLUMNS
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+# 水位线文件，记录每张表已导出的最大ID
+WATERMARK_FILE = 'export_watermark.json'
+
+
+class JsonlWriter:
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_rows(self, rows):
+        self.file.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        # utf-8-sig 让Excel正确识别中文
+        self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """每个数据块写成一个row group"""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.columns = columns
+        # SQLite中的日期时间以文本保存，导出时保持原样
+        self.schema = pa.schema([
+            (name, pa.int64() if name in ('id', 'activity_count') else pa.string())
+            for name in columns
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        arrays = [
+            self.pa.array([row[i] for row in rows], type=self.schema.field(i).type)
+            for i in range(len(self.columns))
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    'jsonl': JsonlWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class Exporter:
+    def __init__(self, config, db_manager):
+        export_config = config.get('export', {})
+        self.db_manager = db_manager
+        self.output_dir = export_config.get('output_dir', os.path.join(config['storage']['data_dir'], 'exports'))
+        self.chunk_size = export_config.get('chunk_size', 1000)
+        self.watermark_path = os.path.join(config['storage']['data_dir'], WATERMARK_FILE)
+
+        self.logger = logging.getLogger(__name__)
+
+    def load_watermarks(self):
+        try:
+            with open(self.watermark_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_watermark(self, table, fmt, last_id):
+        watermarks = self.load_watermarks()
+        watermarks[f"{table}:{fmt}"] = {'last_id': last_id, 'exported_at': datetime.now().isoformat()}
+        with open(self.watermark_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(self.watermark_path + '.tmp', self.watermark_path)
+
+    def default_output_path(self, table, fmt, incremental=False):
+        suffix = '_incremental' if incremental else ''
+        name = f"{table}{suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        return os.path.join(self.output_dir, name)
+
+    def export(self, table, fmt, output_path=None, start_date=None, end_date=None, incremental=False):
+        """
+        导出一张表
+        参数:
+            table: 'activities' 或 'daily_summaries'
+            fmt: 'jsonl'、'csv' 或 'parquet'
+            output_path: 输出文件路径，None时写入导出目录
+            start_date / end_date: 日期范围（含），None表示不限
+            incremental: 只导出上次导出之后新增的行，成功后推进水位线；不能与日期范围同时使用
+        返回: (输出路径, 导出行数)，增量导出没有新增记录时路径为None；失败时返回None
+        """
+        if incremental and (start_date or end_date):
+            # 水位线按ID推进，范围外被跳过的行之后再也不会导出
+            raise ValueError("增量导出不能与日期范围同时使用")
+        if fmt == 'parquet' and not parquet_available():
+            self.logger.error("导出Parquet需要安装pyarrow: pip install pyarrow")
+            return None
+
+        after_id = 0
+        if incremental:
+            after_id = self.load_watermarks().get(f"{table}:{fmt}", {}).get('last_id', 0)
+
+        output_path = output_path or self.default_output_path(table, fmt, incremental)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        columns = EXPORT_COLUMNS[table]
+
+        # 先写临时文件，导出完整后再改名，中断时不会留下半个文件
+        tmp_path = output_path + '.tmp'
+        writer = WRITERS[fmt](tmp_path, columns)
+        count = 0
+        last_id = after_id
+        try:
+            for rows in self.db_manager.iter_export_rows(
+                    table, start_date, end_date, after_id=after_id, chunk_size=self.chunk_size):
+                writer.write_rows(rows)
+                count += len(rows)
+                last_id = rows[-1][0]
+            writer.close()
+        except Exception as e:
+            writer.close()
+            os.remove(tmp_path)
+            self.logger.error(f"导出 {table} 失败: {str(e)}")
+            return None
+
+        if incremental and count == 0:
+            # 没有新增记录时不生成空文件，也不覆盖同名的上一次导出
+            os.remove(tmp_path)
+            self.logger.info(f"{table} 没有新增记录")
+            return None, 0
+
+        os.replace(tmp_path, output_path)
+        if incremental:
+            self._save_watermark(table, fmt, last_id)
+        self.logger.info(f"已导出 {table} {count} 行到 {output_path}")
+        return output_path, count
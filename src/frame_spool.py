@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+离线帧缓存模块
+Ollama不可用或过载时把截图压缩后暂存到磁盘，恢复后由补录线程批量分析
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from image_encoder import ImageEncoder
+
+
+class FrameSpool:
+    def __init__(self, config, encoder=None):
+        spool_config = config.get('spool', {})
+        self.enabled = spool_config.get('enabled', True)
+        self.spool_dir = spool_config.get('dir', os.path.join(config['storage']['data_dir'], 'spool'))
+        self.max_frames = spool_config.get('max_frames', 500)
+        self.max_bytes = spool_config.get('max_mb', 200) * 1024 * 1024
+        self.quality = spool_config.get('quality', 70)
+        self.max_width = spool_config.get('max_width', 1920)
+
+        self.encoder = encoder or ImageEncoder(config)
+        self.lock = threading.Lock()
+        # 补录线程正在分析的帧，超出上限时不丢弃
+        self.in_flight = set()
+        self.logger = logging.getLogger(__name__)
+
+        if self.enabled:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+    def put(self, image, captured_at):
+        """
+        把一帧写入缓存目录
+        参数:
+            image: PIL Image对象
+            captured_at: 截图时间
+        返回: 是否成功
+        """
+        if not self.enabled:
+            return False
+        try:
+            name = captured_at.strftime("%Y%m%d_%H%M%S_%f")
+            frame_path = os.path.join(self.spool_dir, f"{name}.jpg")
+            meta_path = os.path.join(self.spool_dir, f"{name}.json")
+
+            jpeg_bytes = self.encoder.encode_jpeg(image, quality=self.quality, max_width=self.max_width)
+            if jpeg_bytes is None:
+                return False
+
+            with self.lock:
+                # 先写临时文件再重命名，避免崩溃时留下半个文件
+                with open(frame_path + '.tmp', 'wb') as f:
+                    f.write(jpeg_bytes)
+                os.replace(frame_path + '.tmp', frame_path)
+                with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump({'captured_at': captured_at.isoformat()}, f)
+                os.replace(meta_path + '.tmp', meta_path)
+                self._enforce_limits()
+
+            self.logger.info(f"帧已写入离线缓存: {name} (待补录 {len(self)} 帧)")
+            return True
+        except Exception as e:
+            self.logger.error(f"写入离线缓存失败: {str(e)}")
+            return False
+
+    def pending(self):
+        """按截图时间顺序返回待补录的帧名称"""
+        try:
+            names = [f[:-5] for f in os.listdir(self.spool_dir) if f.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        return sorted(names)
+
+    def __len__(self):
+        return len(self.pending())
+
+    def load(self, name):
+        """
+        读取缓存帧
+        返回: (PIL Image对象, 截图时间, 帧文件路径)
+        """
+        frame_path = os.path.join(self.spool_dir, f"{name}.jpg")
+        with open(os.path.join(self.spool_dir, f"{name}.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with Image.open(frame_path) as img:
+            image = img.convert('RGB')
+        return image, datetime.fromisoformat(meta['captured_at']), frame_path
+
+    def hold(self, names):
+        """标记正在补录的帧"""
+        with self.lock:
+            self.in_flight.update(names)
+
+    def release(self, names):
+        """取消补录标记"""
+        with self.lock:
+            self.in_flight.difference_update(names)
+
+    def remove(self, name):
+        """删除缓存帧（帧文件可能已被移走）"""
+        for suffix in ('.json', '.jpg'):
+            path = os.path.join(self.spool_dir, f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _enforce_limits(self):
+        """超过帧数或容量上限时丢弃最旧的帧（正在补录的帧除外），调用方持有self.lock"""
+        names = self.pending()
+        sizes = {}
+        for name in names:
+            path = os.path.join(self.spool_dir, f"{name}.jpg")
+            sizes[name] = os.path.getsize(path) if os.path.exists(path) else 0
+        total = sum(sizes.values())
+        count = len(names)
+        candidates = [name for name in names if name not in self.in_flight]
+
+        dropped = 0
+        while candidates and (count > self.max_frames or total > self.max_bytes):
+            oldest = candidates.pop(0)
+            total -= sizes[oldest]
+            count -= 1
+            self.remove(oldest)
+            dropped += 1
+        if dropped:
+            self.logger.warning(f"离线缓存已满，丢弃了 {dropped} 个最旧的帧")
+
+
+class CatchUpWorker:
+    def __init__(self, config, spool, is_available, analyze, record):
+        """
+        参数:
+            spool: FrameSpool对象
+            is_available: 检查后端是否可用的函数
+            analyze: 分析单帧的函数，接收PIL Image，返回描述或None
+            record: 保存分析结果的函数，接收 (描述, 截图时间, 帧文件路径)
+        """
+        spool_config = config.get('spool', {})
+        self.concurrency = spool_config.get('catchup_concurrency', 2)
+        self.retry_interval = spool_config.get('retry_interval', 30)
+
+        self.spool = spool
+        self.is_available = is_available
+        self.analyze = analyze
+        self.record = record
+
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if not self.spool.enabled or (self.thread and self.thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def wake(self):
+        """有新帧写入缓存时唤醒补录线程"""
+        self.wake_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.spool.pending() and self.is_available():
+                    self.drain()
+            except Exception as e:
+                # 出错时保留剩余帧，下次重试，补录线程不能退出
+                self.logger.error(f"补录出错，{self.retry_interval}秒后重试: {str(e)}")
+            self.wake_event.wait(self.retry_interval)
+            self.wake_event.clear()
+
+    def drain(self):
+        """按截图时间顺序补录缓存中的帧，每批并发分析"""
+        names = self.spool.pending()
+        if not names:
+            return 0
+
+        self.logger.info(f"后端已恢复，开始补录 {len(names)} 个缓存帧 (并发 {self.concurrency})")
+        start = time.time()
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for offset in range(0, len(names), self.concurrency):
+                if self.stop_event.is_set():
+                    break
+                batch = names[offset:offset + self.concurrency]
+                # 保存之前帧文件不能被超限清理删掉
+                self.spool.hold(batch)
+                try:
+                    results = list(executor.map(self._analyze_one, batch))
+                    # 按时间顺序保存，保证去重与原始时间戳一致
+                    for name, result in zip(batch, results):
+                        if result is None:
+                            # 分析失败说明后端又不可用了，保留剩余帧等待下次补录
+                            self.logger.warning(f"补录中断，剩余 {len(self.spool)} 帧")
+                            return done
+                        analysis, captured_at, frame_path = result
+                        if analysis:
+                            self.record(analysis, captured_at, frame_path)
+                        self.spool.remove(name)
+                        done += 1
+                finally:
+                    self.spool.release(batch)
+
+        self.logger.info(f"补录完成: {done} 帧，用时 {time.time() - start:.1f}s")
+        return done
+
+    def _analyze_one(self, name):
+        try:
+            image, captured_at, frame_path = self.spool.load(name)
+        except Exception as e:
+            self.logger.error(f"读取缓存帧失败，已丢弃 {name}: {str(e)}")
+            self.spool.remove(name)
+            return ('', None, None)
+        try:
+            analysis = self.analyze(image)
+        except Exception as e:
+            self.logger.error(f"补录分析出错 {name}: {str(e)}")
+            analysis = None
+        finally:
+            image.close()
+        if analysis is None:
+            return None
+        return analysis, captured_at, frame_path
@@ -10,13 +10,17 @@ import sys
 import yaml
 import threading
 import time
-from datetime import datetime
+import logging
+from datetime import datetime, date
 import webbrowser
 
 # 添加父目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from main import ActivityTracker
+from log_view import LogView
+from gui_data import GuiDataLayer
+import logging_setup
 
 class SettingsWindow:
     def __init__(self, parent, config, on_save_callback):
@@ -186,7 +190,7 @@ class SettingsWindow:
         self.summary_time_var.set(self.config.get('summary', {}).get('daily_summary_time', '23:30'))
         
         # 加载AI设置
-        self.ollama_url_var.set(self.config.get('ollama', {}).get('base_url', 'http://localhost:11434'))
+        self.ollama_url_var.set(self._format_base_url(self.config.get('ollama', {}).get('base_url', 'http://localhost:11434')))
         self.model_var.set(self.config.get('ollama', {}).get('model', 'llava:latest'))
         self.timeout_var.set(str(self.config.get('ollama', {}).get('timeout', 30)))
         
@@ -204,6 +208,22 @@ class SettingsWindow:
         self.database_var.set(self.config.get('storage', {}).get('database', './data/activity_log.db'))
         self.screenshots_dir_var.set(self.config.get('storage', {}).get('screenshots_dir', './data/screenshots'))
     
+    @staticmethod
+    def _format_base_url(base_url):
+        """多个后端以逗号分隔显示"""
+        if isinstance(base_url, (list, tuple)):
+            return ', '.join(entry['url'] if isinstance(entry, dict) else entry for entry in base_url)
+        return base_url
+    
+    def _parse_base_url(self):
+        """解析URL输入框；未修改时保留原有的后端详细配置"""
+        text = self.ollama_url_var.get().strip()
+        original = self.config.get('ollama', {}).get('base_url', '')
+        if text == self._format_base_url(original):
+            return original
+        urls = [url.strip() for url in text.split(',') if url.strip()]
+        return urls if len(urls) > 1 else text
+    
     def save_settings(self):
         try:
             # 验证输入
@@ -231,12 +251,14 @@ class SettingsWindow:
             }
             
             self.config['summary'] = {
+                **self.config.get('summary', {}),
                 'daily_summary_time': time_str,
                 'summary_prompt': self.summary_prompt_text.get(1.0, tk.END).strip()
             }
             
             self.config['ollama'] = {
-                'base_url': self.ollama_url_var.get(),
+                **self.config.get('ollama', {}),
+                'base_url': self._parse_base_url(),
                 'model': self.model_var.get(),
                 'timeout': timeout
             }
@@ -322,9 +344,18 @@ class ActivityTrackerGUI:
         self.config_path = "config.yaml"
         self.config = self.load_config()
         
+        # 后台查询与缓存，统计窗口不阻塞主循环
+        self.data_layer = GuiDataLayer(self.root, self.config)
+        self.thumbnail_loader = None
+        
         self.create_widgets()
         self.setup_menu()
         
+        # 界面日志与日志文件共用同一个日志队列，追踪器各模块的日志也显示在日志视图中
+        logging_setup.setup_logging(self.config)
+        self.logger = logging.getLogger(__name__)
+        logging_setup.add_sink(self._on_log_record, logging.DEBUG)
+        
         # 定期更新状态
         self.update_status()
         
@@ -341,9 +372,14 @@ class ActivityTrackerGUI:
     
     def save_config(self, config):
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
+            # 先写临时文件再替换，运行中的追踪器不会读到写了一半的配置
+            with open(self.config_path + '.tmp', 'w', encoding='utf-8') as f:
                 yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            os.replace(self.config_path + '.tmp', self.config_path)
             self.config = config
+            self.data_layer.config = config
+            if self.running:
+                self.log_message("⚙️ 配置已保存，运行中的追踪器会自动应用新配置")
             messagebox.showinfo("成功", "配置已保存")
         except Exception as e:
             messagebox.showerror("错误", f"保存配置失败: {str(e)}")
@@ -364,6 +400,10 @@ class ActivityTrackerGUI:
         menubar.add_cascade(label="查看", menu=view_menu)
         view_menu.add_command(label="活动统计", command=self.show_stats)
         view_menu.add_command(label="今日总结", command=self.show_today_summary)
+        view_menu.add_command(label="本周总结", command=lambda: self.show_period_summary('week'))
+        view_menu.add_command(label="本月总结", command=lambda: self.show_period_summary('month'))
+        view_menu.add_command(label="时间线", command=self.show_timeline)
+        view_menu.add_command(label="活动热力图", command=self.show_analytics)
         
         # 帮助菜单
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -406,13 +446,15 @@ class ActivityTrackerGUI:
         log_frame = ttk.LabelFrame(main_frame, text="活动日志", padding=10)
         log_frame.pack(fill="both", expand=True, pady=5)
         
-        # 创建日志文本区域
-        self.log_text = tk.Text(log_frame, height=20, wrap=tk.WORD)
-        scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
-        
-        self.log_text.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        # 创建日志视图（环形缓冲区 + 定时批量刷新）
+        gui_config = self.config.get('gui', {})
+        self.log_view = LogView(
+            log_frame,
+            self.root,
+            capacity=gui_config.get('log_capacity', 2000),
+            fps=gui_config.get('log_fps', 10)
+        )
+        self.log_text = self.log_view.text
         
         # 配置信息框架
         config_frame = ttk.LabelFrame(main_frame, text="当前配置", padding=10)
@@ -433,6 +475,7 @@ class ActivityTrackerGUI:
         if not self.running:
             try:
                 self.tracker = ActivityTracker(self.config_path)
+                self.data_layer.set_db_manager(self.tracker.db_manager)
                 
                 # 在后台线程中运行追踪器
                 self.tracker_thread = threading.Thread(target=self.run_tracker, daemon=True)
@@ -447,13 +490,12 @@ class ActivityTrackerGUI:
                 
             except Exception as e:
                 messagebox.showerror("启动失败", f"启动追踪器时出错: {str(e)}")
-                self.log_message(f"❌ 启动失败: {str(e)}")
+                self.log_message(f"❌ 启动失败: {str(e)}", 'ERROR')
     
     def stop_tracking(self):
         if self.running and self.tracker:
             self.running = False
-            self.tracker.running = False
-            self.tracker.stop_event.set()
+            self.tracker.stop()
             
             self.start_button.config(state="normal")
             self.stop_button.config(state="disabled")
@@ -466,27 +508,20 @@ class ActivityTrackerGUI:
             if self.tracker is not None:
                 self.tracker.start()
         except Exception as e:
-            self.log_message(f"❌ 追踪器运行出错: {str(e)}")
+            self.log_message(f"❌ 追踪器运行出错: {str(e)}", 'ERROR')
             self.running = False
             self.root.after(0, lambda: self.start_button.config(state="normal"))
             self.root.after(0, lambda: self.stop_button.config(state="disabled"))
             self.root.after(0, lambda: self.status_label.config(text="运行出错", foreground="red"))
     
-    def log_message(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        # 在主线程中更新GUI
-        self.root.after(0, lambda: self._update_log(log_entry))
+    def log_message(self, message, level='INFO'):
+        # 经日志队列写入日志文件和日志视图
+        self.logger.log(getattr(logging, level), message)
     
-    def _update_log(self, log_entry):
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
-        
-        # 限制日志条目数量
-        lines = self.log_text.get(1.0, tk.END).split('\n')
-        if len(lines) > 100:
-            self.log_text.delete(1.0, f"{len(lines) - 100}.0")
+    def _on_log_record(self, record):
+        # 在日志监听线程中调用，写入缓冲区后由日志视图在主线程中按固定帧率批量刷新
+        level = 'ERROR' if record.levelno >= logging.ERROR else record.levelname
+        self.log_view.append(record.getMessage(), level)
     
     def update_status(self):
         # 更新最后活动时间
@@ -500,65 +535,148 @@ class ActivityTrackerGUI:
         SettingsWindow(self.root, self.config, self.save_config)
         self.update_config_display()
     
-    def show_stats(self):
-        # 显示统计信息窗口
-        stats_window = tk.Toplevel(self.root)
-        stats_window.title("活动统计")
-        stats_window.geometry("600x400")
+    def _open_text_window(self, title):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("600x400")
         
-        text_widget = tk.Text(stats_window, wrap=tk.WORD, padx=10, pady=10)
+        text_widget = tk.Text(window, wrap=tk.WORD, padx=10, pady=10)
         text_widget.pack(fill="both", expand=True)
-        
-        # 获取统计信息
-        try:
-            if self.tracker:
-                stats = self.tracker.db_manager.get_activity_stats()
-                if stats:
-                    stats_text = f"""📈 活动统计
-={'='*40}
+        return text_widget
+    
+    def _stream_sections(self, text_widget, sections):
+        """
+        先显示占位文字，各部分查询完成后逐个替换
+        参数: sections - [(缓存键, 查询函数, 格式化函数)]
+        """
+        for index, (key, func, formatter) in enumerate(sections):
+            tag = f"section{index}"
+            text_widget.insert(tk.END, "加载中...\n\n", (tag,))
+            
+            def on_result(value, tag=tag, formatter=formatter):
+                self._replace_section(text_widget, tag, formatter(value))
+            
+            def on_error(error, tag=tag):
+                self._replace_section(text_widget, tag, f"获取数据失败: {str(error)}\n\n")
+            
+            self.data_layer.query(key, func, on_result, on_error)
+    
+    @staticmethod
+    def _replace_section(text_widget, tag, content):
+        if not text_widget.winfo_exists():
+            return
+        ranges = text_widget.tag_ranges(tag)
+        if not ranges:
+            return
+        start = ranges[0]
+        text_widget.delete(start, ranges[1])
+        text_widget.insert(start, content, (tag,))
+    
+    def show_stats(self):
+        # 显示统计信息窗口，各项统计在后台查询后逐步显示
+        text_widget = self._open_text_window("活动统计")
+        
+        def format_stats(stats):
+            if not stats:
+                return "暂无统计数据\n\n"
+            stats_text = f"""📈 活动统计
+{'='*40}
 📅 统计周期: 最近{stats['period_days']}天
 📊 总活动次数: {stats['total_activities']}
 🗓️ 活跃天数: {stats['active_days']}
 📈 日均活动: {stats['avg_activities_per_day']}
 """
-                    if stats['most_active_day']:
-                        stats_text += f"🔥 最活跃日期: {stats['most_active_day']} ({stats['most_active_day_count']}次)"
-                    
-                    text_widget.insert(tk.END, stats_text)
-                else:
-                    text_widget.insert(tk.END, "暂无统计数据")
-            else:
-                text_widget.insert(tk.END, "请先启动追踪器")
-        except Exception as e:
-            text_widget.insert(tk.END, f"获取统计信息失败: {str(e)}")
+            if stats['most_active_day']:
+                stats_text += f"🔥 最活跃日期: {stats['most_active_day']} ({stats['most_active_day_count']}次)\n"
+            return stats_text + "\n"
+        
+        def format_today_count(count):
+            return f"📅 今日活动记录: {count or 0} 条\n\n"
+        
+        def format_tracked(seconds):
+            minutes = (seconds or 0) // 60
+            return f"⏱️ 今日记录时长: {minutes // 60}小时{minutes % 60}分钟\n\n"
+        
+        today = date.today()
+        self._stream_sections(text_widget, [
+            (('today_count', today), lambda db: db.get_activity_count_by_date(today), format_today_count),
+            (('tracked', today), lambda db: db.get_tracked_seconds_by_date(today), format_tracked),
+            (('stats', 7), lambda db: db.get_activity_stats(7), format_stats),
+            (('stats', 30), lambda db: db.get_activity_stats(30), format_stats),
+        ])
     
     def show_today_summary(self):
-        # 显示今日总结窗口
-        summary_window = tk.Toplevel(self.root)
-        summary_window.title("今日总结")
-        summary_window.geometry("600x400")
-        
-        text_widget = tk.Text(summary_window, wrap=tk.WORD, padx=10, pady=10)
-        text_widget.pack(fill="both", expand=True)
+        # 显示今日总结窗口，总结在后台查询
+        text_widget = self._open_text_window("今日总结")
+        today = date.today()
+        
+        def format_summary(summary):
+            if not summary:
+                return "今日暂无总结"
+            return f"""📋 今日总结 ({today})
+{'='*40}
+{summary['summary']}
+"""
         
-        # 获取今日总结
-        try:
-            if self.tracker:
-                from datetime import date
-                today = date.today()
-                summary = self.tracker.db_manager.get_daily_summary(today)
-                if summary:
-                    summary_text = f"""📋 今日总结 ({today})
-={'='*40}
+        self._stream_sections(text_widget, [
+            (('summary', today), lambda db: db.get_daily_summary(today), format_summary),
+        ])
+    
+    def show_period_summary(self, period_type):
+        # 显示本周/本月汇总，追踪器运行时可以重新生成
+        from rollup import PERIOD_NAMES, period_bounds
+        
+        name = PERIOD_NAMES[period_type]
+        start, end = period_bounds(period_type, date.today())
+        text_widget = self._open_text_window(f"本{name}总结")
+        
+        def format_summary(summary):
+            if not summary:
+                return f"本{name}暂无汇总，启动追踪器后可点击下方按钮生成\n"
+            return f"""📊 {name}度总结 ({start} ~ {end}，共{summary['day_count']}天)
+{'='*40}
 {summary['summary']}
 """
-                    text_widget.insert(tk.END, summary_text)
-                else:
-                    text_widget.insert(tk.END, "今日暂无总结")
+        
+        # 在文本框之前打包，窗口缩小时按钮不会被挤出可见区域
+        ttk.Button(
+            text_widget.master, text=f"生成本{name}总结",
+            command=lambda: self.generate_period_summary(period_type)
+        ).pack(side="bottom", pady=5, before=text_widget)
+        self._stream_sections(text_widget, [
+            (('rollup', period_type, start), lambda db: db.get_period_summary(period_type, start), format_summary),
+        ])
+    
+    def generate_period_summary(self, period_type):
+        if not self.tracker:
+            messagebox.showwarning("提示", "请先启动追踪器")
+            return
+        
+        from rollup import PERIOD_NAMES
+        name = PERIOD_NAMES[period_type]
+        
+        def run():
+            result = self.tracker.rollup.build(period_type)
+            if result:
+                self.log_message(f"✅ 本{name}总结已生成 ({result['period_start']} ~ {result['period_end']})")
             else:
-                text_widget.insert(tk.END, "请先启动追踪器")
-        except Exception as e:
-            text_widget.insert(tk.END, f"获取今日总结失败: {str(e)}")
+                self.log_message("❌ 汇总生成失败，可能还没有每日总结", 'ERROR')
+        
+        threading.Thread(target=run, daemon=True).start()
+        self.log_message(f"📊 开始生成本{name}总结...")
+    
+    def show_timeline(self):
+        # 时间线窗口按需导入，缩略图加载器在所有窗口间共享
+        from thumbnail_cache import ThumbnailLoader
+        from timeline_view import TimelineWindow
+        
+        if self.thumbnail_loader is None:
+            self.thumbnail_loader = ThumbnailLoader(self.config)
+        TimelineWindow(self.root, self.data_layer, self.thumbnail_loader)
+    
+    def show_analytics(self):
+        from analytics_view import AnalyticsWindow
+        AnalyticsWindow(self.root, self.data_layer, self.config)
     
     def generate_summary(self):
         if self.tracker:
@@ -597,9 +715,15 @@ class ActivityTrackerGUI:
         if self.running:
             if messagebox.askokcancel("退出", "追踪器正在运行，确定要退出吗？"):
                 self.stop_tracking()
-                self.root.after(1000, self.root.destroy)  # 等待1秒后关闭
+                self.root.after(1000, self._close)  # 等待1秒后关闭
         else:
-            self.root.destroy()
+            self._close()
+    
+    def _close(self):
+        # 每条关闭路径都要停止后台查询线程并移除日志输出，否则关闭窗口后仍会向已销毁的控件写日志
+        self.data_layer.shutdown()
+        logging_setup.remove_sink(self._on_log_record)
+        self.root.destroy()
     
     def run(self):
         self.root.mainloop()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+GUI数据层模块
+在后台线程执行数据库查询，按数据版本缓存结果，并把结果交回Tk主线程
+"""
+
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from query_client import QueryClient, open_query_backend
+
+
+class GuiDataLayer:
+    def __init__(self, root, config, max_workers=2, poll_interval=50):
+        """
+        参数:
+            root: Tk根窗口，结果通过它回到主线程
+            config: 配置字典
+            max_workers: 查询线程数
+            poll_interval: 主线程检查查询结果的间隔（毫秒）
+        """
+        self.root = root
+        self.config = config
+        self.poll_interval = poll_interval
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gui-data')
+        self.results = queue.Queue()
+        self.cache = {}
+        self.cache_lock = threading.Lock()
+        self.db_manager = None
+        self.backend_lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+        self.root.after(self.poll_interval, self._poll)
+
+    def set_db_manager(self, db_manager):
+        """追踪器启动后改用它的数据库管理器"""
+        with self.backend_lock:
+            self.db_manager = db_manager
+
+    def get_db_manager(self):
+        """追踪器在其他进程运行时走本地查询服务，否则以只读方式打开数据库"""
+        with self.backend_lock:
+            if self.db_manager is None:
+                self.db_manager = open_query_backend(self.config)
+            return self.db_manager
+
+    def _reset_backend(self, backend):
+        """丢弃连不上的查询服务，下次查询重新探测（追踪器已退出时改为只读打开数据库）"""
+        with self.backend_lock:
+            if self.db_manager is backend:
+                self.db_manager = None
+
+    def data_version(self):
+        """数据库文件（含WAL）的修改时间和大小，任何进程写入后都会变化"""
+        version = []
+        db_path = self.config['storage']['database']
+        for path in (db_path, db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def query(self, key, func, callback, error_callback=None):
+        """
+        在后台执行查询，结果在主线程回调
+        参数:
+            key: 缓存键，数据库未变化时直接返回缓存结果
+            func: 查询函数，接收DatabaseManager作为参数
+            callback: 主线程中接收结果的回调
+            error_callback: 主线程中接收异常的回调
+        """
+        version = self.data_version()
+        with self.cache_lock:
+            cached = self.cache.get(key)
+        if cached and cached[0] == version:
+            self.results.put((callback, cached[1], None))
+            return
+
+        def run():
+            try:
+                db_manager = self.get_db_manager()
+                try:
+                    value = func(db_manager) if db_manager else None
+                except OSError as e:
+                    if not isinstance(db_manager, QueryClient):
+                        raise
+                    self.logger.info(f"本地查询服务不可用，重新探测数据来源: {str(e)}")
+                    self._reset_backend(db_manager)
+                    db_manager = self.get_db_manager()
+                    value = func(db_manager) if db_manager else None
+                with self.cache_lock:
+                    self.cache[key] = (version, value)
+                self.results.put((callback, value, None))
+            except Exception as e:
+                self.logger.error(f"GUI查询失败 {key}: {str(e)}")
+                self.results.put((error_callback, None, e))
+
+        self.executor.submit(run)
+
+    def invalidate(self, key=None):
+        """清除指定键或全部缓存"""
+        with self.cache_lock:
+            if key is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(key, None)
+
+    def _poll(self):
+        try:
+            while True:
+                callback, value, error = self.results.get_nowait()
+                if callback is None:
+                    continue
+                try:
+                    callback(error if error is not None else value)
+                except Exception as e:
+                    # 回调对应的窗口可能已经关闭
+                    self.logger.debug(f"GUI查询回调失败: {str(e)}")
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_interval, self._poll)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+图像编码服务模块
+在子进程中完成RGBA转RGB与JPEG编码，像素数据通过共享内存传递，避免占用追踪线程和GIL；
+共享内存段和编码输出缓冲区重复使用，长时间运行时内存占用保持稳定
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from PIL import Image
+
+# 可以直接按原始字节在进程间传递的图像模式
+RAW_MODES = ('RGB', 'RGBA', 'L', 'LA')
+
+# 共享内存段按该粒度向上取整，分辨率略有变化时仍能复用
+SEGMENT_ALIGN = 1024 * 1024
+
+# 超过该大小的输出缓冲区用完即丢弃，不长期占用内存
+MAX_REUSED_BUFFER = 16 * 1024 * 1024
+
+_local = threading.local()
+
+
+def flatten_to_rgb(img):
+    """把带透明通道的图像合成到白色背景上，其他模式直接转为RGB"""
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def encode_jpeg_local(image, quality=85, optimize=False, max_width=None):
+    """在当前线程中编码JPEG，返回字节串"""
+    frame = flatten_to_rgb(image)
+    if max_width and frame.width > max_width:
+        height = int(frame.height * max_width / frame.width)
+        frame = frame.resize((max_width, height), Image.BILINEAR)
+    # 每个线程（子进程）复用同一个输出缓冲区，只拷贝实际写入的部分
+    buffer = getattr(_local, 'buffer', None) or io.BytesIO()
+    _local.buffer = None
+    buffer.seek(0)
+    frame.save(buffer, format='JPEG', quality=quality, optimize=optimize)
+    length = buffer.tell()
+    with buffer.getbuffer() as view:
+        jpeg_bytes = bytes(view[:length])
+    if length <= MAX_REUSED_BUFFER:
+        _local.buffer = buffer
+    return jpeg_bytes
+
+
+def _encode_worker(shm_name, mode, size, quality, optimize, max_width):
+    """子进程入口: 从共享内存读取像素并编码为JPEG"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    view = shm.buf[:_buffer_size(mode, size)]
+    try:
+        image = Image.frombuffer(mode, size, view, 'raw', mode, 0, 1)
+        try:
+            return encode_jpeg_local(image, quality, optimize, max_width)
+        finally:
+            # 图像可能直接引用共享内存，先释放才能关闭共享内存
+            del image
+    finally:
+        view.release()
+        shm.close()
+
+
+def _buffer_size(mode, size):
+    return size[0] * size[1] * len(mode)
+
+
+def copy_pixels(image, target):
+    """
+    把图像的原始像素分块写入target（如共享内存），与image.tobytes()内容相同，但不生成整帧大小的临时字节串
+    返回: 写入的字节数
+    """
+    image.load()
+    encoder = Image._getencoder(image.mode, 'raw', image.mode)
+    encoder.setimage(image.im, (0, 0) + image.size)
+    chunk_size = max(65536, image.size[0] * 4)
+    offset = 0
+    while True:
+        _, status, data = encoder.encode(chunk_size)
+        target[offset:offset + len(data)] = data
+        offset += len(data)
+        if status:
+            break
+    if status < 0:
+        raise RuntimeError(f"复制像素失败，错误码 {status}")
+    return offset
+
+
+class ImageEncoder:
+    def __init__(self, config):
+        encoder_config = config.get('encoder', {})
+        self.enabled = encoder_config.get('enabled', True)
+        self.workers = encoder_config.get('workers', 2)
+        self.timeout = encoder_config.get('timeout', 30)
+
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+        # 空闲的共享内存段，最多保留与编码进程数相同的段
+        self.free_segments = []
+        self.segments_lock = threading.Lock()
+        self.segments_created = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _get_executor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def encode_jpeg(self, image, quality=85, optimize=False, max_width=None):
+        """
+        把PIL图像编码为JPEG
+        参数:
+            image: PIL Image对象（可以带透明通道）
+            quality: JPEG质量
+            optimize: 是否启用Huffman表优化
+            max_width: 超过该宽度时等比缩小
+        返回: JPEG字节串，失败返回None
+        """
+        if not self.enabled or image.mode not in RAW_MODES:
+            return self._encode_in_thread(image, quality, optimize, max_width)
+
+        shm = None
+        try:
+            size = _buffer_size(image.mode, image.size)
+            shm = self._acquire_segment(size)
+            copy_pixels(image, shm.buf)
+
+            future = self._get_executor().submit(
+                _encode_worker, shm.name, image.mode, image.size, quality, optimize, max_width
+            )
+            jpeg_bytes = future.result(timeout=self.timeout)
+            self._release_segment(shm)
+            return jpeg_bytes
+        except Exception as e:
+            # 超时的子进程可能仍在读取这个段，不放回空闲列表
+            if shm is not None:
+                self._destroy_segment(shm)
+            # 进程池不可用时退回到当前线程编码
+            self.logger.warning(f"子进程编码失败，改为本地编码: {str(e)}")
+            self._reset_executor()
+            return self._encode_in_thread(image, quality, optimize, max_width)
+
+    def _acquire_segment(self, size):
+        """取一个足够大的空闲共享内存段，没有时新建"""
+        with self.segments_lock:
+            for index, shm in enumerate(self.free_segments):
+                if shm.size >= size:
+                    return self.free_segments.pop(index)
+        aligned = (size + SEGMENT_ALIGN - 1) // SEGMENT_ALIGN * SEGMENT_ALIGN
+        self.segments_created += 1
+        return shared_memory.SharedMemory(create=True, size=aligned)
+
+    def _release_segment(self, shm):
+        """把共享内存段放回空闲列表，超出保留数量时销毁最小的段"""
+        with self.segments_lock:
+            self.free_segments.append(shm)
+            self.free_segments.sort(key=lambda segment: segment.size)
+            if len(self.free_segments) <= self.workers:
+                return
+            shm = self.free_segments.pop(0)
+        self._destroy_segment(shm)
+
+    def _destroy_segment(self, shm):
+        try:
+            shm.close()
+            shm.unlink()
+        except Exception as e:
+            self.logger.warning(f"释放共享内存失败: {str(e)}")
+
+    def release_buffers(self):
+        """销毁所有空闲的共享内存段（内存超出预算时调用）"""
+        with self.segments_lock:
+            segments, self.free_segments = self.free_segments, []
+        for shm in segments:
+            self._destroy_segment(shm)
+
+    def get_pooled_bytes(self):
+        """空闲共享内存段的总大小"""
+        with self.segments_lock:
+            return sum(shm.size for shm in self.free_segments)
+
+    def _encode_in_thread(self, image, quality, optimize, max_width):
+        try:
+            return encode_jpeg_local(image, quality, optimize, max_width)
+        except Exception as e:
+            self.logger.error(f"图像编码失败: {str(e)}")
+            return None
+
+    def _reset_executor(self):
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+    def shutdown(self):
+        """关闭编码进程池并释放共享内存"""
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+        self.release_buffers()
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+采集接入服务模块
+分析节点模式: 接收多台机器上轻量采集端上传的截图（JPEG）或只有画面哈希的重复帧，
+按客户端公平排队，共享分析结果缓存，用本机的Ollama后端分析后批量写入按客户端区分的数据库
+"""
+
+import re
+import hmac
+import json
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from model_router import hamming_distance
+from prompt_compactor import text_shingles, similarity
+from sessionizer import Sessionizer
+
+CLIENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+FRAME_HASH_PATTERN = re.compile(r'^[0-9a-fA-F]{1,16}$')
+
+
+class Frame:
+    """一帧上传的截图，jpeg_bytes为None表示画面与该客户端上一帧相同，只延长当前活动"""
+
+    __slots__ = ('client_id', 'captured_at', 'frame_hash', 'jpeg_bytes', 'attempts', 'not_before')
+
+    def __init__(self, client_id, captured_at, frame_hash=None, jpeg_bytes=None):
+        self.client_id = client_id
+        self.captured_at = captured_at
+        self.frame_hash = frame_hash
+        self.jpeg_bytes = jpeg_bytes
+        self.attempts = 0
+        self.not_before = 0.0
+
+
+class FairQueue:
+    """
+    按客户端分别排队、轮流出队，上传频繁的客户端不会挤占其他客户端；
+    同一客户端同时只有一帧在处理，保证按截图顺序分析
+    """
+
+    def __init__(self, max_per_client=50):
+        self.max_per_client = max_per_client
+        self.queues = OrderedDict()
+        self.busy = set()
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def put(self, frame):
+        """入队，该客户端队列已满时返回False"""
+        with self.condition:
+            queue = self.queues.setdefault(frame.client_id, deque())
+            if len(queue) >= self.max_per_client:
+                return False
+            queue.append(frame)
+            self.condition.notify()
+            return True
+
+    def requeue(self, frame, delay):
+        """处理失败的帧放回队首，delay秒后重试"""
+        with self.condition:
+            frame.not_before = time.monotonic() + delay
+            self.queues.setdefault(frame.client_id, deque()).appendleft(frame)
+            self.condition.notify()
+
+    def get(self, timeout=1.0):
+        """
+        取下一帧并把所属客户端标记为处理中，处理完后必须调用done()
+        返回: Frame，超时或队列已关闭时返回None
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.closed:
+                now = time.monotonic()
+                for client_id, queue in self.queues.items():
+                    if client_id in self.busy or not queue or queue[0].not_before > now:
+                        continue
+                    frame = queue.popleft()
+                    self.busy.add(client_id)
+                    # 轮转: 刚被服务的客户端排到最后
+                    self.queues.move_to_end(client_id)
+                    return frame
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                self.condition.wait(min(remaining, 0.5))
+            return None
+
+    def done(self, client_id):
+        with self.condition:
+            self.busy.discard(client_id)
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def depth(self, client_id):
+        with self.condition:
+            return len(self.queues.get(client_id, ())) + (1 if client_id in self.busy else 0)
+
+    def discard(self, client_id):
+        """移除空闲客户端的队列，返回是否移除（仍有帧在排队或处理中时不移除）"""
+        with self.condition:
+            if client_id in self.busy or self.queues.get(client_id):
+                return False
+            self.queues.pop(client_id, None)
+            return True
+
+    def depths(self):
+        with self.condition:
+            return {client_id: len(queue) for client_id, queue in self.queues.items()}
+
+    def is_idle(self):
+        with self.condition:
+            return not self.busy and not any(self.queues.values())
+
+
+class AnalysisCache:
+    """按画面哈希共享的分析结果，不同客户端上几乎相同的画面只分析一次"""
+
+    def __init__(self, max_entries=512, distance=3, ttl=3600):
+        self.max_entries = max_entries
+        self.distance = distance
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame_hash):
+        if frame_hash is None:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            found = self.entries.get(frame_hash)
+            if found is None:
+                for cached_hash, entry in self.entries.items():
+                    if hamming_distance(frame_hash, cached_hash) <= self.distance:
+                        found = entry
+                        frame_hash = cached_hash
+                        break
+            if found is not None and now - found[1] < self.ttl:
+                self.entries.move_to_end(frame_hash)
+                self.hits += 1
+                return found[0]
+            self.misses += 1
+            return None
+
+    def put(self, frame_hash, analysis):
+        if frame_hash is None:
+            return
+        with self.lock:
+            self.entries[frame_hash] = (analysis, time.monotonic())
+            self.entries.move_to_end(frame_hash)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class ClientState:
+    def __init__(self, client_id, sessionizer):
+        self.client_id = client_id
+        self.sessionizer = sessionizer
+        # 最近一帧的分析结果，用于只有哈希的重复帧
+        self.last_analysis = None
+        # 最近写入数据库的记录，用于去重
+        self.last_recorded = None
+        self.last_recorded_at = None
+        self.last_seen = None
+
+        self.received = 0
+        self.analyzed = 0
+        self.cached = 0
+        self.deduplicated = 0
+        self.extended = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def to_dict(self):
+        return {
+            'received': self.received,
+            'analyzed': self.analyzed,
+            'cached': self.cached,
+            'deduplicated': self.deduplicated,
+            'extended': self.extended,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'last_seen': datetime.fromtimestamp(self.last_seen).isoformat() if self.last_seen else None,
+        }
+
+
+class _IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        ingest = self.server.ingest
+        if urlparse(self.path).path != '/v1/frames':
+            self._send(404, {'error': 'not found'})
+            return
+        if not ingest.authorized(self.headers):
+            self._send(401, {'error': 'unauthorized'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            length = -1
+        if length < 0:
+            # 没有合法的Content-Length时无法确定请求体边界，关闭连接
+            self.close_connection = True
+            self._send(400, {'error': 'invalid Content-Length'})
+            return
+        if length > ingest.max_frame_bytes:
+            self.close_connection = True
+            self._send(413, {'error': 'frame too large'})
+            return
+        body = self.rfile.read(length) if length else b''
+        status, payload = ingest.handle_frame(self.headers, body)
+        self._send(status, payload)
+
+    def do_GET(self):
+        ingest = self.server.ingest
+        path = urlparse(self.path).path
+        if path == '/v1/ping':
+            self._send(200, {'ok': True})
+        elif path == '/v1/status':
+            if not ingest.authorized(self.headers):
+                self._send(401, {'error': 'unauthorized'})
+                return
+            self._send(200, ingest.get_status())
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.ingest.logger.debug(format % args)
+
+
+class IngestServer:
+    def __init__(self, config, ollama_client, db_manager):
+        """
+        参数:
+            config: 配置字典
+            ollama_client: 分析节点上的OllamaClient（含熔断与自适应超时）
+            db_manager: 多客户端共用的DatabaseManager，记录按client_id区分
+        """
+        ingest_config = config.get('ingest', {})
+        self.config = config
+        self.host = ingest_config.get('host', '127.0.0.1')
+        self.port = ingest_config.get('port', 8766)
+        self.token = ingest_config.get('token')
+        self.workers = ingest_config.get('workers', 2)
+        self.max_frame_bytes = ingest_config.get('max_frame_mb', 10) * 1024 * 1024
+        # 分析结果攒够batch_size条或等待flush_interval秒后批量写入
+        self.batch_size = ingest_config.get('batch_size', 20)
+        self.flush_interval = ingest_config.get('flush_interval', 5)
+        self.retry_interval = ingest_config.get('retry_interval', 10)
+        self.max_attempts = ingest_config.get('max_attempts', 3)
+        # 与该客户端上一条记录相似且间隔不超过dedup_window秒时不重复写入
+        self.dedup_similarity = ingest_config.get('dedup_similarity', 0.8)
+        self.dedup_window = ingest_config.get('dedup_window', 300)
+        # 允许上传的客户端（为空时不限制），客户端数上限和空闲清理时间（秒）
+        self.allowed_clients = set(ingest_config.get('clients') or [])
+        self.max_clients = ingest_config.get('max_clients', 64)
+        self.client_idle_timeout = ingest_config.get('client_idle_timeout', 3600)
+
+        self.ollama_client = ollama_client
+        self.db_manager = db_manager
+        self.queue = FairQueue(ingest_config.get('max_queue_per_client', 50))
+        self.cache = AnalysisCache(
+            ingest_config.get('cache_entries', 512),
+            ingest_config.get('cache_distance', 3),
+            ingest_config.get('cache_ttl', 3600)
+        )
+
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        self.pending_rows = []
+        self.pending_lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+        self.httpd = None
+        self.threads = []
+        self.stop_event = threading.Event()
+
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """启动HTTP服务和分析线程，返回是否启动成功"""
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), _IngestHandler)
+        except OSError as e:
+            self.logger.error(f"采集接入服务启动失败: {str(e)}")
+            return False
+        self.httpd.daemon_threads = True
+        self.httpd.ingest = self
+        self.port = self.httpd.server_address[1]
+
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self.httpd.serve_forever, daemon=True)]
+        self.threads += [
+            threading.Thread(target=self._worker, name=f"ingest-{i}", daemon=True) for i in range(self.workers)
+        ]
+        self.threads.append(threading.Thread(target=self._flush_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+        if self.host not in ('127.0.0.1', 'localhost') and not self.token:
+            self.logger.warning("采集接入服务监听在非本机地址但没有设置ingest.token，任何人都可以上传截图")
+        self.logger.info(f"采集接入服务已启动: http://{self.host}:{self.port}，分析线程 {self.workers} 个")
+        return True
+
+    def stop(self):
+        """停止接收新帧，写入已分析的结果（队列中未分析的帧丢弃，由采集端重传）"""
+        self.stop_event.set()
+        self.queue.close()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self._flush(force=True)
+        self.logger.info("采集接入服务已停止")
+
+    def wait_idle(self, timeout=60):
+        """等待队列中的帧全部处理完并写入数据库，返回是否在超时前完成"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.queue.is_idle():
+                self._flush(force=True)
+                return True
+            time.sleep(0.1)
+        return False
+
+    def authorized(self, headers):
+        if not self.token:
+            return True
+        supplied = headers.get('Authorization', '')
+        return hmac.compare_digest(supplied, f"Bearer {self.token}")
+
+    def _client(self, client_id):
+        """取客户端状态，不存在时创建；客户端数已达上限且没有可清理的空闲客户端时返回None"""
+        with self.clients_lock:
+            state = self.clients.get(client_id)
+            if state is not None:
+                state.last_seen = time.time()
+                return state
+        if len(self.clients) >= self.max_clients:
+            self.evict_idle_clients()
+        with self.clients_lock:
+            state = self.clients.get(client_id)
+            if state is None:
+                if len(self.clients) >= self.max_clients:
+                    self.logger.warning(f"客户端数已达上限 {self.max_clients}，拒绝新客户端 {client_id}")
+                    return None
+                sessionizer = Sessionizer(self.config, self.db_manager, client_id=client_id)
+                state = self.clients[client_id] = ClientState(client_id, sessionizer)
+            state.last_seen = time.time()
+            return state
+
+    def evict_idle_clients(self):
+        """
+        清理超过client_idle_timeout秒没有上传的客户端（时间段已写入数据库，重新连接时从数据库续接）
+        返回: 清理的客户端数
+        """
+        cutoff = time.time() - self.client_idle_timeout
+        with self.clients_lock:
+            idle = [client_id for client_id, state in self.clients.items()
+                    if (state.last_seen or 0) < cutoff]
+            evicted = [client_id for client_id in idle if self.queue.discard(client_id)]
+            for client_id in evicted:
+                del self.clients[client_id]
+        if evicted:
+            self.logger.info(f"已清理 {len(evicted)} 个空闲客户端: {', '.join(evicted)}")
+        return len(evicted)
+
+    def handle_frame(self, headers, body):
+        """
+        处理一次上传
+        请求头: X-Client-Id、X-Captured-At（ISO时间）、X-Frame-Hash（十六进制画面哈希，可选）
+        请求体: JPEG；为空表示画面与上一帧相同
+        返回: (HTTP状态码, 响应字典)
+        """
+        client_id = headers.get('X-Client-Id', '')
+        if not CLIENT_ID_PATTERN.match(client_id):
+            return 400, {'error': 'invalid client id'}
+        if self.allowed_clients and client_id not in self.allowed_clients:
+            return 403, {'error': 'client not allowed'}
+        frame_hash = headers.get('X-Frame-Hash')
+        if frame_hash and not FRAME_HASH_PATTERN.match(frame_hash):
+            return 400, {'error': 'invalid X-Frame-Hash'}
+        frame_hash = int(frame_hash, 16) if frame_hash else None
+        try:
+            captured_at = datetime.fromisoformat(headers.get('X-Captured-At', ''))
+        except ValueError:
+            return 400, {'error': 'invalid X-Captured-At'}
+        if captured_at.tzinfo is not None:
+            # 时间段按本地时间（不带时区）记录
+            captured_at = captured_at.astimezone().replace(tzinfo=None)
+
+        state = self._client(client_id)
+        if state is None:
+            return 503, {'status': 'busy', 'error': 'too many clients'}
+        state.received += 1
+
+        if not body and state.last_analysis is None and self.queue.depth(client_id) == 0:
+            # 分析节点重启后或上一帧分析失败时没有可延长的活动，需要完整上传
+            return 409, {'status': 'need_frame'}
+
+        frame = Frame(client_id, captured_at, frame_hash, body or None)
+        if not self.queue.put(frame):
+            state.rejected += 1
+            return 429, {'status': 'busy'}
+        return 202, {'status': 'queued', 'queued': self.queue.depth(client_id)}
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            frame = self.queue.get(timeout=1.0)
+            if frame is None:
+                continue
+            try:
+                self._process(frame)
+            except Exception as e:
+                self.logger.error(f"处理客户端 {frame.client_id} 的帧时出错: {str(e)}")
+            finally:
+                self.queue.done(frame.client_id)
+
+    def _process(self, frame):
+        with self.clients_lock:
+            state = self.clients[frame.client_id]
+
+        if frame.jpeg_bytes is None:
+            if state.last_analysis is not None:
+                state.sessionizer.observe(state.last_analysis, frame.captured_at, frame_hash=frame.frame_hash)
+                state.extended += 1
+            else:
+                # 排在它前面的完整帧分析失败，没有可延长的活动
+                state.failed += 1
+            return
+
+        analysis = self.cache.get(frame.frame_hash)
+        if analysis is not None:
+            state.cached += 1
+        else:
+            analysis = self.ollama_client.analyze_encoded(frame.jpeg_bytes)
+            if not analysis:
+                frame.attempts += 1
+                if frame.attempts < self.max_attempts and not self.stop_event.is_set():
+                    self.queue.requeue(frame, self.retry_interval)
+                else:
+                    state.failed += 1
+                    # 之后只有哈希的重复帧不能再延长上一条活动，需要完整上传
+                    state.last_analysis = None
+                    self.logger.warning(f"客户端 {frame.client_id} 的帧分析失败，已丢弃")
+                return
+            self.cache.put(frame.frame_hash, analysis)
+            state.analyzed += 1
+
+        state.last_analysis = analysis
+        state.sessionizer.observe(analysis, frame.captured_at, frame_hash=frame.frame_hash)
+        if self._is_duplicate(state, analysis, frame.captured_at):
+            state.deduplicated += 1
+            return
+
+        state.last_recorded = text_shingles(analysis)
+        state.last_recorded_at = frame.captured_at
+        with self.pending_lock:
+            self.pending_rows.append((frame.captured_at, analysis, None, frame.client_id))
+            due = len(self.pending_rows) >= self.batch_size
+        if due:
+            self._flush()
+
+    def _is_duplicate(self, state, analysis, captured_at):
+        if state.last_recorded is None:
+            return False
+        if abs((captured_at - state.last_recorded_at).total_seconds()) > self.dedup_window:
+            return False
+        return similarity(text_shingles(analysis), state.last_recorded) >= self.dedup_similarity
+
+    def _flush_loop(self):
+        last_eviction = time.monotonic()
+        while not self.stop_event.wait(self.flush_interval):
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+            if time.monotonic() - last_eviction >= min(self.client_idle_timeout, 300):
+                self.evict_idle_clients()
+                last_eviction = time.monotonic()
+
+    def _flush(self, force=False):
+        with self.pending_lock:
+            if not self.pending_rows or (not force and len(self.pending_rows) < self.batch_size
+                                         and time.monotonic() - self.last_flush < self.flush_interval):
+                return
+            rows, self.pending_rows = self.pending_rows, []
+            self.last_flush = time.monotonic()
+        if not self.db_manager.add_activities(rows):
+            self.logger.error(f"写入 {len(rows)} 条活动记录失败")
+
+    def get_status(self):
+        depths = self.queue.depths()
+        with self.clients_lock:
+            clients = {
+                client_id: dict(state.to_dict(), queued=depths.get(client_id, 0))
+                for client_id, state in self.clients.items()
+            }
+        with self.pending_lock:
+            pending = len(self.pending_rows)
+        return {
+            'clients': clients,
+            'queued': sum(depths.values()),
+            'pending_writes': pending,
+            'cache': self.cache.get_stats(),
+            'calls': self.ollama_client.get_call_metrics(),
+        }
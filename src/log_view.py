@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+日志视图模块
+基于环形缓冲区的日志模型，按固定帧率批量刷新到Tk文本框，支持按级别过滤
+"""
+
+import threading
+import tkinter as tk
+from tkinter import ttk
+from collections import deque
+from datetime import datetime
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+
+class LogBuffer:
+    """线程安全的日志环形缓冲区"""
+
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self.entries = deque(maxlen=capacity)
+        # 尚未绘制到界面的日志，界面卡顿时最多保留capacity条
+        self.pending = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def append(self, message, level='INFO'):
+        entry = (datetime.now().strftime("%H:%M:%S"), level, message)
+        with self.lock:
+            self.entries.append(entry)
+            self.pending.append(entry)
+        return entry
+
+    def drain_pending(self):
+        """取出所有待绘制的日志"""
+        with self.lock:
+            entries = list(self.pending)
+            self.pending.clear()
+        return entries
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries)
+
+
+def level_allows(level, min_level):
+    return LEVELS.index(level) >= LEVELS.index(min_level)
+
+
+def format_entry(entry):
+    timestamp, level, message = entry
+    return f"[{timestamp}] {message}\n"
+
+
+class LogView:
+    def __init__(self, parent, root, capacity=2000, fps=10):
+        """
+        参数:
+            parent: 父容器
+            root: Tk根窗口，用于调度刷新
+            capacity: 保留的日志条数
+            fps: 每秒最多刷新次数
+        """
+        self.root = root
+        self.buffer = LogBuffer(capacity)
+        self.interval = max(1, int(1000 / fps))
+        self.min_level = 'INFO'
+
+        # 当前显示的每条日志占用的行数，用于按索引裁剪
+        self.displayed = deque()
+        self.displayed_lines = 0
+
+        toolbar = ttk.Frame(parent)
+        toolbar.pack(fill="x")
+        ttk.Label(toolbar, text="级别:").pack(side="left")
+        self.level_var = tk.StringVar(value=self.min_level)
+        level_box = ttk.Combobox(toolbar, textvariable=self.level_var, values=LEVELS, width=10, state="readonly")
+        level_box.pack(side="left", padx=5)
+        level_box.bind("<<ComboboxSelected>>", lambda event: self.set_level(self.level_var.get()))
+
+        text_frame = ttk.Frame(parent)
+        text_frame.pack(fill="both", expand=True)
+        self.text = tk.Text(text_frame, height=20, wrap=tk.WORD)
+        scrollbar = ttk.Scrollbar(text_frame, orient="vertical", command=self.text.yview)
+        self.text.configure(yscrollcommand=scrollbar.set)
+        self.text.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        self.root.after(self.interval, self._flush)
+
+    def append(self, message, level='INFO'):
+        """添加一条日志，可以在任意线程调用"""
+        self.buffer.append(message, level)
+
+    def set_level(self, min_level):
+        """切换过滤级别，从缓冲区重新绘制"""
+        self.min_level = min_level
+        self.buffer.drain_pending()
+        self.text.delete('1.0', tk.END)
+        self.displayed.clear()
+        self.displayed_lines = 0
+        self._render(self.buffer.snapshot())
+
+    def _flush(self):
+        try:
+            entries = self.buffer.drain_pending()
+            if entries:
+                self._render(entries)
+        finally:
+            self.root.after(self.interval, self._flush)
+
+    def _render(self, entries):
+        visible = [entry for entry in entries if level_allows(entry[1], self.min_level)]
+        if not visible:
+            return
+
+        # 用户向上翻看时不自动滚动到底部
+        at_bottom = self.text.yview()[1] >= 0.999
+        chunks = [format_entry(entry) for entry in visible]
+        self.text.insert(tk.END, ''.join(chunks))
+        for chunk in chunks:
+            lines = chunk.count('\n')
+            self.displayed.append(lines)
+            self.displayed_lines += lines
+
+        # 按整条日志裁剪超出容量的部分，只计算行号，不读取文本内容
+        overflow_lines = 0
+        while len(self.displayed) > self.buffer.capacity:
+            overflow_lines += self.displayed.popleft()
+        if overflow_lines:
+            self.text.delete('1.0', f"{overflow_lines + 1}.0")
+            self.displayed_lines -= overflow_lines
+
+        if at_bottom:
+            self.text.see(tk.END)
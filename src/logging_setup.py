@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+日志配置模块
+所有模块的日志先进入内存队列，由单独的监听线程写入按大小轮转的日志文件、控制台和GUI日志视图，
+记录日志的线程（截图分析、数据库写入等）不做任何文件I/O
+"""
+
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+_listener = None
+_dispatcher = None
+# 上次按模块覆盖过级别的日志器名
+_overridden = set()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞调用线程"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DispatchHandler(logging.Handler):
+    """在监听线程中把日志分发给订阅者（例如GUI日志视图）"""
+
+    def __init__(self):
+        super().__init__()
+        self.sinks = []
+        self.sinks_lock = threading.Lock()
+
+    def add_sink(self, sink, level=logging.INFO):
+        with self.sinks_lock:
+            self.sinks.append((sink, level))
+
+    def remove_sink(self, sink):
+        with self.sinks_lock:
+            self.sinks = [(s, level) for s, level in self.sinks if s is not sink]
+
+    def emit(self, record):
+        with self.sinks_lock:
+            sinks = list(self.sinks)
+        for sink, level in sinks:
+            if record.levelno >= level:
+                try:
+                    sink(record)
+                except Exception:
+                    self.handleError(record)
+
+
+def _apply_levels(log_config):
+    logging.getLogger().setLevel(log_config.get('level', 'INFO'))
+    # 按模块覆盖级别，例如 {'ollama_client': 'DEBUG', 'backend_pool': 'WARNING'}
+    levels = log_config.get('levels') or {}
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+    # 热加载时从配置中删掉的覆盖恢复为跟随上级日志器
+    for name in _overridden - set(levels):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    _overridden.clear()
+    _overridden.update(levels)
+
+
+def setup_logging(config):
+    """
+    配置全局日志，重复调用时只更新日志级别
+    配置项见 config.yaml 中的 logging 段
+    """
+    global _listener, _dispatcher
+    log_config = config.get('logging', {})
+
+    with _lock:
+        _apply_levels(log_config)
+        if _listener is not None:
+            return
+
+        handlers = []
+        log_file = log_config.get('file', 'activity_tracker.log')
+        if log_file:
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=log_config.get('max_mb', 10) * 1024 * 1024,
+                backupCount=log_config.get('backup_count', 5),
+                encoding='utf-8'
+            )
+            file_handler.setFormatter(JsonFormatter() if log_config.get('json', False) else logging.Formatter(LOG_FORMAT))
+            handlers.append(file_handler)
+
+        if log_config.get('console', True):
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers.append(console_handler)
+
+        _dispatcher = DispatchHandler()
+        handlers.append(_dispatcher)
+
+        log_queue = queue.Queue(log_config.get('queue_size', 10000))
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(DroppingQueueHandler(log_queue))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def apply_config(config):
+    """热加载配置时更新日志级别（文件和格式设置需要重启后生效）"""
+    with _lock:
+        _apply_levels(config.get('logging', {}))
+
+
+def add_sink(sink, level=logging.INFO):
+    """
+    订阅日志，sink在日志监听线程中以LogRecord为参数调用
+    日志尚未配置时返回False
+    """
+    if _dispatcher is None:
+        return False
+    _dispatcher.add_sink(sink, level)
+    return True
+
+
+def remove_sink(sink):
+    if _dispatcher is not None:
+        _dispatcher.remove_sink(sink)
+
+
+def shutdown_logging():
+    """停止监听线程，写完队列中剩余的日志"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+内存监控模块
+定期采样进程常驻内存（RSS）和各组件的内存占用，超出内存预算时告警并回收可释放的缓存；
+开启tracemalloc后按模块统计Python对象的内存分配，便于定位持续增长的组件
+"""
+
+import gc
+import os
+import sys
+import time
+import logging
+import threading
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """
+    当前进程的常驻内存（字节）
+    依次尝试psutil、/proc（Linux）和ps命令（macOS），都不可用时返回None
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import subprocess
+        output = subprocess.run(
+            ['ps', '-o', 'rss=', '-p', str(os.getpid())],
+            capture_output=True, text=True, timeout=5
+        ).stdout
+        return int(output.strip()) * 1024
+    except Exception:
+        return None
+
+
+def _trim_native_heap():
+    """让glibc把空闲的堆内存归还给系统（其他平台上什么都不做）"""
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except Exception:
+        pass
+
+
+class MemoryWatchdog:
+    def __init__(self, config):
+        self.components = {}
+        self.lock = threading.Lock()
+
+        self.baseline = None
+        self.peak = 0
+        self.over_budget = 0
+        self.last_report = None
+
+        self.logger = logging.getLogger(__name__)
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        memory_config = config.get('memory', {})
+        # 内存预算（MB），RSS超出时告警并回收缓存，0表示不限制
+        self.budget = memory_config.get('budget_mb', 512) * MB
+        self.interval = memory_config.get('check_interval', 300)
+        self.top_modules = memory_config.get('top_modules', 5)
+
+        self.tracemalloc = memory_config.get('tracemalloc', False)
+        import tracemalloc
+        if self.tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not self.tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def register(self, name, probe, reclaim=None):
+        """
+        注册组件
+        参数:
+            name: 组件名
+            probe: 返回组件当前内存占用（字节）的函数
+            reclaim: 超出预算时调用的释放函数（可选）
+        """
+        with self.lock:
+            self.components[name] = (probe, reclaim)
+
+    def _component_sizes(self):
+        with self.lock:
+            components = dict(self.components)
+        sizes = {}
+        for name, (probe, _) in components.items():
+            try:
+                sizes[name] = probe()
+            except Exception as e:
+                self.logger.debug(f"读取组件 {name} 内存占用失败: {str(e)}")
+                sizes[name] = None
+        return sizes
+
+    def _module_sizes(self):
+        """tracemalloc按源文件汇总的Python内存分配（字节），取最大的几个模块"""
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return None
+        totals = {}
+        for stat in tracemalloc.take_snapshot().statistics('filename'):
+            module = os.path.splitext(os.path.basename(stat.traceback[0].filename))[0]
+            totals[module] = totals.get(module, 0) + stat.size
+        top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:self.top_modules]
+        return dict(top)
+
+    def check(self):
+        """
+        采样一次内存占用，超出预算时回收缓存
+        返回: 报告字典
+        """
+        rss = current_rss()
+        if rss is not None:
+            if self.baseline is None:
+                self.baseline = rss
+            self.peak = max(self.peak, rss)
+
+        report = {
+            'time': time.time(),
+            'rss_mb': round(rss / MB, 1) if rss is not None else None,
+            'baseline_mb': round(self.baseline / MB, 1) if self.baseline is not None else None,
+            'peak_mb': round(self.peak / MB, 1),
+            'budget_mb': round(self.budget / MB) if self.budget else None,
+            'over_budget': self.over_budget,
+            'gc_objects': len(gc.get_objects()),
+            'components_mb': {
+                name: round(size / MB, 2) if size is not None else None
+                for name, size in self._component_sizes().items()
+            },
+        }
+        modules = self._module_sizes()
+        if modules is not None:
+            report['modules_mb'] = {name: round(size / MB, 2) for name, size in modules.items()}
+
+        if rss is not None and self.budget and rss > self.budget:
+            self.over_budget += 1
+            report['over_budget'] = self.over_budget
+            self.logger.warning(
+                f"内存占用 {report['rss_mb']}MB 超出预算 {report['budget_mb']}MB，"
+                f"组件占用: {report['components_mb']}"
+            )
+            report['rss_after_reclaim_mb'] = self.reclaim()
+        else:
+            self.logger.info(f"内存占用 {report['rss_mb']}MB（峰值 {report['peak_mb']}MB），组件占用: {report['components_mb']}")
+
+        self.last_report = report
+        return report
+
+    def reclaim(self):
+        """
+        释放各组件的缓存并做一次完整的垃圾回收
+        返回: 回收后的RSS（MB）
+        """
+        with self.lock:
+            reclaimers = [(name, reclaim) for name, (_, reclaim) in self.components.items() if reclaim]
+        for name, reclaim in reclaimers:
+            try:
+                reclaim()
+            except Exception as e:
+                self.logger.error(f"释放组件 {name} 的内存失败: {str(e)}")
+        gc.collect()
+        _trim_native_heap()
+
+        rss = current_rss()
+        if rss is not None:
+            self.logger.info(f"内存回收后占用 {rss / MB:.1f}MB")
+            return round(rss / MB, 1)
+        return None
+
+    def get_metrics(self):
+        return self.last_report
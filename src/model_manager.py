@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+模型生命周期管理模块
+负责模型预加载、keep_alive设置、文本任务批量调度以及冷/热启动延迟统计
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class PhaseTimeout(Exception):
+    """文本任务批次在截止时刻之前没有结束，视觉调用没有执行"""
+
+
+class ModelManager:
+    def __init__(self, config):
+        self.apply_config(config)
+
+        # 视觉调用与文本批次互斥，避免两个模型交替加载
+        self.phase_condition = threading.Condition()
+        self.vision_in_flight = 0
+        self.text_batch_running = False
+
+        self.text_queue = queue.Queue()
+        self.text_worker = None
+        self.worker_lock = threading.Lock()
+        # 文本批次结束后的回调，由OllamaClient设置为卸载文本模型并预热视觉模型
+        self.on_text_batch_done = None
+
+        self.metrics = {}
+        self.metrics_lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def apply_config(self, config):
+        """更新模型名和生命周期设置，排队中的文本任务和统计数据保留"""
+        ollama_config = config['ollama']
+        lifecycle = ollama_config.get('lifecycle', {})
+
+        self.vision_model = ollama_config['model']
+        self.text_model = ollama_config.get('text_model') or self.vision_model.replace('llava', 'llama2')
+
+        self.preload_enabled = lifecycle.get('preload', True)
+        self.vision_keep_alive = lifecycle.get('vision_keep_alive', '30m')
+        self.text_keep_alive = lifecycle.get('text_keep_alive', '2m')
+        self.unload_text_after_batch = lifecycle.get('unload_text_after_batch', True)
+        # Ollama返回的load_duration超过该值（秒）视为冷启动
+        self.cold_threshold = lifecycle.get('cold_threshold', 1.0)
+
+    def keep_alive_for(self, model):
+        """返回指定模型请求应携带的keep_alive"""
+        return self.text_keep_alive if model == self.text_model else self.vision_keep_alive
+
+    @contextmanager
+    def vision_phase(self, deadline=None):
+        """
+        视觉调用期间持有的上下文，文本批次运行时会等待其结束
+        参数: deadline - 截止时刻（time.monotonic()），到时文本批次仍在运行则抛出PhaseTimeout
+        """
+        with self.phase_condition:
+            while self.text_batch_running:
+                if deadline is None:
+                    self.phase_condition.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PhaseTimeout("文本任务批次运行中，等待超过截止时刻")
+                self.phase_condition.wait(remaining)
+            self.vision_in_flight += 1
+        try:
+            yield
+        finally:
+            with self.phase_condition:
+                self.vision_in_flight -= 1
+                self.phase_condition.notify_all()
+
+    def run_text(self, func, *args, **kwargs):
+        """
+        提交文本模型任务并等待结果
+        任务会与其他排队的文本任务合并成一个批次，在视觉调用空闲时连续执行
+        """
+        future = Future()
+        self.text_queue.put((future, func, args, kwargs))
+        self._ensure_text_worker()
+        return future.result()
+
+    def _ensure_text_worker(self):
+        # 并发提交时只启动一个工作线程
+        with self.worker_lock:
+            if self.text_worker and self.text_worker.is_alive():
+                return
+            self.text_worker = threading.Thread(target=self._text_loop, daemon=True)
+            self.text_worker.start()
+
+    def _text_loop(self):
+        while True:
+            job = self.text_queue.get()
+            batch = [job]
+            # 收集已排队的文本任务，一次性执行
+            while True:
+                try:
+                    batch.append(self.text_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self.phase_condition:
+                while self.vision_in_flight:
+                    self.phase_condition.wait()
+                self.text_batch_running = True
+
+            self.logger.info(f"开始执行文本任务批次，共 {len(batch)} 个任务")
+            try:
+                for future, func, args, kwargs in batch:
+                    try:
+                        future.set_result(func(*args, **kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+                if self.unload_text_after_batch and self.on_text_batch_done:
+                    self.on_text_batch_done()
+            finally:
+                with self.phase_condition:
+                    self.text_batch_running = False
+                    self.phase_condition.notify_all()
+
+    def record_response(self, model, result, latency):
+        """根据Ollama返回的load_duration记录冷/热启动延迟"""
+        load_seconds = result.get('load_duration', 0) / 1e9
+        kind = 'cold' if load_seconds >= self.cold_threshold else 'warm'
+        with self.metrics_lock:
+            stats = self.metrics.setdefault(model, {
+                'cold_count': 0, 'cold_latency': 0.0, 'cold_load': 0.0,
+                'warm_count': 0, 'warm_latency': 0.0,
+            })
+            stats[f'{kind}_count'] += 1
+            stats[f'{kind}_latency'] += latency
+            if kind == 'cold':
+                stats['cold_load'] += load_seconds
+        if kind == 'cold':
+            self.logger.info(f"模型 {model} 冷启动: 加载 {load_seconds:.1f}s, 总耗时 {latency:.1f}s")
+
+    def get_metrics(self):
+        """返回每个模型的冷/热启动统计"""
+        summary = {}
+        with self.metrics_lock:
+            for model, stats in self.metrics.items():
+                cold, warm = stats['cold_count'], stats['warm_count']
+                summary[model] = {
+                    'cold_count': cold,
+                    'warm_count': warm,
+                    'avg_cold_latency': round(stats['cold_latency'] / cold, 3) if cold else None,
+                    'avg_cold_load': round(stats['cold_load'] / cold, 3) if cold else None,
+                    'avg_warm_latency': round(stats['warm_latency'] / warm, 3) if warm else None,
+                }
+        return summary
+
+    def log_metrics(self):
+        for model, stats in self.get_metrics().items():
+            self.logger.info(
+                f"模型 {model}: 冷启动 {stats['cold_count']}次(平均{stats['avg_cold_latency']}s), "
+                f"热调用 {stats['warm_count']}次(平均{stats['avg_warm_latency']}s)"
+            )
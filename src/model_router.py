@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+模型路由模块
+常规画面交给小模型处理，仅在画面新颖、小模型置信度低或按小时抽样时升级到大模型
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import deque
+from PIL import Image
+
+# 追加在小模型提示词后面，要求模型自报置信度
+CONFIDENCE_INSTRUCTION = "\n最后请单独输出一行“置信度: X”，X为0到1之间的小数，表示你对以上描述的把握程度。"
+CONFIDENCE_PATTERN = re.compile(r'^\s*置信度\s*[:：]\s*([01](?:\.\d+)?)\s*$', re.MULTILINE)
+
+
+def compute_frame_hash(image, hash_size=8):
+    """
+    计算画面的差值哈希(dHash)
+    参数: image - PIL Image对象
+    返回: hash_size*hash_size 位的整数
+    """
+    thumb = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(thumb.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] > pixels[offset + col + 1] else 0)
+    return value
+
+
+def hamming_distance(hash1, hash2):
+    """计算两个哈希的汉明距离"""
+    return bin(hash1 ^ hash2).count('1')
+
+
+def text_similarity(text1, text2):
+    """计算两个文本的词集合相似度"""
+    words1 = set(text1.lower().split())
+    words2 = set(text2.lower().split())
+    if not words1 and not words2:
+        return 1.0
+    if not words1 or not words2:
+        return 0.0
+    return len(words1 & words2) / len(words1 | words2)
+
+
+def parse_confidence(text):
+    """
+    从小模型输出中解析置信度
+    返回: (去掉置信度行的描述, 置信度或None)
+    """
+    match = CONFIDENCE_PATTERN.search(text)
+    if not match:
+        return text.strip(), None
+    description = (text[:match.start()] + text[match.end():]).strip()
+    return description, float(match.group(1))
+
+
+class ModelRouter:
+    def __init__(self, config):
+        ollama_config = config['ollama']
+        routing = ollama_config.get('routing', {})
+
+        self.enabled = routing.get('enabled', False)
+        self.large_model = ollama_config['model']
+        self.small_model = routing.get('small_model', 'moondream:latest')
+        self.novelty_distance = routing.get('novelty_distance', 12)
+        self.confidence_threshold = routing.get('confidence_threshold', 0.6)
+        self.samples_per_hour = routing.get('samples_per_hour', 2)
+        self.stats_log_every = routing.get('stats_log_every', 20)
+
+        # 最近见过的画面哈希，用于判断新颖度
+        self.recent_hashes = deque(maxlen=routing.get('history_size', 32))
+        self.last_sample_time = None
+        # 最近一次路由的画面哈希，追踪器合并活动时间段时复用，不再重复计算
+        self.last_frame_hash = None
+
+        # 路由统计: 每个模型层级的调用次数与累计耗时
+        self.stats = {
+            'small': {'count': 0, 'latency': 0.0},
+            'large': {'count': 0, 'latency': 0.0},
+            'reasons': {},
+            'agreement': {'count': 0, 'total': 0.0},
+        }
+        self.decisions = 0
+        # 实时截图、补录和指标查询在不同线程中读写路由状态与统计
+        self.lock = threading.Lock()
+
+        self.logger = logging.getLogger(__name__)
+
+    def route(self, image):
+        """
+        在调用模型前决定是否直接升级到大模型
+        返回: (frame_hash, 升级原因或None)
+        """
+        frame_hash = compute_frame_hash(image)
+        reason = None
+
+        with self.lock:
+            if self._is_novel(frame_hash):
+                reason = 'novel'
+            elif self._sample_due():
+                reason = 'sample'
+
+            self.recent_hashes.append(frame_hash)
+            self.last_frame_hash = frame_hash
+            if reason:
+                self.last_sample_time = time.time()
+        return frame_hash, reason
+
+    def should_escalate(self, confidence):
+        """小模型结果是否需要升级"""
+        return confidence is None or confidence < self.confidence_threshold
+
+    def _is_novel(self, frame_hash):
+        if not self.recent_hashes:
+            return True
+        nearest = min(hamming_distance(frame_hash, h) for h in self.recent_hashes)
+        return nearest > self.novelty_distance
+
+    def _sample_due(self):
+        if self.samples_per_hour <= 0:
+            return False
+        if self.last_sample_time is None:
+            return True
+        return time.time() - self.last_sample_time >= 3600 / self.samples_per_hour
+
+    def record(self, tier, reason, latency, confidence=None):
+        """记录一次路由决策及其耗时"""
+        key = reason or 'routine'
+        with self.lock:
+            tier_stats = self.stats[tier]
+            tier_stats['count'] += 1
+            tier_stats['latency'] += latency
+            self.stats['reasons'][key] = self.stats['reasons'].get(key, 0) + 1
+            self.decisions += 1
+            decisions = self.decisions
+
+        confidence_text = f"{confidence:.2f}" if confidence is not None else "N/A"
+        self.logger.info(
+            f"路由决策: tier={tier}, reason={key}, latency={latency:.2f}s, confidence={confidence_text}"
+        )
+
+        if self.stats_log_every and decisions % self.stats_log_every == 0:
+            self.log_stats()
+
+    def record_agreement(self, small_text, large_text):
+        """记录抽样帧上大小模型描述的一致程度，用于评估小模型质量"""
+        similarity = text_similarity(small_text, large_text)
+        with self.lock:
+            self.stats['agreement']['count'] += 1
+            self.stats['agreement']['total'] += similarity
+        self.logger.info(f"抽样对比: 大小模型描述相似度 {similarity:.2f}")
+
+    def get_stats(self):
+        """返回路由统计摘要"""
+        summary = {}
+        with self.lock:
+            for tier in ('small', 'large'):
+                count = self.stats[tier]['count']
+                summary[f'{tier}_count'] = count
+                summary[f'{tier}_avg_latency'] = round(self.stats[tier]['latency'] / count, 3) if count else 0.0
+            agreement = dict(self.stats['agreement'])
+            summary['reasons'] = dict(self.stats['reasons'])
+        total = summary['small_count'] + summary['large_count']
+        summary['escalation_rate'] = round(summary['large_count'] / total, 3) if total else 0.0
+        summary['avg_agreement'] = round(agreement['total'] / agreement['count'], 3) if agreement['count'] else None
+        return summary
+
+    def log_stats(self):
+        stats = self.get_stats()
+        self.logger.info(
+            f"路由统计: 小模型 {stats['small_count']}次(平均{stats['small_avg_latency']}s), "
+            f"大模型 {stats['large_count']}次(平均{stats['large_avg_latency']}s), "
+            f"升级率 {stats['escalation_rate']}, 抽样一致度 {stats['avg_agreement']}, "
+            f"原因分布 {stats['reasons']}"
+        )
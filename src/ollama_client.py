@@ -7,84 +7,367 @@ Ollama客户端模块
 import requests
 import json
 import base64
-import io
 import logging
+import time
+import threading
 from PIL import Image
 
+from backend_pool import BackendPool, NoBackendAvailable
+from circuit_breaker import CircuitBreaker, AdaptiveTimeout
+from image_encoder import ImageEncoder
+from model_manager import ModelManager, PhaseTimeout
+from model_router import ModelRouter, CONFIDENCE_INSTRUCTION, parse_confidence
+from prompt_compactor import PromptCompactor
+
+
+class ImageRequestBody:
+    """
+    带图片的generate请求体，以文件对象的形式交给requests发送:
+    JPEG在读取时逐块编码为base64，不在内存中构造base64字符串和完整的JSON
+    """
+    # 3的倍数，分块编码的结果与整体编码一致
+    CHUNK_SIZE = 3 * 16384
+
+    def __init__(self, payload, images):
+        """
+        参数:
+            payload: 除images以外的请求字段
+            images: JPEG字节串列表
+        """
+        head = json.dumps(payload, ensure_ascii=False)[:-1] + ', "images": ['
+        self.parts = [head.encode('utf-8')]
+        for index, jpeg_bytes in enumerate(images):
+            self.parts.append(b', "' if index else b'"')
+            self.parts.append(memoryview(jpeg_bytes))
+            self.parts.append(b'"')
+        self.parts.append(b']}')
+        
+        self.length = sum(
+            (len(part) + 2) // 3 * 4 if isinstance(part, memoryview) else len(part)
+            for part in self.parts
+        )
+        self.chunks = self._iter_chunks()
+        self.pending = b''
+    
+    def _iter_chunks(self):
+        for part in self.parts:
+            if isinstance(part, memoryview):
+                for offset in range(0, len(part), self.CHUNK_SIZE):
+                    yield base64.b64encode(part[offset:offset + self.CHUNK_SIZE])
+            else:
+                yield part
+    
+    def __len__(self):
+        return self.length
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self.pending + b''.join(self.chunks)
+            self.pending = b''
+            return data
+        if not self.pending:
+            self.pending = next(self.chunks, b'')
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
 class OllamaClient:
-    def __init__(self, config):
+    def __init__(self, config, encoder=None):
         self.config = config
-        self.base_url = config['ollama']['base_url']
+        self.pool = BackendPool(config)
         self.model = config['ollama']['model']
         self.timeout = config['ollama']['timeout']
         self.system_prompt = config['analysis']['system_prompt']
         
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
+        # JPEG编码交给编码服务在子进程中完成
+        self.encoder = encoder or ImageEncoder(config)
+        
+        # 图像分析与总结可以指向不同的后端分组
+        self.analysis_group = config['ollama'].get('analysis_group', 'vision')
+        self.summary_group = config['ollama'].get('summary_group', 'text')
+        
+        # 模型生命周期管理: keep_alive、文本任务批量调度、冷/热延迟统计
+        self.models = ModelManager(config)
+        self.text_model = self.models.text_model
+        if self.models.unload_text_after_batch:
+            self.models.on_text_batch_done = self._after_text_batch
+        
+        # 分层模型路由（默认关闭）
+        self.router = ModelRouter(config)
+        self.compactor = PromptCompactor(config)
+        
+        # 按后端分组熔断，按模型统计延迟并计算自适应超时
+        self.breakers = {}
+        self.latency = {}
+        self.calls_lock = threading.Lock()
+        self._apply_call_config(config['ollama'])
+        
+        # 设置日志（由logging_setup统一配置输出）
         self.logger = logging.getLogger(__name__)
+        
+        # 多后端时在后台持续做健康检查
+        if len(self.pool.backends) > 1:
+            self.pool.start_health_checks()
     
-    def _image_to_base64(self, image):
+    def apply_config(self, config):
         """
-        将PIL Image转换为base64字符串
+        热加载配置: 模型、提示词、超时和路由设置立即生效；
+        后端地址或连接池设置变化时在后台建好新连接池并完成健康检查后再切换，切换前的请求继续使用旧连接池
         """
+        old_ollama = self.config.get('ollama', {})
+        new_ollama = config['ollama']
+        if (old_ollama.get('base_url') != new_ollama.get('base_url')
+                or old_ollama.get('pool') != new_ollama.get('pool')):
+            threading.Thread(target=self._rebuild_pool, args=(config,), daemon=True).start()
+        
+        self.model = new_ollama['model']
+        self.timeout = new_ollama['timeout']
+        self.system_prompt = config['analysis']['system_prompt']
+        self.analysis_group = new_ollama.get('analysis_group', 'vision')
+        self.summary_group = new_ollama.get('summary_group', 'text')
+        
+        self.models.apply_config(config)
+        self.text_model = self.models.text_model
+        self.models.on_text_batch_done = self._after_text_batch if self.models.unload_text_after_batch else None
+        
+        # 路由的画面哈希历史与模型相关，设置变化时重建
+        if old_ollama.get('routing') != new_ollama.get('routing') or old_ollama.get('model') != new_ollama['model']:
+            self.router = ModelRouter(config)
+        self.compactor = PromptCompactor(config)
+        if (old_ollama.get('breaker') != new_ollama.get('breaker')
+                or old_ollama.get('adaptive_timeout') != new_ollama.get('adaptive_timeout')):
+            with self.calls_lock:
+                # 设置变化后重新开始统计
+                self.breakers = {}
+                self.latency = {}
+        self._apply_call_config(new_ollama)
+        self.config = config
+    
+    def _apply_call_config(self, ollama_config):
+        self.breaker_config = ollama_config.get('breaker', {})
+        self.adaptive_config = ollama_config.get('adaptive_timeout', {})
+        # 距离截止时间不足该秒数时不再发起请求
+        self.min_request_seconds = ollama_config.get('min_request_seconds', 3)
+    
+    def _breaker(self, group):
+        with self.calls_lock:
+            breaker = self.breakers.get(group)
+            if breaker is None:
+                breaker = self.breakers[group] = CircuitBreaker(
+                    f"ollama:{group}",
+                    failure_threshold=self.breaker_config.get('failure_threshold', 3),
+                    reset_timeout=self.breaker_config.get('reset_timeout', 30),
+                    max_reset_timeout=self.breaker_config.get('max_reset_timeout', 300),
+                    half_open_requests=self.breaker_config.get('half_open_requests', 1)
+                )
+            return breaker
+    
+    def _latency(self, model):
+        with self.calls_lock:
+            tracker = self.latency.get(model)
+            if tracker is None:
+                tracker = self.latency[model] = AdaptiveTimeout(self.adaptive_config)
+            return tracker
+    
+    def _rebuild_pool(self, config):
         try:
-            buffer = io.BytesIO()
-            # 确保图像是RGB模式
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            image.save(buffer, format='JPEG', quality=85)
-            buffer.seek(0)
-            return base64.b64encode(buffer.read()).decode('utf-8')
+            pool = BackendPool(config)
+            healthy = pool.check_health()
+            if len(pool.backends) > 1:
+                pool.start_health_checks()
+            old_pool, self.pool = self.pool, pool
+            old_pool.stop_health_checks()
+            self.logger.info(f"Ollama后端已切换，{healthy}/{len(pool.backends)} 个后端可用")
         except Exception as e:
-            self.logger.error(f"图像转换base64失败: {str(e)}")
-            return None
+            self.logger.error(f"重建Ollama后端池失败，继续使用原后端: {str(e)}")
     
-    def analyze_screenshot(self, image):
+    def _image_to_jpeg(self, image):
         """
-        分析屏幕截图
-        参数: image - PIL Image对象
-        返回: 分析结果字符串
+        将PIL Image编码为JPEG字节串（base64编码在发送请求时流式完成）
         """
         try:
-            # 转换图像为base64
-            image_base64 = self._image_to_base64(image)
-            if not image_base64:
+            return self.encoder.encode_jpeg(image, quality=85)
+        except Exception as e:
+            self.logger.error(f"图像编码失败: {str(e)}")
+            return None
+    
+    def _generate(self, model, prompt, images=None, timeout=None, group=None, keep_alive=None, deadline=None):
+        """
+        调用Ollama的generate接口
+        参数:
+            images: JPEG字节串列表（可选）
+            timeout: 超时上限，实际超时按该模型的延迟分位数计算
+            deadline: 截止时刻（time.monotonic()），请求不会超过该时刻
+        返回: 模型输出字符串，失败、熔断或时间不足时返回None
+        """
+        group = group or self.analysis_group
+        max_timeout = timeout or self.timeout
+        latency = self._latency(model)
+        request_timeout = latency.get(max_timeout)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining < self.min_request_seconds:
+                self.logger.warning(f"距离下次截图不足{self.min_request_seconds}秒，跳过本次Ollama请求")
                 return None
-            
-            # 准备请求数据
-            payload = {
-                "model": self.model,
-                "prompt": self.system_prompt,
-                "images": [image_base64],
-                "stream": False
-            }
-            
-            # 发送请求到Ollama
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=self.timeout
+            request_timeout = min(request_timeout, remaining)
+        
+        # 熔断期间立即失败，不再等满超时
+        breaker = self._breaker(group)
+        if not breaker.allow():
+            self.logger.warning(f"Ollama后端({group})已熔断，{breaker.retry_in():.0f}秒后试探")
+            return None
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": keep_alive if keep_alive is not None else self.models.keep_alive_for(model)
+        }
+        if images:
+            body = {'data': ImageRequestBody(payload, images), 'headers': {'Content-Type': 'application/json'}}
+        else:
+            body = {'json': payload}
+        
+        healthy = False
+        sent = True
+        try:
+            start = time.monotonic()
+            response = self.pool.request(
+                'POST',
+                '/api/generate',
+                group=group,
+                deadline=deadline,
+                timeout=request_timeout,
+                **body
             )
+            # 4xx说明后端在正常响应，问题出在请求本身
+            healthy = response.status_code < 500
             
             if response.status_code == 200:
                 result = response.json()
-                analysis = result.get('response', '').strip()
-                self.logger.info("图像分析成功")
-                return analysis
+                elapsed = time.monotonic() - start
+                latency.record(elapsed)
+                self.models.record_response(model, result, elapsed)
+                return result.get('response', '').strip()
             else:
                 self.logger.error(f"Ollama请求失败: {response.status_code}, {response.text}")
                 return None
                 
+        except NoBackendAvailable as e:
+            sent = False
+            self.logger.warning(f"Ollama请求未发出: {str(e)}")
+            return None
         except requests.exceptions.ConnectionError:
             self.logger.error("无法连接到Ollama服务，请确保Ollama正在运行")
             return None
         except requests.exceptions.Timeout:
-            self.logger.error("Ollama请求超时")
+            self.logger.error(f"Ollama请求超时（{request_timeout:.1f}秒）")
+            # 超时按所用的超时计入延迟样本，后续超时随之放宽
+            if request_timeout >= latency.get(max_timeout):
+                latency.record(request_timeout)
+            return None
+        finally:
+            if not sent:
+                # 请求没有发出，无法说明后端是否故障，只归还半开状态的试探名额
+                breaker.release()
+            elif healthy:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+    
+    def get_call_metrics(self):
+        """返回各分组的熔断状态和各模型的延迟分位数及当前超时"""
+        with self.calls_lock:
+            breakers = dict(self.breakers)
+            latency = dict(self.latency)
+        return {
+            'breakers': {group: breaker.get_state() for group, breaker in breakers.items()},
+            'latency': {model: tracker.get_stats(self.timeout) for model, tracker in latency.items()},
+        }
+    
+    def analyze_screenshot(self, image, deadline=None):
+        """
+        分析屏幕截图
+        参数:
+            image: PIL Image对象
+            deadline: 截止时刻（time.monotonic()），通常是下一次截图的时刻
+        返回: 分析结果字符串
+        """
+        try:
+            # 编码为JPEG
+            jpeg_bytes = self._image_to_jpeg(image)
+            if not jpeg_bytes:
+                return None
+            
+            with self.models.vision_phase(deadline):
+                if self.router.enabled:
+                    return self._analyze_with_routing(image, jpeg_bytes, deadline)
+                
+                analysis = self._generate(self.model, self.system_prompt, [jpeg_bytes], deadline=deadline)
+            if analysis is not None:
+                self.logger.info("图像分析成功")
+            return analysis
+        
+        except PhaseTimeout as e:
+            # 返回None，由调用方写入离线缓存
+            self.logger.warning(f"{str(e)}，跳过本次分析")
             return None
         except Exception as e:
             self.logger.error(f"分析截图时出错: {str(e)}")
             return None
     
+    def analyze_encoded(self, jpeg_bytes):
+        """
+        直接分析已编码的截图（用于批量重新分析）
+        参数: jpeg_bytes - JPEG字节串
+        返回: 分析结果字符串
+        """
+        with self.models.vision_phase():
+            return self._generate(self.model, self.system_prompt, [jpeg_bytes])
+    
+    def _analyze_with_routing(self, image, jpeg_bytes, deadline=None):
+        """
+        分层路由分析: 常规画面用小模型，必要时升级到大模型
+        """
+        _, reason = self.router.route(image)
+        small_analysis = None
+        
+        if reason != 'novel':
+            start = time.time()
+            small_output = self._generate(
+                self.router.small_model,
+                self.system_prompt + CONFIDENCE_INSTRUCTION,
+                [jpeg_bytes],
+                deadline=deadline
+            )
+            small_latency = time.time() - start
+            
+            if small_output is not None:
+                small_analysis, confidence = parse_confidence(small_output)
+                self.router.record('small', reason, small_latency, confidence)
+                if reason is None and self.router.should_escalate(confidence):
+                    reason = 'low_confidence'
+                
+                if reason is None:
+                    self.logger.info("图像分析成功")
+                    return small_analysis
+            elif reason is None:
+                # 小模型不可用时直接回退到大模型
+                reason = 'small_failed'
+        
+        start = time.time()
+        analysis = self._generate(self.model, self.system_prompt, [jpeg_bytes], deadline=deadline)
+        if analysis is None:
+            # 大模型失败时退回小模型的结果
+            return small_analysis
+        
+        self.router.record('large', reason, time.time() - start)
+        if reason == 'sample' and small_analysis:
+            self.router.record_agreement(small_analysis, analysis)
+        
+        self.logger.info("图像分析成功")
+        return analysis
+    
     def generate_daily_summary(self, activities):
         """
         生成每日总结
@@ -92,11 +375,8 @@ class OllamaClient:
         返回: 总结字符串
         """
         try:
-            # 构建活动记录文本
-            activities_text = "\n".join([
-                f"{activity['timestamp']}: {activity['description']}"
-                for activity in activities
-            ])
+            # 构建活动记录文本，合并重复活动并控制在模型的token预算内
+            activities_text, _ = self.compactor.compact(activities, self.text_model)
             
             # 准备总结提示
             summary_prompt = f"""
@@ -106,50 +386,128 @@ class OllamaClient:
             {activities_text}
             """
             
-            payload = {
-                "model": self.model.replace('llava', 'llama2'),  # 使用文本模型进行总结
-                "prompt": summary_prompt,
-                "stream": False
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=self.timeout * 2  # 总结可能需要更长时间
+            # 文本任务交给调度器批量执行，避免与视觉调用交替加载模型
+            summary = self.models.run_text(
+                self._generate,
+                self.text_model,
+                summary_prompt,
+                timeout=self.timeout * 2,  # 总结可能需要更长时间
+                group=self.summary_group
             )
             
-            if response.status_code == 200:
-                result = response.json()
-                summary = result.get('response', '').strip()
+            if summary is not None:
                 self.logger.info("每日总结生成成功")
-                return summary
             else:
-                self.logger.error(f"总结生成失败: {response.status_code}, {response.text}")
-                return None
+                self.logger.error("总结生成失败")
+            return summary
                 
         except Exception as e:
             self.logger.error(f"生成每日总结时出错: {str(e)}")
             return None
     
+    def generate_text(self, prompt, timeout=None):
+        """
+        使用文本模型生成文本（周/月汇总等文本任务）
+        参数:
+            prompt: 提示词
+            timeout: 超时时间，默认与每日总结相同
+        返回: 生成的文本，失败时返回None
+        """
+        try:
+            return self.models.run_text(
+                self._generate,
+                self.text_model,
+                prompt,
+                timeout=timeout or self.timeout * 2,
+                group=self.summary_group
+            )
+        except Exception as e:
+            self.logger.error(f"文本生成时出错: {str(e)}")
+            return None
+    
+    def _load_model(self, model, keep_alive, group):
+        """
+        在分组内的每个后端上加载或卸载模型（空prompt只加载模型不推理）
+        返回: 是否至少有一个后端成功
+        """
+        backends = [b for b in self.pool.backends if group in b.groups] or self.pool.backends
+        loaded = False
+        for backend in backends:
+            if not backend.healthy:
+                continue
+            try:
+                response = requests.post(
+                    f"{backend.url}/api/generate",
+                    json={"model": model, "keep_alive": keep_alive},
+                    timeout=self.timeout * 4  # 冷加载大模型可能较慢
+                )
+                if response.status_code == 200:
+                    loaded = True
+                    load_seconds = response.json().get('load_duration', 0) / 1e9
+                    self.logger.info(f"模型 {model} 已在 {backend.url} 就绪 (keep_alive={keep_alive}, 加载 {load_seconds:.1f}s)")
+                else:
+                    self.logger.warning(f"模型 {model} 在 {backend.url} 加载失败: {response.status_code}")
+            except Exception as e:
+                self.logger.warning(f"模型 {model} 在 {backend.url} 加载出错: {str(e)}")
+        return loaded
+    
+    def preload_models(self, available_models=None):
+        """
+        启动时预加载视觉模型，避免第一次截图分析承担冷启动
+        参数: available_models - 预检得到的可用模型列表，不在列表中的模型跳过
+        """
+        if not self.models.preload_enabled:
+            return False
+        models = [self.model]
+        if self.router.enabled:
+            models.append(self.router.small_model)
+        
+        loaded = False
+        for model in models:
+            if available_models is not None and model not in available_models:
+                self.logger.warning(f"模型 {model} 不可用，跳过预加载")
+                continue
+            loaded = self._load_model(model, self.models.vision_keep_alive, self.analysis_group) or loaded
+        return loaded
+    
+    def _after_text_batch(self):
+        """文本批次结束后卸载文本模型，并重新预热视觉模型"""
+        self._load_model(self.text_model, 0, self.summary_group)
+        self._load_model(self.model, self.models.vision_keep_alive, self.analysis_group)
+    
+    def is_available(self):
+        """是否至少有一个后端可以响应"""
+        return self.pool.check_health() > 0
+    
+    def list_models(self, timeout=None):
+        """
+        查询所有健康后端上的可用模型
+        返回: 模型名称列表，没有可用后端时返回None
+        """
+        if self.pool.check_health(timeout) == 0:
+            return None
+        model_names = set()
+        for backend in self.pool.backends:
+            if backend.healthy:
+                model_names.update(backend.models)
+        return sorted(model_names)
+    
     def test_connection(self):
         """
         测试与Ollama的连接
         """
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                self.logger.info(f"成功连接到Ollama，可用模型: {[m['name'] for m in models]}")
-                
-                # 检查所需模型是否存在
-                model_names = [m['name'] for m in models]
-                if self.model not in model_names:
-                    self.logger.warning(f"指定的模型 {self.model} 不在可用模型列表中")
-                    return False
-                return True
-            else:
-                self.logger.error(f"Ollama连接测试失败: {response.status_code}")
+            model_names = self.list_models()
+            if model_names is None:
+                self.logger.error("Ollama连接测试失败: 没有可用的后端")
+                return False
+            self.logger.info(f"成功连接到Ollama，可用模型: {model_names}")
+            
+            # 检查所需模型是否存在
+            if self.model not in model_names:
+                self.logger.warning(f"指定的模型 {self.model} 不在可用模型列表中")
                 return False
+            return True
         except Exception as e:
             self.logger.error(f"无法连接到Ollama: {str(e)}")
-            return False
\ No newline at end of file
+            return False
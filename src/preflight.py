@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+启动预检模块
+并发执行Ollama与截图权限检查，结果在有效期内缓存，重复启动追踪时无需再次检查
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 进程级缓存: GUI每次点击开始都会新建追踪器，缓存需要跨实例共享
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class PreflightResult:
+    def __init__(self, ok, message='', details=None):
+        self.ok = ok
+        self.message = message
+        self.details = details or {}
+        self.checked_at = time.time()
+
+
+class PreflightChecker:
+    def __init__(self, config, ollama_client, screenshot_capture):
+        preflight_config = config.get('preflight', {})
+        self.cache_ttl = preflight_config.get('cache_ttl', 300)
+        self.timeout = preflight_config.get('timeout', 3)
+
+        self.ollama_client = ollama_client
+        self.screenshot_capture = screenshot_capture
+
+        # 缓存键包含影响检查结果的配置，修改配置后会重新检查
+        ollama_config = config['ollama']
+        self.checks = {
+            ('ollama', repr(ollama_config['base_url']), ollama_config['model']): self.check_ollama,
+            ('capture',): self.check_capture,
+        }
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, force=False):
+        """
+        并发执行所有检查
+        参数: force - 忽略缓存强制重新检查
+        返回: {检查名称: PreflightResult}
+        """
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=len(self.checks)) as executor:
+            futures = {
+                key[0]: executor.submit(self._run_cached, key, check, force)
+                for key, check in self.checks.items()
+            }
+            results = {name: future.result() for name, future in futures.items()}
+        self.logger.info(f"预检完成，用时 {time.time() - start:.2f}s")
+        return results
+
+    def _run_cached(self, key, check, force):
+        now = time.time()
+        if not force:
+            with _cache_lock:
+                cached = _cache.get(key)
+            if cached and cached.ok and now - cached.checked_at < self.cache_ttl:
+                return cached
+
+        try:
+            result = check()
+        except Exception as e:
+            result = PreflightResult(False, str(e))
+
+        # 只缓存成功的结果，失败的检查下次启动时重试
+        with _cache_lock:
+            if result.ok:
+                _cache[key] = result
+            else:
+                _cache.pop(key, None)
+        return result
+
+    def check_ollama(self):
+        """检查Ollama连接，并返回可用模型列表供预热复用"""
+        models = self.ollama_client.list_models(timeout=self.timeout)
+        if models is None:
+            return PreflightResult(False, "无法连接到Ollama服务")
+        if self.ollama_client.model not in models:
+            return PreflightResult(
+                False, f"指定的模型 {self.ollama_client.model} 不在可用模型列表中", {'models': models}
+            )
+        return PreflightResult(True, "Ollama连接正常", {'models': models})
+
+    def check_capture(self):
+        """用1x1像素的区域截图探测屏幕录制权限"""
+        if self.screenshot_capture.probe(timeout=self.timeout):
+            return PreflightResult(True, "截图权限正常")
+        return PreflightResult(False, "截图功能测试失败")
+
+
+def clear_cache():
+    """清空预检缓存"""
+    with _cache_lock:
+        _cache.clear()
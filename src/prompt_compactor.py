@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+提示词压缩模块
+生成每日总结前压缩活动记录: 合并连续的相似活动为时间段、缩短时间戳，
+并按模型的token预算优先舍弃信息量最低的时间段
+"""
+
+import re
+import logging
+
+# 中日韩字符大致每个字一个token，其余文本大致每4个字符一个token
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def text_shingles(text):
+    """字符二元组集合，中文没有空格分词，用它衡量描述的相似度"""
+    text = re.sub(r'\s+', '', text.lower())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def similarity(shingles1, shingles2):
+    if not shingles1 and not shingles2:
+        return 1.0
+    if not shingles1 or not shingles2:
+        return 0.0
+    return len(shingles1 & shingles2) / len(shingles1 | shingles2)
+
+
+def _clock(timestamp):
+    """'2024-01-01 09:10:33.123' -> '09:10'"""
+    text = str(timestamp)
+    return text[11:16] if len(text) >= 16 else text
+
+
+def _activity_range(activity):
+    """活动记录或已存储的活动时间段 -> (开始, 结束, 采样数)"""
+    if 'start_time' in activity:
+        return _clock(activity['start_time']), _clock(activity['end_time']), activity.get('sample_count', 1)
+    clock = _clock(activity['timestamp'])
+    return clock, clock, 1
+
+
+class Span:
+    """一段连续的相似活动"""
+
+    def __init__(self, activity):
+        self.start, self.end, self.count = _activity_range(activity)
+        self.description = ' '.join(activity['description'].split())
+        self.shingles = text_shingles(self.description)
+
+    def absorb(self, activity):
+        _, self.end, count = _activity_range(activity)
+        self.count += count
+
+    def render(self, max_chars):
+        description = self.description
+        if len(description) > max_chars:
+            description = description[:max_chars] + '…'
+        time_range = self.start if self.start == self.end else f"{self.start}–{self.end}"
+        suffix = f" (×{self.count})" if self.count > 1 else ''
+        return f"{time_range} {description}{suffix}"
+
+
+class PromptCompactor:
+    def __init__(self, config):
+        summary_config = config.get('summary', {})
+        compaction_config = summary_config.get('compaction', {})
+        self.enabled = compaction_config.get('enabled', True)
+        self.similarity_threshold = compaction_config.get('similarity_threshold', 0.6)
+        self.max_line_chars = compaction_config.get('max_line_chars', 120)
+        self.default_budget = compaction_config.get('token_budget', 3000)
+        # 按模型名覆盖预算，例如 {'llama2': 3000, 'qwen2': 12000}
+        self.model_budgets = compaction_config.get('model_budgets', {})
+
+        self.logger = logging.getLogger(__name__)
+
+    def budget_for(self, model):
+        for name, budget in self.model_budgets.items():
+            if model == name or model.split(':')[0] == name:
+                return budget
+        return self.default_budget
+
+    def merge_spans(self, activities):
+        """把时间上连续、描述相似的活动合并为时间段"""
+        spans = []
+        for activity in activities:
+            if spans:
+                shingles = text_shingles(activity['description'])
+                if similarity(spans[-1].shingles, shingles) >= self.similarity_threshold:
+                    spans[-1].absorb(activity)
+                    continue
+            spans.append(Span(activity))
+        return spans
+
+    def _fit_budget(self, spans, budget):
+        """
+        超出预算时按记录条数从少到多舍弃时间段（零散的单条记录信息量最低），
+        被舍弃的部分汇总为一行说明
+        返回: 保留的行列表
+        """
+        lines = [span.render(self.max_line_chars) for span in spans]
+        tokens = [estimate_tokens(line) + 1 for line in lines]
+        total = sum(tokens)
+        if total <= budget:
+            return lines
+
+        # 省略说明也占预算，按最大的数字预留
+        reserve = estimate_tokens(self._omitted_line(len(spans), sum(span.count for span in spans))) + 1
+
+        # 条数相同时先舍弃较长的行，腾出更多预算
+        order = sorted(range(len(spans)), key=lambda i: (spans[i].count, -tokens[i]))
+        dropped = set()
+        dropped_activities = 0
+        for index in order:
+            if total + reserve <= budget:
+                break
+            dropped.add(index)
+            dropped_activities += spans[index].count
+            total -= tokens[index]
+
+        kept = [line for i, line in enumerate(lines) if i not in dropped]
+        kept.append(self._omitted_line(len(dropped), dropped_activities))
+        return kept
+
+    @staticmethod
+    def _omitted_line(spans, activities):
+        return f"（另有{spans}段零散活动，共{activities}条记录已省略）"
+
+    def compact(self, activities, model):
+        """
+        压缩活动记录
+        参数:
+            activities: 按时间排序的活动列表，也可以是已存储的活动时间段
+            model: 生成总结使用的模型，用于选择token预算
+        返回: (活动文本, 统计信息字典)
+        """
+        raw_text = "\n".join(
+            f"{a.get('timestamp') or a['start_time']}: {a['description']}" for a in activities
+        )
+        raw_tokens = estimate_tokens(raw_text)
+        if not self.enabled:
+            return raw_text, {'raw_tokens': raw_tokens, 'tokens': raw_tokens, 'ratio': 1.0}
+
+        spans = self.merge_spans(activities)
+        lines = self._fit_budget(spans, self.budget_for(model))
+        text = "\n".join(lines)
+        tokens = estimate_tokens(text)
+
+        stats = {
+            'activities': len(activities),
+            'spans': len(spans),
+            'lines': len(lines),
+            'raw_tokens': raw_tokens,
+            'tokens': tokens,
+            'ratio': round(raw_tokens / tokens, 2) if tokens else 1.0,
+        }
+        self.logger.info(
+            f"活动记录已压缩: {len(activities)}条 -> {len(lines)}行，"
+            f"约{raw_tokens} -> {tokens} tokens（压缩比 {stats['ratio']}x）"
+        )
+        return text, stats
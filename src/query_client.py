@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+本地查询客户端模块
+追踪器运行时通过本地查询服务读取数据，否则退回到只读数据库。
+只依赖标准库，保证命令行查询的启动速度
+"""
+
+import os
+import json
+import logging
+from urllib.parse import urlencode
+
+# 查询服务启动后写入数据目录，客户端据此找到端口
+INFO_FILE = 'tracker_api.json'
+
+
+def info_file_path(config):
+    return os.path.join(config['storage']['data_dir'], INFO_FILE)
+
+
+class QueryClient:
+    """与DatabaseManager的读取方法同名，调用方无需区分数据来源"""
+
+    def __init__(self, host, port, timeout=2):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        根据服务写入的信息文件创建客户端
+        返回: QueryClient；服务未运行或无响应时返回None
+        """
+        try:
+            with open(info_file_path(config), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        client = cls(info.get('host', '127.0.0.1'), info['port'],
+                     timeout=config.get('api', {}).get('client_timeout', 2))
+        try:
+            client._get('/ping')
+            return client
+        except Exception:
+            # 信息文件可能是上次异常退出时遗留的
+            return None
+
+    def _get(self, path, **params):
+        # http.client导入较慢，只在追踪器运行时才需要
+        import http.client
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request('GET', f"{path}?{query}" if query else path)
+            response = conn.getresponse()
+            body = json.loads(response.read().decode('utf-8'))
+            if response.status != 200:
+                raise RuntimeError(body.get('error', f'HTTP {response.status}'))
+            return body
+        finally:
+            conn.close()
+
+    def _query(self, default, path, **params):
+        try:
+            return self._get(path, **params)
+        except Exception as e:
+            self.logger.error(f"本地查询失败 {path}: {str(e)}")
+            return default
+
+    def get_activity_stats(self, days=7):
+        return self._query({}, '/stats', days=days)
+
+    def get_activities_by_date(self, target_date):
+        return self._query([], '/activities', **{'from': str(target_date)})
+
+    def get_activities_by_range(self, start_date, end_date):
+        return self._query([], '/activities', **{'from': str(start_date), 'to': str(end_date)})
+
+    def get_today_activities(self):
+        return self._query({}, '/today').get('activities', [])
+
+    def get_activity_count_by_date(self, target_date):
+        return self._query(0, '/count', date=str(target_date))
+
+    def get_spans_by_date(self, target_date):
+        return self._query([], '/spans', date=str(target_date))
+
+    def get_tracked_seconds_by_date(self, target_date):
+        return self._query(0, '/tracked', date=str(target_date))
+
+    def get_time_breakdown(self, start_date, end_date, period='total'):
+        return self._query([], '/breakdown', period=period, **{'from': str(start_date), 'to': str(end_date)})
+
+    def get_range_stats(self, start_date, end_date):
+        return self._query({}, '/analytics', **{'from': str(start_date), 'to': str(end_date)})
+
+    def get_daily_summary(self, target_date):
+        return self._query(None, '/summary', date=str(target_date))
+
+    def get_period_summary(self, period_type, period_start):
+        return self._query(None, '/rollup', type=period_type, date=str(period_start))
+
+    def search_activities(self, keyword, limit=50):
+        return self._query([], '/search', q=keyword, limit=limit)
+
+    def get_metrics(self):
+        return self._query({}, '/metrics')
+
+
+def open_query_backend(config):
+    """
+    打开读取数据的后端: 追踪器运行时使用本地查询服务，否则以只读方式打开数据库
+    返回: QueryClient或DatabaseManager；两者都不可用时返回None
+    """
+    client = QueryClient.from_config(config)
+    if client is not None:
+        return client
+    if not os.path.exists(config['storage']['database']):
+        return None
+    from database_manager import DatabaseManager
+    return DatabaseManager(config, read_only=True)
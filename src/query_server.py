@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+本地查询服务模块
+追踪器运行时在127.0.0.1上提供HTTP查询接口，命令行、GUI和状态栏脚本通过它读取数据，
+查询结果缓存在进程内，数据库没有新的写入时直接返回缓存，不访问磁盘
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from analytics import Analytics, parse_range
+from query_client import info_file_path
+from rollup import period_bounds
+
+
+def _parse_date(value, default=None):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class QueryCache:
+    """
+    按数据库写入版本失效的查询缓存，TTL用于与当前时间相关的查询（如今日、最近N天）；
+    条目数有上限，超出时淘汰最久未使用的条目
+    """
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, version, compute):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.items.get(key)
+            if cached and cached[0] == version and now - cached[1] < self.ttl:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        body = compute()
+        with self.lock:
+            self.items[key] = (version, now, body)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_entries:
+                self.items.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def get_size(self):
+        """缓存的响应体总字节数"""
+        with self.lock:
+            return sum(len(item[2]) for item in self.items.values())
+
+    def get_stats(self):
+        with self.lock:
+            return {'entries': len(self.items), 'hits': self.hits, 'misses': self.misses}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ActivityTrackerAPI/1.0'
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        status, body = self.server.query_server.handle(parsed.path, params)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不把每次请求都写到标准错误
+        self.server.query_server.logger.debug(format % args)
+
+
+class QueryServer:
+    def __init__(self, config, db_manager, metrics_provider=None, analytics=None):
+        """
+        参数:
+            config: 配置字典
+            db_manager: 追踪器使用的DatabaseManager，写入版本用于判断缓存是否有效
+            metrics_provider: 返回实时运行指标字典的函数
+            analytics: 追踪器的Analytics（可选），共用其按小时汇总和结果缓存
+        """
+        api_config = config.get('api', {})
+        self.config = config
+        self.enabled = api_config.get('enabled', True)
+        self.host = api_config.get('host', '127.0.0.1')
+        self.port = api_config.get('port', 8765)
+        self.search_limit = api_config.get('search_limit', 50)
+
+        self.db_manager = db_manager
+        self.metrics_provider = metrics_provider
+        self.analytics = analytics or Analytics(config, db_manager)
+        self.cache = QueryCache(api_config.get('cache_ttl', 60), api_config.get('cache_entries', 256))
+        self.httpd = None
+        self.thread = None
+
+        self.logger = logging.getLogger(__name__)
+
+        self.routes = {
+            '/ping': self._ping,
+            '/stats': self._stats,
+            '/today': self._today,
+            '/activities': self._activities,
+            '/summary': self._summary,
+            '/search': self._search,
+            '/rollup': self._rollup,
+            '/count': self._count,
+            '/spans': self._spans,
+            '/tracked': self._tracked,
+            '/breakdown': self._breakdown,
+            '/analytics': self._analytics,
+            '/metrics': self._metrics,
+        }
+        # 实时数据不缓存
+        self.uncached = {'/ping', '/metrics'}
+
+    def start(self):
+        """在后台线程启动服务，返回是否启动成功"""
+        if not self.enabled:
+            return False
+        try:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), _RequestHandler)
+            self.httpd.daemon_threads = True
+            self.httpd.query_server = self
+            self.port = self.httpd.server_address[1]
+            self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            self.thread.start()
+            self._write_info_file()
+            self.logger.info(f"本地查询服务已启动: http://{self.host}:{self.port}")
+            return True
+        except Exception as e:
+            self.logger.error(f"本地查询服务启动失败: {str(e)}")
+            self.httpd = None
+            return False
+
+    def stop(self):
+        if self.httpd is None:
+            return
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd = None
+        try:
+            os.remove(info_file_path(self.config))
+        except OSError:
+            pass
+        self.logger.info("本地查询服务已停止")
+
+    def _write_info_file(self):
+        path = info_file_path(self.config)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'host': self.host, 'port': self.port, 'pid': os.getpid()}, f)
+        os.replace(path + '.tmp', path)
+
+    def handle(self, path, params):
+        """
+        处理一次查询
+        返回: (HTTP状态码, JSON字节串)
+        """
+        route = self.routes.get(path)
+        if route is None:
+            return 404, self._encode({'error': f'未知接口: {path}'})
+        try:
+            if path in self.uncached:
+                return 200, self._encode(route(params))
+            key = (path, tuple(sorted(params.items())))
+            body = self.cache.get_or_compute(
+                key, self.db_manager.write_version, lambda: self._encode(route(params))
+            )
+            return 200, body
+        except ValueError as e:
+            return 400, self._encode({'error': str(e)})
+        except Exception as e:
+            self.logger.error(f"处理查询失败 {path}: {str(e)}")
+            return 500, self._encode({'error': str(e)})
+
+    @staticmethod
+    def _encode(value):
+        return json.dumps(value, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+    def _ping(self, params):
+        return {'ok': True, 'pid': os.getpid()}
+
+    def _stats(self, params):
+        return self.db_manager.get_activity_stats(int(params.get('days', 7)))
+
+    def _today(self, params):
+        today = date.today()
+        return {
+            'date': today,
+            'count': self.db_manager.get_activity_count_by_date(today),
+            'activities': self.db_manager.get_activities_by_date(today),
+            'summary': self.db_manager.get_daily_summary(today),
+        }
+
+    def _activities(self, params):
+        start_date = _parse_date(params.get('from'), date.today())
+        end_date = _parse_date(params.get('to'), start_date)
+        if start_date == end_date:
+            return self.db_manager.get_activities_by_date(start_date)
+        return self.db_manager.get_activities_by_range(start_date, end_date)
+
+    def _summary(self, params):
+        return self.db_manager.get_daily_summary(_parse_date(params.get('date'), date.today()))
+
+    def _count(self, params):
+        return self.db_manager.get_activity_count_by_date(_parse_date(params.get('date'), date.today()))
+
+    def _spans(self, params):
+        return self.db_manager.get_spans_by_date(_parse_date(params.get('date'), date.today()))
+
+    def _tracked(self, params):
+        return self.db_manager.get_tracked_seconds_by_date(_parse_date(params.get('date'), date.today()))
+
+    def _breakdown(self, params):
+        end_date = _parse_date(params.get('to'), date.today())
+        start_date = _parse_date(params.get('from'), end_date)
+        return self.db_manager.get_time_breakdown(start_date, end_date, params.get('period', 'total'))
+
+    def _analytics(self, params):
+        if params.get('range'):
+            start_date, end_date = parse_range(params['range'])
+        else:
+            end_date = _parse_date(params.get('to'), date.today())
+            start_date = _parse_date(params.get('from'), end_date - timedelta(days=6))
+        return self.analytics.get_range_stats(start_date, end_date)
+
+    def _search(self, params):
+        keyword = params.get('q', '').strip()
+        if not keyword:
+            raise ValueError('缺少搜索关键词 q')
+        return self.db_manager.search_activities(keyword, int(params.get('limit', self.search_limit)))
+
+    def _rollup(self, params):
+        period_type = params.get('type', 'week')
+        start, _ = period_bounds(period_type, _parse_date(params.get('date'), date.today()))
+        return self.db_manager.get_period_summary(period_type, start)
+
+    def _metrics(self, params):
+        metrics = self.metrics_provider() if self.metrics_provider else {}
+        metrics['query_cache'] = self.cache.get_stats()
+        return metrics
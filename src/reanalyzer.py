@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+截图重新分析模块
+修改提示词或更换模型后，批量重新分析已保存的截图并回写数据库
+"""
+
+import os
+import io
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import deque
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image
+
+SCREENSHOT_PATTERN = re.compile(r'^screenshot_(\d{8}_\d{6})\.jpg$')
+
+
+def _prepare_frame(path, max_width, quality):
+    """
+    在子进程中解码并预处理截图
+    返回: JPEG字节串（base64编码在发送请求时流式完成）
+    """
+    with Image.open(path) as img:
+        frame = img.convert('RGB')
+    if frame.width > max_width:
+        height = int(frame.height * max_width / frame.width)
+        frame = frame.resize((max_width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    frame.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class Reanalyzer:
+    def __init__(self, config, ollama_client, db_manager):
+        reanalyze_config = config.get('reanalyze', {})
+        self.screenshots_dir = config['storage']['screenshots_dir']
+        self.checkpoint_path = reanalyze_config.get(
+            'checkpoint', os.path.join(config['storage']['data_dir'], 'reanalyze_checkpoint.json')
+        )
+        self.workers = reanalyze_config.get('workers', max(1, (os.cpu_count() or 2) - 1))
+        self.concurrency = reanalyze_config.get('concurrency', 2)
+        self.batch_size = reanalyze_config.get('batch_size', 20)
+        self.max_width = reanalyze_config.get('max_width', 1920)
+        self.quality = reanalyze_config.get('quality', 85)
+
+        self.ollama_client = ollama_client
+        self.db_manager = db_manager
+        self.logger = logging.getLogger(__name__)
+
+    def find_screenshots(self, from_date=None, to_date=None):
+        """
+        按时间顺序列出日期范围内的截图
+        返回: [(截图时间, 文件路径)]
+        """
+        frames = []
+        for name in os.listdir(self.screenshots_dir):
+            match = SCREENSHOT_PATTERN.match(name)
+            if not match:
+                continue
+            captured_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+            if from_date and captured_at.date() < from_date:
+                continue
+            if to_date and captured_at.date() > to_date:
+                continue
+            frames.append((captured_at, os.path.join(self.screenshots_dir, name)))
+        frames.sort()
+        return frames
+
+    def _run_key(self, from_date, to_date):
+        """同一日期范围、模型和提示词的任务才能从检查点续跑"""
+        prompt_hash = hashlib.sha1(self.ollama_client.system_prompt.encode('utf-8')).hexdigest()[:12]
+        return f"{from_date}|{to_date}|{self.ollama_client.model}|{prompt_hash}"
+
+    def _load_checkpoint(self, run_key):
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('run_key') == run_key:
+                return set(checkpoint.get('done', []))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"读取检查点失败，将从头开始: {str(e)}")
+        return set()
+
+    def _save_checkpoint(self, run_key, done):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'run_key': run_key, 'done': sorted(done)}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def run(self, from_date=None, to_date=None, restart=False):
+        """
+        重新分析日期范围内的截图
+        返回: 成功回写的截图数量
+        """
+        frames = self.find_screenshots(from_date, to_date)
+        run_key = self._run_key(from_date, to_date)
+        done = set() if restart else self._load_checkpoint(run_key)
+        todo = [(captured_at, path) for captured_at, path in frames if os.path.basename(path) not in done]
+
+        total = len(todo)
+        print(f"🔁 待重新分析截图: {total} 张 (已完成 {len(frames) - total} 张)")
+        if not total:
+            return 0
+
+        start = time.time()
+        processed = 0
+        failed = 0
+        pending_rows = []
+
+        with ProcessPoolExecutor(max_workers=self.workers) as decoders, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as inference:
+            # 进程池只预取有限数量的解码任务，推理任务最多保持concurrency个在途
+            remaining = iter(todo)
+            decode_queue = deque()
+            prefetch = self.workers * 2 + self.concurrency
+            in_flight = {}
+
+            def submit_next():
+                while len(decode_queue) < prefetch:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    captured_at, path = item
+                    decode_queue.append(
+                        (captured_at, path, decoders.submit(_prepare_frame, path, self.max_width, self.quality))
+                    )
+                if not decode_queue:
+                    return False
+                captured_at, path, decode_future = decode_queue.popleft()
+                future = inference.submit(self._analyze_frame, decode_future)
+                in_flight[future] = (captured_at, path)
+                return True
+
+            for _ in range(self.concurrency):
+                if not submit_next():
+                    break
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    captured_at, path = in_flight.pop(future)
+                    analysis = future.result()
+                    processed += 1
+                    if analysis:
+                        pending_rows.append((captured_at, analysis, path))
+                    else:
+                        failed += 1
+                    submit_next()
+
+                if len(pending_rows) >= self.batch_size or not in_flight:
+                    self._flush(pending_rows, run_key, done)
+                    pending_rows = []
+                    self._report(processed, total, failed, start)
+
+        print(f"\n✅ 重新分析完成: 成功 {processed - failed} 张，失败 {failed} 张，用时 {time.time() - start:.0f}s")
+        return processed - failed
+
+    def _analyze_frame(self, decode_future):
+        try:
+            return self.ollama_client.analyze_encoded(decode_future.result())
+        except Exception as e:
+            self.logger.error(f"重新分析截图失败: {str(e)}")
+            return None
+
+    def _flush(self, rows, run_key, done):
+        """批量回写数据库并更新检查点"""
+        if rows and not self.db_manager.apply_reanalysis(rows):
+            return
+        done.update(os.path.basename(path) for _, _, path in rows)
+        self._save_checkpoint(run_key, done)
+
+    @staticmethod
+    def _report(processed, total, failed, start):
+        elapsed = max(time.time() - start, 1e-6)
+        rate = processed / elapsed
+        eta = (total - processed) / rate if rate else 0
+        print(
+            f"\r进度: {processed}/{total} ({processed * 100 // total}%) | "
+            f"失败 {failed} | {rate:.2f} 张/秒 | 预计剩余 {int(eta // 60)}分{int(eta % 60)}秒",
+            end='', flush=True
+        )
+
+
+def parse_date(value):
+    """解析命令行中的 YYYY-MM-DD 日期"""
+    return date.fromisoformat(value) if value else None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+周/月汇总模块
+先把每个每日总结压缩成简短摘要（每天一次小规模推理，结果缓存），
+再用当期的每日摘要生成周/月汇总；只有组成周期的某天总结变化时才重新生成
+"""
+
+import hashlib
+import logging
+import calendar
+from datetime import date, timedelta
+
+PERIOD_TYPES = ('week', 'month')
+PERIOD_NAMES = {'week': '周', 'month': '月'}
+
+DEFAULT_DIGEST_PROMPT = """请把下面这一天的活动总结压缩为3到5条要点，每条不超过30个字，只保留主要工作、学习内容和时间分配："""
+
+DEFAULT_ROLLUP_PROMPT = """请根据以下每天的要点，生成一份简洁的中文{period}度总结报告。
+总结应该包括：
+1. 本{period}的主要工作内容和进展
+2. 时间分配的整体情况和变化趋势
+3. 学习或娱乐活动
+4. 对下一{period}的建议"""
+
+
+def period_bounds(period_type, anchor_date):
+    """
+    计算包含指定日期的周期范围
+    返回: (起始日期, 结束日期)，周从周一开始
+    """
+    if period_type == 'week':
+        start = anchor_date - timedelta(days=anchor_date.weekday())
+        return start, start + timedelta(days=6)
+    if period_type == 'month':
+        last_day = calendar.monthrange(anchor_date.year, anchor_date.month)[1]
+        return anchor_date.replace(day=1), anchor_date.replace(day=last_day)
+    raise ValueError(f"未知的周期类型: {period_type}")
+
+
+def content_hash(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class RollupBuilder:
+    def __init__(self, config, ollama_client, db_manager):
+        rollup_config = config.get('rollup', {})
+        self.ollama_client = ollama_client
+        self.db_manager = db_manager
+        self.digest_prompt = rollup_config.get('digest_prompt', DEFAULT_DIGEST_PROMPT)
+        self.rollup_prompt = rollup_config.get('rollup_prompt', DEFAULT_ROLLUP_PROMPT)
+
+        self.logger = logging.getLogger(__name__)
+
+    def _day_digest(self, day):
+        """
+        返回某天的摘要，总结未变化时复用缓存
+        参数: day - get_daily_summaries_in_range返回的一项
+        """
+        source_hash = content_hash(day['summary'])
+        cached = self.db_manager.get_day_digest(day['date'])
+        if cached and cached['source_hash'] == source_hash:
+            return cached['digest']
+
+        digest = self.ollama_client.generate_text(f"{self.digest_prompt}\n\n{day['summary']}")
+        if not digest:
+            return None
+        self.db_manager.save_day_digest(day['date'], digest.strip(), source_hash)
+        return digest.strip()
+
+    def build(self, period_type, anchor_date=None, force=False):
+        """
+        生成包含指定日期的周/月汇总
+        参数:
+            period_type: 'week' 或 'month'
+            anchor_date: 周期内的任意一天，默认今天
+            force: 即使每日总结没有变化也重新生成
+        返回: 汇总信息字典；没有每日总结或生成失败时返回None
+        """
+        start, end = period_bounds(period_type, anchor_date or date.today())
+        days = self.db_manager.get_daily_summaries_in_range(start, end)
+        if not days:
+            self.logger.info(f"{start} ~ {end} 没有每日总结，跳过{PERIOD_NAMES[period_type]}汇总")
+            return None
+
+        source_hash = content_hash(*(f"{day['date']}:{content_hash(day['summary'])}" for day in days))
+        existing = self.db_manager.get_period_summary(period_type, start)
+        if existing and existing['source_hash'] == source_hash and not force:
+            self.logger.info(f"{PERIOD_NAMES[period_type]}汇总 {start} 已是最新")
+            return existing
+        if existing and len(days) < existing['day_count']:
+            # 部分每日总结已被清理，重新生成只会得到不完整的汇总
+            self.logger.info(f"{PERIOD_NAMES[period_type]}汇总 {start} 的部分每日总结已被清理，保留原有汇总")
+            return existing
+
+        lines = []
+        for day in days:
+            digest = self._day_digest(day)
+            if digest is None:
+                self.logger.error(f"生成 {day['date']} 的每日摘要失败，{PERIOD_NAMES[period_type]}汇总中止")
+                return None
+            lines.append(f"【{day['date']}】\n{digest}")
+
+        prompt = self.rollup_prompt.format(period=PERIOD_NAMES[period_type])
+        summary = self.ollama_client.generate_text(f"{prompt}\n\n" + "\n\n".join(lines))
+        if not summary:
+            self.logger.error(f"{PERIOD_NAMES[period_type]}汇总生成失败")
+            return None
+
+        self.db_manager.save_period_summary(period_type, start, end, summary, len(days), source_hash)
+        return self.db_manager.get_period_summary(period_type, start)
+
+    def build_completed_periods(self, today=None):
+        """
+        在周期的最后一天生成该周期的汇总，供每日总结之后调用
+        返回: 生成的汇总列表
+        """
+        today = today or date.today()
+        results = []
+        for period_type in PERIOD_TYPES:
+            if period_bounds(period_type, today)[1] == today:
+                result = self.build(period_type, today)
+                if result:
+                    results.append(result)
+        return results
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+定时任务调度模块
+基于单调时钟和最小堆的调度器: 主线程一直睡到下一个任务到期，不再每秒轮询；
+固定频率任务按理想时刻排程，不会因任务耗时而漂移；每天定点任务按本地时间计算，
+能正确处理夏令时切换和系统休眠；错过的执行按补跑策略处理，任务在各自的执行器中运行
+"""
+
+import sys
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# 补跑策略: 跳过错过的执行 / 立即补跑一次 / 逐次补跑全部错过的执行
+CATCH_UP_POLICIES = ('skip', 'once', 'all')
+
+
+def suspend_clock():
+    """
+    休眠期间继续走、且不受系统时间调整影响的时钟，与time.monotonic()之差即为休眠时长
+    Linux为CLOCK_BOOTTIME；macOS的CLOCK_MONOTONIC包含休眠时间（time.monotonic()不包含）；
+    都没有时退回UTC时间戳，此时向前校时也会被当作休眠
+    """
+    if hasattr(time, 'CLOCK_BOOTTIME'):
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    if sys.platform == 'darwin':
+        return time.clock_gettime(time.CLOCK_MONOTONIC)
+    return time.time()
+
+
+class Job:
+    def __init__(self, name, func, executor, interval=None, at=None, catch_up='once', run_immediately=False):
+        """
+        参数:
+            name: 任务名
+            func: 任务函数
+            executor: 执行器名，同一执行器中的任务串行执行
+            interval: 固定执行间隔（秒）
+            at: 每天的执行时间 "HH:MM"（与interval二选一）
+            catch_up: 补跑策略，见CATCH_UP_POLICIES
+            run_immediately: 是否在调度器启动时立即执行一次
+        """
+        if (interval is None) == (at is None):
+            raise ValueError("interval 和 at 必须且只能指定一个")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"未知的补跑策略: {catch_up}")
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.interval = interval
+        self.at = datetime.strptime(at, "%H:%M").time() if at else None
+        self.catch_up = catch_up
+        self.run_immediately = run_immediately
+
+        self.deadline = None      # 下次执行的单调时钟时刻
+        self.wall_deadline = None  # 定点任务下次执行的本地时间
+        self.running = False
+
+        self.runs = 0
+        self.missed = 0
+        self.overruns = 0
+        self.failures = 0
+        self.last_lag = None
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_duration = None
+        self.last_start = None
+        self.last_drift = None
+        self.max_drift = 0.0
+
+    def next_wall_deadline(self, now_wall):
+        """定点任务: 当前时间之后最近的执行时刻"""
+        candidate = datetime.combine(now_wall.date(), self.at)
+        if candidate <= now_wall:
+            candidate = datetime.combine(now_wall.date() + timedelta(days=1), self.at)
+        return candidate
+
+    def get_metrics(self):
+        return {
+            'runs': self.runs,
+            'missed': self.missed,
+            'overruns': self.overruns,
+            'failures': self.failures,
+            'last_lag': round(self.last_lag, 3) if self.last_lag is not None else None,
+            'max_lag': round(self.max_lag, 3),
+            'avg_lag': round(self.total_lag / self.runs, 3) if self.runs else None,
+            'last_drift': round(self.last_drift, 3) if self.last_drift is not None else None,
+            'max_drift': round(self.max_drift, 3),
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'next_run_in': round(self.deadline - time.monotonic(), 1) if self.deadline is not None else None,
+        }
+
+
+class Scheduler:
+    def __init__(self, config):
+        scheduler_config = config.get('scheduler', {})
+        # 单次最长睡眠时间，用于及时发现系统时间变化和休眠
+        self.max_sleep = scheduler_config.get('max_sleep', 60)
+        # 休眠时长或系统时间调整幅度超过该值（秒）时重新计算任务时间
+        self.suspend_threshold = scheduler_config.get('suspend_threshold', 30)
+        # all 策略下单次最多补跑的次数
+        self.max_catch_up_runs = scheduler_config.get('max_catch_up_runs', 10)
+        # 定点任务晚于该时长（秒）才算错过，例如在执行时刻处于休眠
+        self.late_grace = scheduler_config.get('late_grace', 300)
+
+        self.jobs = {}
+        self.heap = []
+        self.counter = 0
+        self.executors = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        self.logger = logging.getLogger(__name__)
+
+    def add_job(self, job):
+        """添加任务；调度器运行中添加也会立即生效"""
+        with self.lock:
+            if job.executor not in self.executors:
+                self.executors[job.executor] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"sched-{job.executor}"
+                )
+            self.jobs[job.name] = job
+            self._schedule_first(job)
+        self.wakeup.set()
+        return job
+
+    def reschedule(self, name, interval=None, at=None):
+        """
+        修改任务的执行间隔或每天的执行时间，正在执行的任务不受影响
+        返回: 是否找到该任务
+        """
+        with self.lock:
+            job = self.jobs.get(name)
+            if job is None:
+                return False
+            now = time.monotonic()
+            if interval is not None:
+                # 从上次的理想时刻起按新间隔计算，避免刚执行过又立即执行
+                last_deadline = job.deadline - job.interval
+                job.interval = interval
+                job.deadline = max(now, last_deadline + interval)
+            if at is not None:
+                job.at = datetime.strptime(at, "%H:%M").time()
+                job.wall_deadline = job.next_wall_deadline(datetime.now())
+                job.deadline = self._to_monotonic(job.wall_deadline, now)
+            # 堆中的旧条目因时刻不一致会在弹出时被丢弃
+            self._push(job)
+        self.wakeup.set()
+        return True
+
+    def remove_job(self, name):
+        with self.lock:
+            job = self.jobs.pop(name, None)
+            if job is not None:
+                # 堆中的旧条目在弹出时按对象比对丢弃
+                job.deadline = None
+        self.wakeup.set()
+
+    def next_run(self, name):
+        """
+        任务下一次执行的单调时钟时刻（任务执行期间即为下一次执行的理想时刻）
+        返回: time.monotonic()时刻，任务不存在时返回None
+        """
+        with self.lock:
+            job = self.jobs.get(name)
+            return job.deadline if job is not None else None
+
+    def _push(self, job):
+        self.counter += 1
+        heapq.heappush(self.heap, (job.deadline, self.counter, job))
+
+    def _schedule_first(self, job):
+        now = time.monotonic()
+        if job.interval is not None:
+            job.deadline = now if job.run_immediately else now + job.interval
+        else:
+            job.wall_deadline = job.next_wall_deadline(datetime.now())
+            job.deadline = now if job.run_immediately else self._to_monotonic(job.wall_deadline, now)
+        self._push(job)
+
+    @staticmethod
+    def _to_monotonic(wall_deadline, now):
+        return now + max(0.0, (wall_deadline - datetime.now()).total_seconds())
+
+    def _reschedule(self, job, now):
+        """
+        计算下一次执行时刻，返回本次需要执行的次数（按补跑策略）
+        """
+        if job.interval is not None:
+            # 固定频率: 下一个理想时刻 = 本次理想时刻 + 间隔，不受任务耗时影响
+            # 本次到期的执行之外又错过的次数
+            missed = int((now - job.deadline) // job.interval)
+            job.deadline += (missed + 1) * job.interval
+            due_runs = missed + 1
+        else:
+            now_wall = datetime.now()
+            lateness = (now_wall - job.wall_deadline).total_seconds()
+            # 定点任务明显晚于执行时刻（例如整晚休眠）时，本次和之后错过的每一天都算错过
+            missed = int(lateness // 86400) + 1 if lateness > self.late_grace else 0
+            job.wall_deadline = job.next_wall_deadline(now_wall)
+            job.deadline = self._to_monotonic(job.wall_deadline, now)
+            due_runs = max(missed, 1)
+
+        if not missed:
+            return 1
+        job.missed += missed
+        self.logger.warning(f"任务 {job.name} 错过了 {missed} 次执行，补跑策略: {job.catch_up}")
+        if job.catch_up == 'skip':
+            # 固定频率任务仍按时执行本次
+            return 1 if job.interval is not None else 0
+        if job.catch_up == 'once':
+            return 1
+        return min(due_runs, self.max_catch_up_runs)
+
+    def _adjust_for_time_jump(self, last_mono, last_wall, last_suspend):
+        """
+        系统休眠或本地时间变化（校时、夏令时切换）时重新计算定点任务的时刻；
+        只有真正休眠时，固定频率任务的理想时刻才按休眠时长前移，交给补跑策略处理
+        """
+        mono_elapsed = time.monotonic() - last_mono
+        suspended = (suspend_clock() - last_suspend) - mono_elapsed
+        wall_shift = (datetime.now() - last_wall).total_seconds() - mono_elapsed - max(suspended, 0.0)
+        is_suspend = suspended >= self.suspend_threshold
+        if not is_suspend and abs(wall_shift) < self.suspend_threshold:
+            return
+        if is_suspend:
+            self.logger.info(f"检测到系统休眠约 {int(suspended)} 秒，重新计算任务时间")
+        else:
+            self.logger.info(f"检测到本地时间变化约 {int(wall_shift)} 秒，重新计算定点任务时间")
+
+        now = time.monotonic()
+        with self.lock:
+            for job in self.jobs.values():
+                if job.interval is not None:
+                    if is_suspend:
+                        job.deadline -= suspended
+                elif not job.running:
+                    # 休眠期间已过的定点时刻立即到期，由补跑策略决定是否执行
+                    job.deadline = self._to_monotonic(job.wall_deadline, now)
+            self.heap = []
+            for job in self.jobs.values():
+                self._push(job)
+
+    def _dispatch(self, job, deadline, runs):
+        if job.running:
+            # 上一次执行还没结束，不堆积
+            job.overruns += 1
+            self.logger.warning(f"任务 {job.name} 上次执行尚未结束，跳过本次")
+            return
+        job.running = True
+        self.executors[job.executor].submit(self._run_job, job, deadline, runs)
+
+    def _run_job(self, job, deadline, runs):
+        try:
+            for _ in range(runs):
+                start = time.monotonic()
+                # 延迟: 实际开始时刻晚于理想时刻多少
+                lag = start - deadline
+                job.last_lag = lag
+                job.max_lag = max(job.max_lag, lag)
+                job.total_lag += lag
+                # 漂移: 相邻两次执行的实际间隔与设定间隔之差
+                if job.interval is not None and job.last_start is not None:
+                    job.last_drift = (start - job.last_start) - job.interval
+                    job.max_drift = max(job.max_drift, abs(job.last_drift))
+                job.last_start = start
+                job.runs += 1
+                try:
+                    job.func()
+                except Exception as e:
+                    job.failures += 1
+                    self.logger.error(f"任务 {job.name} 执行出错: {str(e)}")
+                job.last_duration = time.monotonic() - start
+        finally:
+            job.running = False
+
+    def run(self, stop_event):
+        """在当前线程运行调度循环，直到stop_event被设置（设置后调用stop()立即唤醒）"""
+        last_mono, last_wall, last_suspend = time.monotonic(), datetime.now(), suspend_clock()
+        while not stop_event.is_set():
+            # 先清除唤醒标记，之后新增的任务会让下面的等待立即返回
+            self.wakeup.clear()
+            self._adjust_for_time_jump(last_mono, last_wall, last_suspend)
+            last_mono, last_wall, last_suspend = time.monotonic(), datetime.now(), suspend_clock()
+
+            due = []
+            with self.lock:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, _, job = heapq.heappop(self.heap)
+                    # 任务已移除或已重新排程时丢弃旧条目
+                    if self.jobs.get(job.name) is not job or job.deadline != deadline:
+                        continue
+                    runs = self._reschedule(job, now)
+                    self._push(job)
+                    if runs:
+                        due.append((job, deadline, runs))
+                timeout = self.heap[0][0] - now if self.heap else self.max_sleep
+
+            for job, deadline, runs in due:
+                self._dispatch(job, deadline, runs)
+
+            # 睡到下一个任务到期；停止或新增任务时提前醒来
+            self.wakeup.wait(min(max(timeout, 0.0), self.max_sleep))
+
+    def stop(self):
+        """唤醒调度循环，使其检查停止标记"""
+        self.wakeup.set()
+
+    def shutdown(self, wait=False):
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+
+    def get_metrics(self):
+        with self.lock:
+            return {name: job.get_metrics() for name, job in self.jobs.items()}
+
+    def log_metrics(self):
+        for name, metrics in self.get_metrics().items():
+            self.logger.info(
+                f"任务 {name}: 执行{metrics['runs']}次，错过{metrics['missed']}次，"
+                f"平均延迟{metrics['avg_lag']}s，最大延迟{metrics['max_lag']}s"
+            )
@@ -6,33 +6,61 @@
 
 import os
 import subprocess
+import tempfile
 import time
 from datetime import datetime
 from PIL import Image
 import logging
 
+from image_encoder import ImageEncoder
+
 class ScreenshotCapture:
-    def __init__(self, config):
+    def __init__(self, config, encoder=None):
         self.config = config
         self.screenshots_dir = config['storage']['screenshots_dir']
         self.save_screenshots = config['screenshot']['save_screenshots']
         self.quality = config['screenshot']['screenshot_quality']
         
+        # JPEG编码交给编码服务在子进程中完成
+        self.encoder = encoder or ImageEncoder(config)
+        
         # 确保截图目录存在
         os.makedirs(self.screenshots_dir, exist_ok=True)
         
-        # 设置日志
-        logging.basicConfig(level=logging.INFO)
+        # 设置日志（由logging_setup统一配置输出）
         self.logger = logging.getLogger(__name__)
     
+    @staticmethod
+    def _temp_path(prefix):
+        """创建唯一的临时文件路径，并发截图时不会互相覆盖"""
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix='.png')
+        os.close(fd)
+        return path
+    
+    @staticmethod
+    def _remove_temp(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+    
+    def apply_config(self, config):
+        """热加载配置: 更新截图目录、是否保存和截图质量"""
+        screenshots_dir = config['storage']['screenshots_dir']
+        os.makedirs(screenshots_dir, exist_ok=True)
+        self.screenshots_dir = screenshots_dir
+        self.save_screenshots = config['screenshot']['save_screenshots']
+        self.quality = config['screenshot']['screenshot_quality']
+        self.config = config
+    
     def capture_screenshot(self):
         """
         捕获屏幕截图
         返回: (screenshot_path, success)
         """
+        temp_path = None
+        keep_temp = False
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            temp_path = f"/tmp/screenshot_{timestamp}.png"
+            temp_path = self._temp_path('screenshot_')
             
             # 使用macOS的screencapture命令
             result = subprocess.run([
@@ -50,35 +78,66 @@ class ScreenshotCapture:
             if self.save_screenshots:
                 final_path = os.path.join(self.screenshots_dir, f"screenshot_{timestamp}.jpg")
                 
-                # 使用PIL转换为JPEG并压缩
+                # 转换为JPEG并压缩（在编码进程中完成）
                 with Image.open(temp_path) as img:
-                    # 转换为RGB模式（去除alpha通道）
-                    if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = background
-                    
-                    img.save(final_path, 'JPEG', quality=self.quality, optimize=True)
+                    img.load()
+                    jpeg_bytes = self.encoder.encode_jpeg(img, quality=self.quality, optimize=True)
                 
-                # 删除临时文件
-                os.remove(temp_path)
+                if jpeg_bytes is None:
+                    return None, False
+                
+                with open(final_path, 'wb') as f:
+                    f.write(jpeg_bytes)
                 self.logger.info(f"截图已保存: {final_path}")
                 return final_path, True
             else:
+                # 调用方负责删除返回的临时文件
+                keep_temp = True
                 self.logger.info("截图捕获成功（未保存到磁盘）")
                 return temp_path, True
                 
         except Exception as e:
             self.logger.error(f"截图过程出错: {str(e)}")
             return None, False
+        finally:
+            # 删除临时文件
+            if not keep_temp:
+                self._remove_temp(temp_path)
+    
+    def probe(self, timeout=3):
+        """
+        快速探测截图权限: 只截取1x1像素区域，不等待延迟
+        返回: 是否可以截图
+        """
+        temp_path = None
+        try:
+            temp_path = self._temp_path('screenshot_probe_')
+            result = subprocess.run([
+                'screencapture',
+                '-x',
+                '-R', '0,0,1,1',  # 只截取1x1像素
+                temp_path
+            ], capture_output=True, text=True, timeout=timeout)
+            
+            ok = result.returncode == 0 and os.path.exists(temp_path)
+            if not ok:
+                self.logger.error(f"截图探测失败: {result.stderr}")
+            return ok
+            
+        except Exception as e:
+            self.logger.error(f"截图探测出错: {str(e)}")
+            return False
+        finally:
+            self._remove_temp(temp_path)
     
     def get_screenshot_for_analysis(self):
         """
         获取用于AI分析的截图
-        返回: PIL Image对象
+        返回: PIL Image对象，调用方用完后应调用close()释放像素内存
         """
+        temp_path = None
         try:
-            temp_path = "/tmp/temp_screenshot_for_analysis.png"
+            temp_path = self._temp_path('screenshot_analysis_')
             
             result = subprocess.run([
                 'screencapture', 
@@ -91,20 +150,40 @@ class ScreenshotCapture:
                 self.logger.error(f"分析截图失败: {result.stderr}")
                 return None
             
-            # 打开图片
+            # 打开图片并读入内存（RGBA转RGB留给编码服务处理）
             img = Image.open(temp_path)
+            img.load()
             
-            # 转换为RGB模式
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
+            return img
             
+        except Exception as e:
+            self.logger.error(f"获取分析截图出错: {str(e)}")
+            return None
+        finally:
             # 删除临时文件
-            os.remove(temp_path)
+            self._remove_temp(temp_path)
+    
+    def save_image(self, image, captured_at=None):
+        """
+        把已捕获的截图保存到截图目录，避免为保存再截一次屏
+        参数:
+            image: PIL Image对象
+            captured_at: 截图时间（默认当前时间）
+        返回: 保存路径，失败返回None
+        """
+        try:
+            timestamp = (captured_at or datetime.now()).strftime("%Y%m%d_%H%M%S")
+            final_path = os.path.join(self.screenshots_dir, f"screenshot_{timestamp}.jpg")
             
-            return img
+            jpeg_bytes = self.encoder.encode_jpeg(image, quality=self.quality, optimize=True)
+            if jpeg_bytes is None:
+                return None
+            
+            with open(final_path, 'wb') as f:
+                f.write(jpeg_bytes)
+            self.logger.info(f"截图已保存: {final_path}")
+            return final_path
             
         except Exception as e:
-            self.logger.error(f"获取分析截图出错: {str(e)}")
+            self.logger.error(f"保存截图出错: {str(e)}")
             return None
\ No newline at end of file
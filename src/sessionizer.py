@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+活动会话模块
+把连续的采样合并为活动时间段: 画面或描述与当前时间段相似时延长它，变化时结束它并开始新的时间段。
+被判定为重复而没有写入activities表的采样也会计入时间段，时长统计不再丢失
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from model_router import hamming_distance
+from prompt_compactor import text_shingles, similarity
+
+
+def _parse_time(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+class Sessionizer:
+    def __init__(self, config, db_manager, resume=True, client_id=None):
+        """
+        参数:
+            config: 配置字典
+            db_manager: 数据库管理器
+            resume: 是否从数据库中最近的时间段续接（重启后仍在做同一件事时不拆分时间段）
+            client_id: 来源客户端（多客户端采集时每个客户端一个Sessionizer）
+        """
+        self.db_manager = db_manager
+        self.client_id = client_id
+        self.apply_config(config)
+
+        self.current = None
+        self.logger = logging.getLogger(__name__)
+
+        if resume:
+            self._resume()
+
+    def apply_config(self, config):
+        """更新采样间隔和合并阈值，当前时间段继续有效"""
+        session_config = config.get('sessions', {})
+        interval_minutes = config['screenshot']['interval_minutes']
+        self.interval = timedelta(minutes=interval_minutes)
+        # 超过这个间隔没有采样时结束当前时间段
+        self.max_gap = timedelta(minutes=session_config.get('max_gap_minutes', interval_minutes * 2))
+        self.similarity_threshold = session_config.get('similarity_threshold', 0.5)
+        self.frame_distance = session_config.get('frame_distance', 6)
+
+    def _resume(self):
+        last = self.db_manager.get_last_span(self.client_id)
+        if last is None:
+            return
+        self.current = {
+            'id': last['id'],
+            'start': _parse_time(last['start_time']),
+            'end': _parse_time(last['end_time']),
+            'count': last['sample_count'],
+            'shingles': text_shingles(last['description']),
+            'frame_hash': None,
+            'has_screenshot': bool(last['screenshot_path']),
+        }
+
+    def _matches(self, shingles, frame_hash, captured_at):
+        current = self.current
+        if current is None:
+            return False
+        if captured_at < current['start'] or captured_at - current['end'] > self.max_gap:
+            return False
+        if captured_at.date() != current['start'].date():
+            return False
+        # 画面几乎没变时不看描述，模型对同一画面的描述措辞可能不同
+        if (frame_hash is not None and current['frame_hash'] is not None
+                and hamming_distance(frame_hash, current['frame_hash']) <= self.frame_distance):
+            return True
+        return similarity(shingles, current['shingles']) >= self.similarity_threshold
+
+    def observe(self, description, captured_at, screenshot_path=None, frame_hash=None):
+        """
+        记录一次采样
+        参数:
+            description: 本次分析结果
+            captured_at: 截图时间
+            screenshot_path: 截图路径（可选）
+            frame_hash: 画面哈希（可选），画面相同时直接并入当前时间段
+        返回: 采样所属时间段的ID，写入失败时返回None
+        """
+        shingles = text_shingles(description)
+        # 每个采样代表从截图时刻起的一个采样间隔
+        end_time = captured_at + self.interval
+
+        if self._matches(shingles, frame_hash, captured_at):
+            current = self.current
+            current['end'] = max(current['end'], end_time)
+            current['count'] += 1
+            if frame_hash is not None:
+                current['frame_hash'] = frame_hash
+            if self.db_manager.extend_span(current['id'], current['start'], current['end'],
+                                           current['count'], None if current['has_screenshot'] else screenshot_path):
+                current['has_screenshot'] = current['has_screenshot'] or bool(screenshot_path)
+                return current['id']
+            return None
+
+        span_id = self.db_manager.open_span(description, captured_at, end_time, screenshot_path, self.client_id)
+        if span_id is None:
+            self.current = None
+            return None
+        self.current = {
+            'id': span_id,
+            'start': captured_at,
+            'end': end_time,
+            'count': 1,
+            'shingles': shingles,
+            'frame_hash': frame_hash,
+            'has_screenshot': bool(screenshot_path),
+        }
+        self.logger.debug(f"新活动时间段: {description[:50]}")
+        return span_id
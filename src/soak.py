@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+内存浸泡测试模块
+用合成截图和本地模拟的Ollama服务连续执行数千次完整的截图分析流程（编码、请求、去重、写库、时间段合并），
+检查进程常驻内存在预热之后保持平稳，用于发现长时间运行时的内存泄漏
+"""
+
+import gc
+import copy
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from memory_watchdog import current_rss, MB
+
+# 模拟的分析结果，循环使用以覆盖去重和时间段合并的不同分支
+SYNTHETIC_ACTIVITIES = [
+    "用户正在使用VS Code编辑Python代码",
+    "用户正在浏览器中查看项目文档",
+    "用户正在终端中运行测试",
+    "用户正在使用Slack与同事沟通",
+    "用户正在观看技术分享视频",
+]
+
+
+class SyntheticFrames:
+    """生成内容逐帧变化的合成截图，模拟真实截图的尺寸和带透明通道的格式"""
+
+    def __init__(self, size=(1440, 900), repeat=1):
+        """
+        参数:
+            size: 截图尺寸
+            repeat: 每个画面连续出现的次数，大于1时模拟画面不变的重复帧
+        """
+        self.size = size
+        self.repeat = max(1, repeat)
+        self.calls = 0
+        self.count = 0
+
+    def next_frame(self):
+        from PIL import Image, ImageDraw
+
+        self.count = self.calls // self.repeat + 1
+        self.calls += 1
+        shade = (self.count * 37) % 256
+        image = Image.new('RGBA', self.size, (shade, 255 - shade, 128, 255))
+        draw = ImageDraw.Draw(image)
+        width, height = self.size
+        for row in range(0, height, 60):
+            offset = (self.count * 13 + row) % width
+            draw.rectangle([offset, row, min(width, offset + 300), row + 40], fill=(255, shade, 0, 255))
+            draw.text((10, row + 10), f"tick {self.count} row {row}", fill=(0, 0, 0, 255))
+        return image
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/api/tags'):
+            self._send({'models': [{'name': self.server.model}]})
+        else:
+            self._send({}, 404)
+
+    def do_POST(self):
+        # 完整读取请求体，验证流式发送的JSON
+        length = int(self.headers.get('Content-Length', 0))
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 65536))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        self.server.requests += 1
+        self.server.bytes_received += length
+        activity = SYNTHETIC_ACTIVITIES[(self.server.requests // 3) % len(SYNTHETIC_ACTIVITIES)]
+        self._send({'model': self.server.model, 'response': activity, 'done': True, 'load_duration': 0})
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubOllamaServer:
+    """在127.0.0.1上模拟Ollama的 /api/tags 和 /api/generate 接口"""
+
+    def __init__(self, model):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.model = model
+        self.httpd.requests = 0
+        self.httpd.bytes_received = 0
+        self.thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def bytes_received(self):
+        return self.httpd.bytes_received
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def soak_config(config, work_dir, base_url):
+    """把配置中的存储、日志和Ollama地址指向测试目录与模拟服务"""
+    config = copy.deepcopy(config)
+    config['ollama']['base_url'] = base_url
+    config['storage'].update({
+        'data_dir': work_dir,
+        'database': f"{work_dir}/activities.db",
+        'screenshots_dir': f"{work_dir}/screenshots",
+    })
+    config['screenshot']['save_screenshots'] = True
+    config.setdefault('spool', {})['dir'] = f"{work_dir}/spool"
+    config.setdefault('logging', {}).update({'file': f"{work_dir}/soak.log", 'console': False})
+    config.setdefault('api', {})['enabled'] = False
+    config.setdefault('reload', {})['enabled'] = False
+    return config
+
+
+class SoakRunner:
+    def __init__(self, tick, ticks=2000, warmup=200, samples=20, tolerance_mb=16, watchdog=None):
+        """
+        参数:
+            tick: 执行一次完整截图分析流程的函数
+            ticks: 总执行次数
+            warmup: 预热次数，之后的RSS作为基线（连接池、编码进程、缓冲区在预热期间建立）
+            samples: 采样次数
+            tolerance_mb: 允许的RSS增长（MB）
+            watchdog: MemoryWatchdog，每次采样时输出各组件占用（可选）
+        """
+        self.tick = tick
+        self.ticks = ticks
+        self.warmup = min(warmup, ticks // 2)
+        self.samples = max(2, samples)
+        self.tolerance_mb = tolerance_mb
+        self.watchdog = watchdog
+
+    @staticmethod
+    def _slope(points):
+        """最小二乘拟合的RSS增长率（MB/千次）"""
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        denominator = sum((x - mean_x) ** 2 for x, _ in points)
+        if not denominator:
+            return 0.0
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator * 1000
+
+    def _sample(self, done, points):
+        gc.collect()
+        rss = current_rss()
+        if rss is None:
+            return None
+        points.append((done, rss / MB))
+        components = ''
+        if self.watchdog is not None:
+            components = f"  组件: {self.watchdog.check()['components_mb']}"
+        print(f"  {done:>6} 次  RSS {rss / MB:8.1f}MB{components}")
+        return rss
+
+    def run(self):
+        """
+        返回: (是否通过, 结果字典)
+        """
+        print(f"🧪 内存浸泡测试: {self.ticks} 次，预热 {self.warmup} 次")
+        start = time.time()
+        for _ in range(self.warmup):
+            self.tick()
+
+        points = []
+        baseline = self._sample(self.warmup, points)
+        if baseline is None:
+            print("❌ 无法读取进程内存占用")
+            return False, {}
+
+        measured = self.ticks - self.warmup
+        step = max(1, measured // self.samples)
+        done = self.warmup
+        while done < self.ticks:
+            for _ in range(min(step, self.ticks - done)):
+                self.tick()
+            done += min(step, self.ticks - done)
+            self._sample(done, points)
+
+        final = points[-1][1]
+        growth = final - baseline / MB
+        result = {
+            'ticks': self.ticks,
+            'seconds': round(time.time() - start, 1),
+            'baseline_mb': round(baseline / MB, 1),
+            'final_mb': round(final, 1),
+            'peak_mb': round(max(y for _, y in points), 1),
+            'growth_mb': round(growth, 1),
+            'slope_mb_per_1000': round(self._slope(points), 2),
+        }
+        passed = growth <= self.tolerance_mb
+        print(
+            f"{'✅' if passed else '❌'} RSS {result['baseline_mb']}MB -> {result['final_mb']}MB "
+            f"(增长 {result['growth_mb']}MB，允许 {self.tolerance_mb}MB；"
+            f"趋势 {result['slope_mb_per_1000']}MB/千次，用时 {result['seconds']}s)"
+        )
+        return passed, result
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+缩略图模块
+缩略图只生成一次并保存在截图目录旁，后台线程解码到按内存上限淘汰的LRU缓存中
+"""
+
+import os
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+
+class ThumbnailStore:
+    def __init__(self, config):
+        gui_config = config.get('gui', {})
+        self.thumbs_dir = os.path.join(config['storage']['screenshots_dir'], 'thumbs')
+        self.size = tuple(gui_config.get('thumbnail_size', [240, 135]))
+        self.quality = gui_config.get('thumbnail_quality', 70)
+        self.logger = logging.getLogger(__name__)
+
+    def thumbnail_path(self, screenshot_path):
+        return os.path.join(self.thumbs_dir, os.path.basename(screenshot_path))
+
+    def ensure(self, screenshot_path):
+        """
+        返回截图对应的缩略图路径，不存在时生成
+        截图不存在或生成失败时返回None
+        """
+        thumb_path = self.thumbnail_path(screenshot_path)
+        if os.path.exists(thumb_path):
+            return thumb_path
+        if not os.path.exists(screenshot_path):
+            return None
+        try:
+            os.makedirs(self.thumbs_dir, exist_ok=True)
+            with Image.open(screenshot_path) as img:
+                # 让JPEG解码器直接按缩小比例解码，避免解出全分辨率像素
+                img.draft('RGB', self.size)
+                img.thumbnail(self.size, Image.BILINEAR)
+                thumb = img.convert('RGB')
+            thumb.save(thumb_path + '.tmp', 'JPEG', quality=self.quality)
+            os.replace(thumb_path + '.tmp', thumb_path)
+            return thumb_path
+        except Exception as e:
+            self.logger.error(f"生成缩略图失败 {screenshot_path}: {str(e)}")
+            return None
+
+
+class LRUImageCache:
+    """按解码后像素字节数限制容量的LRU缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, key):
+        with self.lock:
+            image = self.items.get(key)
+            if image is not None:
+                self.items.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        size = self._image_bytes(image)
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self._image_bytes(self.items.pop(key))
+            self.items[key] = image
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                _, evicted = self.items.popitem(last=False)
+                self.total_bytes -= self._image_bytes(evicted)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class ThumbnailLoader:
+    def __init__(self, config):
+        gui_config = config.get('gui', {})
+        self.store = ThumbnailStore(config)
+        self.cache = LRUImageCache(gui_config.get('thumbnail_cache_mb', 32) * 1024 * 1024)
+
+        # 后进先出: 快速滚动时优先加载最新可见的行
+        self.requests = queue.LifoQueue()
+        # 加载完成的结果按请求方分发，多个时间线窗口共用一个加载器时互不抢取
+        self.completed = {}   # 请求方 -> 已加载完成的截图路径列表
+        self.waiters = {}     # 截图路径 -> 等待该缩略图的请求方
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, screenshot_path, requester):
+        """
+        请求缩略图
+        参数: requester - 请求方（如时间线窗口），用drain_completed(requester)取回加载完成的路径
+        返回: 已缓存的PIL图像；未缓存时返回None，加载完成后交给每个等待它的请求方
+        """
+        image = self.cache.get(screenshot_path)
+        if image is not None:
+            return image
+        with self.lock:
+            self.completed.setdefault(requester, [])
+            waiters = self.waiters.get(screenshot_path)
+            if waiters is None:
+                waiters = self.waiters[screenshot_path] = set()
+                self.requests.put(screenshot_path)
+            waiters.add(requester)
+        return None
+
+    def _run(self):
+        while True:
+            screenshot_path = self.requests.get()
+            loaded = False
+            try:
+                image = self.cache.get(screenshot_path)
+                if image is None:
+                    thumb_path = self.store.ensure(screenshot_path)
+                    if thumb_path:
+                        with Image.open(thumb_path) as img:
+                            image = img.convert('RGB')
+                        self.cache.put(screenshot_path, image)
+                loaded = image is not None
+            except Exception as e:
+                self.logger.error(f"加载缩略图失败 {screenshot_path}: {str(e)}")
+            finally:
+                with self.lock:
+                    for requester in self.waiters.pop(screenshot_path, ()):
+                        if loaded and requester in self.completed:
+                            self.completed[requester].append(screenshot_path)
+
+    def drain_completed(self, requester):
+        """取出该请求方已加载完成的截图路径"""
+        with self.lock:
+            paths = self.completed.get(requester)
+            if not paths:
+                return []
+            self.completed[requester] = []
+            return paths
+
+    def forget(self, requester):
+        """请求方关闭后丢弃它的结果和未完成的请求"""
+        with self.lock:
+            self.completed.pop(requester, None)
+            for waiters in self.waiters.values():
+                waiters.discard(requester)
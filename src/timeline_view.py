@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+时间线视图模块
+按天浏览活动记录及截图缩略图，只绘制可见的行
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from datetime import date, timedelta
+from PIL import ImageTk
+
+ROW_HEIGHT = 96
+THUMB_PADDING = 8
+TEXT_OFFSET = 260
+
+
+class TimelineWindow:
+    def __init__(self, root, data_layer, thumbnail_loader, target_date=None):
+        self.root = root
+        self.data_layer = data_layer
+        self.loader = thumbnail_loader
+        self.target_date = target_date or date.today()
+
+        self.activities = []
+        # 可见行: 行号 -> 画布元素ID列表
+        self.rendered_rows = {}
+        # 只为可见行保留PhotoImage引用，滚出视野后释放
+        self.photos = {}
+
+        self.window = tk.Toplevel(root)
+        self.window.geometry("800x600")
+
+        nav_frame = ttk.Frame(self.window)
+        nav_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Button(nav_frame, text="◀ 前一天", command=lambda: self.change_date(-1)).pack(side="left")
+        ttk.Button(nav_frame, text="后一天 ▶", command=lambda: self.change_date(1)).pack(side="left", padx=5)
+        self.date_label = ttk.Label(nav_frame, text="")
+        self.date_label.pack(side="left", padx=10)
+
+        canvas_frame = ttk.Frame(self.window)
+        canvas_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        self.canvas = tk.Canvas(canvas_frame, background="white", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=self._on_canvas_scroll(scrollbar))
+        self.canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind("<Configure>", lambda event: self.render_visible())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self._scroll_units(-1))
+        self.canvas.bind("<Button-5>", lambda event: self._scroll_units(1))
+
+        self.load_activities()
+        self._poll_thumbnails()
+
+    def change_date(self, delta_days):
+        self.target_date += timedelta(days=delta_days)
+        self.load_activities()
+
+    def load_activities(self):
+        self.window.title(f"时间线 - {self.target_date}")
+        self.date_label.config(text=f"{self.target_date}  加载中...")
+        target_date = self.target_date
+        self.data_layer.query(
+            ('activities', target_date),
+            lambda db: db.get_activities_by_date(target_date),
+            lambda activities: self._on_activities(target_date, activities or [])
+        )
+
+    def _on_activities(self, target_date, activities):
+        if target_date != self.target_date or not self.window.winfo_exists():
+            return
+        self.activities = activities
+        self.date_label.config(text=f"{target_date}  共 {len(activities)} 条记录")
+        self.canvas.delete("all")
+        self.rendered_rows.clear()
+        self.photos.clear()
+        self.canvas.configure(scrollregion=(0, 0, 0, len(activities) * ROW_HEIGHT))
+        self.canvas.yview_moveto(0)
+        self.render_visible()
+
+    def _on_canvas_scroll(self, scrollbar):
+        def update(first, last):
+            scrollbar.set(first, last)
+            self.render_visible()
+        return update
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+
+    def _on_mousewheel(self, event):
+        self._scroll_units(-1 if event.delta > 0 else 1)
+
+    def _scroll_units(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def _visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // ROW_HEIGHT) - 1)
+        last = min(len(self.activities), int(bottom // ROW_HEIGHT) + 2)
+        return first, last
+
+    def render_visible(self):
+        """绘制可见范围内的行，并删除已滚出视野的行"""
+        if not self.activities:
+            return
+        first, last = self._visible_range()
+
+        for index in list(self.rendered_rows):
+            if index < first or index >= last:
+                for item in self.rendered_rows.pop(index):
+                    self.canvas.delete(item)
+                self.photos.pop(index, None)
+
+        for index in range(first, last):
+            if index not in self.rendered_rows:
+                self.rendered_rows[index] = self._draw_row(index)
+
+    def _draw_row(self, index):
+        activity = self.activities[index]
+        y = index * ROW_HEIGHT
+        width = max(self.canvas.winfo_width(), TEXT_OFFSET + 100)
+        items = [
+            self.canvas.create_line(0, y + ROW_HEIGHT - 1, width, y + ROW_HEIGHT - 1, fill="#e0e0e0"),
+            self.canvas.create_text(
+                TEXT_OFFSET, y + THUMB_PADDING, anchor="nw",
+                text=str(activity['timestamp'])[11:19], font=("TkDefaultFont", 10, "bold")
+            ),
+            self.canvas.create_text(
+                TEXT_OFFSET, y + THUMB_PADDING + 20, anchor="nw",
+                text=activity['description'][:200], width=width - TEXT_OFFSET - 10
+            ),
+        ]
+        screenshot_path = activity.get('screenshot_path')
+        if screenshot_path:
+            image = self.loader.request(screenshot_path, self)
+            if image is not None:
+                items.append(self._draw_thumbnail(index, image))
+        return items
+
+    def _draw_thumbnail(self, index, image):
+        photo = ImageTk.PhotoImage(image)
+        self.photos[index] = photo
+        return self.canvas.create_image(THUMB_PADDING, index * ROW_HEIGHT + THUMB_PADDING, anchor="nw", image=photo)
+
+    def _poll_thumbnails(self):
+        """把后台加载完成的缩略图绘制到仍然可见的行上"""
+        if not self.window.winfo_exists():
+            self.loader.forget(self)
+            return
+        completed = set(self.loader.drain_completed(self))
+        if completed:
+            for index, items in self.rendered_rows.items():
+                if index in self.photos:
+                    continue
+                screenshot_path = self.activities[index].get('screenshot_path')
+                if screenshot_path in completed:
+                    image = self.loader.cache.get(screenshot_path)
+                    if image is not None:
+                        items.append(self._draw_thumbnail(index, image))
+        self.window.after(50, self._poll_thumbnails)
@@ -9,6 +9,7 @@ import sys
 import yaml
 import requests
 import subprocess
+import time
 from datetime import datetime
 
 def test_python_version():
@@ -25,7 +26,7 @@ def test_python_version():
 def test_dependencies():
     """测试Python依赖"""
     print("📦 测试Python依赖...")
-    required_modules = ['yaml', 'requests', 'schedule', 'PIL']
+    required_modules = ['yaml', 'requests', 'PIL']
     missing = []
     
     for module in required_modules:
@@ -158,6 +159,38 @@ def test_data_directory():
         print(f"❌ 数据目录测试失败: {str(e)}")
         return False
 
+def test_cli_startup_time():
+    """测试查询命令的启动耗时（扣除Python解释器自身的启动时间）"""
+    print("⏱️ 测试命令行启动耗时...")
+    
+    def median_runtime(args, runs=5):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, capture_output=True)
+            durations.append(time.perf_counter() - start)
+        return sorted(durations)[runs // 2]
+    
+    try:
+        baseline = median_runtime(['-c', 'pass'])
+        all_passed = True
+        for command in ('--stats', '--today'):
+            overhead = median_runtime(['main.py', command]) - baseline
+            if overhead < 0.1:
+                print(f"  ✅ {command}: {overhead * 1000:.0f}ms")
+            else:
+                print(f"  ❌ {command}: {overhead * 1000:.0f}ms (应低于100ms)")
+                all_passed = False
+        
+        if all_passed:
+            print("✅ 查询命令启动足够快")
+        else:
+            print("❌ 查询命令启动过慢，请检查是否在快速路径上导入了重量级依赖")
+        return all_passed
+    except Exception as e:
+        print(f"❌ 启动耗时测试失败: {str(e)}")
+        return False
+
 def main():
     """主测试函数"""
     print("🧪 AI识别总结工具系统测试")
@@ -170,6 +203,7 @@ def main():
         test_dependencies,
         test_config_file,
         test_data_directory,
+        test_cli_startup_time,
         test_ollama_connection,
         test_screenshot_capability
     ]
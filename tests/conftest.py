@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+# main.py 中的ActivityTracker
+sys.path.insert(1, ROOT)
+
+
+@pytest.fixture
+def config(tmp_path):
+    """仓库自带的配置，存储和日志指向临时目录"""
+    with open(os.path.join(ROOT, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['storage'].update({
+        'data_dir': str(tmp_path),
+        'database': str(tmp_path / 'activities.db'),
+        'screenshots_dir': str(tmp_path / 'screenshots'),
+    })
+    config['spool']['dir'] = str(tmp_path / 'spool')
+    config['screenshot']['interval_minutes'] = 1
+    # 测试中在当前线程编码，不启动编码进程池
+    config['encoder'] = {'enabled': False}
+    return config
@@ -0,0 +1,71 @@
+from datetime import datetime, date, timedelta
+
+import pytest
+
+from analytics import Analytics, parse_range
+from database_manager import DatabaseManager
+
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+def test_parse_range():
+    today = date(2024, 3, 31)
+    assert parse_range('7', today) == (date(2024, 3, 25), today)
+    assert parse_range('2w', today) == (date(2024, 3, 18), today)
+    assert parse_range('2024-01-01:2024-01-31') == (date(2024, 1, 1), date(2024, 1, 31))
+    with pytest.raises(ValueError):
+        parse_range('2024-02-01:2024-01-01')
+    with pytest.raises(ValueError):
+        parse_range('0d')
+
+
+def test_spans_are_split_into_hourly_buckets(config):
+    db = DatabaseManager(config)
+    day = date.today() - timedelta(days=1)
+    db.open_span("用户正在终端中运行测试", at(day, 9, 30), at(day, 11, 15))
+    assert db.refresh_hourly_buckets() == 1
+    assert db.get_hourly_aggregate(day, day, 'day') == [(str(day), 6300)]
+
+    heatmap = Analytics(config, db).get_range_stats(day, day)['heatmap']
+    row = heatmap[day.weekday()]
+    assert row[9:12] == [1800, 3600, 900]
+    assert sum(map(sum, heatmap)) == 6300
+
+
+def test_refresh_only_recomputes_changed_dates_and_survives_cleanup(config):
+    db = DatabaseManager(config)
+    old_day = date.today() - timedelta(days=60)
+    today = date.today()
+    span_id = db.open_span("用户在写文档", at(old_day, 14), at(old_day, 15))
+    db.open_span("用户在写文档", at(today, 0), at(today, 0, 10))
+    assert db.refresh_hourly_buckets() == 2
+    assert db.refresh_hourly_buckets() == 0
+
+    db.extend_span(span_id, at(old_day, 14), at(old_day, 16), 2)
+    assert db.refresh_hourly_buckets() == 1
+
+    db.cleanup_old_data(30)
+    db.open_span("清理后的新记录", at(today, 1), at(today, 1, 5))
+    db.refresh_hourly_buckets()
+    assert db.get_hourly_aggregate(old_day, old_day, 'day') == [(str(old_day), 7200)]
+
+
+def test_streaks_and_cache(config):
+    db = DatabaseManager(config)
+    end = date.today()
+    # 今天尚未达标，昨天往前连续3天，之前还有一段连续2天
+    for offset, minutes in [(0, 10), (1, 45), (2, 30), (3, 40), (5, 60), (6, 60)]:
+        day = end - timedelta(days=offset)
+        db.open_span("用户在写代码", at(day, 10), at(day, 10) + timedelta(minutes=minutes))
+
+    analytics = Analytics(config, db)
+    stats = analytics.get_range_stats(end - timedelta(days=6), end)
+    assert (stats['current_streak'], stats['longest_streak']) == (3, 3)
+    assert stats['active_days'] == 6
+    assert stats['peak_hour'] == 10
+
+    assert analytics.get_range_stats(end - timedelta(days=6), end) is stats
+    db.open_span("新的记录", at(end, 12), at(end, 13))
+    assert analytics.get_range_stats(end - timedelta(days=6), end)['current_streak'] == 4
@@ -0,0 +1,170 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend_pool import BackendPool, NoBackendAvailable
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(self.server.stub.tags_status, {'models': [{'name': 'stub:latest'}]})
+
+    def do_POST(self):
+        stub = self.server.stub
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with stub.lock:
+            stub.requests += 1
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        time.sleep(stub.delay)
+        with stub.lock:
+            stub.in_flight -= 1
+        self._reply(stub.status, {'response': 'ok'})
+
+
+class StubBackend:
+    """本地模拟的Ollama后端，可设置响应状态码和延迟"""
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.tags_status = 200
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(**kwargs):
+        stub = StubBackend(**kwargs)
+        created.append(stub)
+        return stub
+
+    yield make
+    for stub in created:
+        stub.stop()
+
+
+def pool_config(config, urls, **pool):
+    ollama = dict(config['ollama'], base_url=urls, pool=dict(config['ollama'].get('pool', {}), **pool))
+    return dict(config, ollama=ollama)
+
+
+def test_deadline_covers_waiting_for_a_slot_and_the_request(config, stubs):
+    stub = stubs(delay=2.0)
+    pool = BackendPool(pool_config(config, [stub.url], max_concurrency=1))
+    held = pool.acquire()
+    threading.Timer(0.6, pool.release, args=(held, None)).start()
+
+    start = time.monotonic()
+    with pytest.raises(Exception) as raised:
+        pool.request('POST', '/api/generate', deadline=start + 1.2, timeout=30, json={})
+    # 等待名额用掉0.6秒后HTTP超时只剩约0.6秒，而不是再等满1.2秒
+    assert time.monotonic() - start < 1.6
+    assert not isinstance(raised.value, NoBackendAvailable)
+
+    failures = pool.backends[0].consecutive_failures
+    held = pool.acquire()
+    with pytest.raises(NoBackendAvailable):
+        pool.request('POST', '/api/generate', deadline=time.monotonic() + 0.2, json={})
+    pool.release(held, None)
+    # 没有发出的请求不计入后端失败
+    assert pool.backends[0].consecutive_failures == failures
+
+
+def test_full_pool_does_not_count_as_breaker_failure(config, stubs):
+    from ollama_client import OllamaClient
+
+    stub = stubs()
+    client = OllamaClient(pool_config(config, [stub.url], max_concurrency=1))
+    client.min_request_seconds = 0
+    held = client.pool.acquire()
+    for _ in range(5):
+        assert client._generate('stub:latest', 'hi', deadline=time.monotonic() + 0.1) is None
+    breaker = client._breaker(client.analysis_group).get_state()
+    assert (breaker['state'], breaker['consecutive_failures']) == ('closed', 0)
+
+    client.pool.release(held, None)
+    assert client._generate('stub:latest', 'hi', deadline=time.monotonic() + 5) == 'ok'
+
+
+def test_failover_ejects_dead_backend(config, stubs):
+    good = stubs()
+    # 端口已关闭的后端
+    dead = stubs()
+    dead_url = dead.url
+    dead.stop()
+    pool = BackendPool(pool_config(config, [dead_url, good.url], max_failures=1, eject_seconds=60))
+
+    with pytest.raises(Exception):
+        pool.request('POST', '/api/generate', timeout=2, json={})
+    assert not pool.backends[0].healthy
+    for _ in range(5):
+        assert pool.request('POST', '/api/generate', timeout=2, json={}).status_code == 200
+    assert good.requests == 5
+
+
+def test_concurrency_is_limited_per_backend(config, stubs):
+    stub = stubs(delay=0.3)
+    pool = BackendPool(pool_config(config, [stub.url], max_concurrency=2, acquire_timeout=5))
+    threads = [threading.Thread(target=pool.request, args=('POST', '/api/generate'), kwargs={'json': {}, 'timeout': 5})
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    # 两个名额都被占用时等待超时返回None
+    assert pool.acquire(timeout=0.05) is None
+    for thread in threads:
+        thread.join()
+    assert stub.requests == 6 and stub.max_in_flight == 2
+    assert pool.backends[0].outstanding == 0
+
+
+def test_health_check_restores_recovered_backend(config, stubs):
+    stub = stubs(status=500)
+    pool = BackendPool(pool_config(config, [stub.url], max_failures=2, eject_seconds=60))
+    for _ in range(2):
+        assert pool.request('POST', '/api/generate', timeout=2, json={}).status_code == 500
+    assert not pool.backends[0].healthy
+    # 被摘除的后端在冷却期内不接收请求
+    with pytest.raises(NoBackendAvailable):
+        pool.request('POST', '/api/generate', timeout=2, json={})
+
+    stub.status = 200
+    assert pool.check_health() == 1
+    assert pool.backends[0].healthy and pool.backends[0].models == ['stub:latest']
+    assert pool.request('POST', '/api/generate', timeout=2, json={}).status_code == 200
+
+    stub.tags_status = 503
+    assert pool.check_health() == 0
+    assert not pool.backends[0].healthy
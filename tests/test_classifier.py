@@ -0,0 +1,51 @@
+from datetime import datetime, date
+
+from classifier import ActivityClassifier, UNKNOWN
+from database_manager import DatabaseManager
+
+
+class FakeTextModel:
+    def __init__(self, response):
+        self.response = response
+        self.prompts = []
+
+    def generate_text(self, prompt):
+        self.prompts.append(prompt)
+        return self.response
+
+
+def test_earlier_rule_wins(config):
+    classifier = ActivityClassifier(config)
+    # 同时提到终端和浏览器，终端规则在前
+    assert classifier.match("用户在浏览器里看文档，同时在终端中运行测试") == ('终端', '开发')
+    assert classifier.match("用户正在使用Visual Studio Code编辑代码") == ('VS Code', '开发')
+    assert classifier.match("用户在发呆") is None
+
+
+def test_model_fallback_is_batched_and_cached(config):
+    model = FakeTextModel("1|Obsidian|文档\n2|某应用|不存在的类别")
+    classifier = ActivityClassifier(config, model)
+    results = classifier.classify(["用户在Obsidian里写笔记", "用户在做别的事", "用户在Obsidian里写笔记"])
+    assert results == [('Obsidian', '文档'), ('某应用', '其他'), ('Obsidian', '文档')]
+    assert len(model.prompts) == 1
+
+    model.response = None
+    assert classifier.classify(["用户在Obsidian里写笔记", "完全未知"]) == [('Obsidian', '文档'), UNKNOWN]
+
+
+def test_breakdown_aggregates_classified_spans(config):
+    db = DatabaseManager(config)
+    day = date.today()
+    start = datetime.combine(day, datetime.min.time()).replace(hour=9)
+    db.open_span("用户正在终端中运行测试", start, start.replace(hour=10))
+    db.open_span("用户正在使用Slack与同事沟通", start.replace(hour=10), start.replace(hour=10, minute=30))
+    db.open_span("用户在发呆", start.replace(hour=11), start.replace(hour=11, minute=15))
+
+    classifier = ActivityClassifier(dict(config, classification=dict(config['classification'], llm_fallback=False)))
+    assert classifier.classify_pending(db) == 3
+    assert db.get_unclassified('activity_spans') == []
+
+    totals = {(row['category'], row['application']): row['seconds']
+              for row in db.get_time_breakdown(day, day)}
+    assert totals == {('开发', '终端'): 3600, ('沟通', 'Slack'): 1800, UNKNOWN[::-1]: 900}
+    assert [row['period'] for row in db.get_time_breakdown(day, day, 'day')] == [str(day)] * 3
@@ -0,0 +1,75 @@
+import sqlite3
+from datetime import datetime, date, timedelta
+
+import pytest
+
+from database_manager import DatabaseManager
+
+
+def rows(db, sql):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_repeated_descriptions_are_stored_once(config):
+    db = DatabaseManager(config)
+    now = datetime.now().replace(microsecond=0)
+    db.add_activity("用户正在终端中运行测试", timestamp=now)
+    db.add_activities([(now + timedelta(minutes=i), "用户正在终端中运行测试", None, None) for i in range(1, 3)]
+                      + [(now + timedelta(minutes=3), "用户在写文档", None, None)])
+
+    assert rows(db, 'SELECT text, refcount FROM descriptions ORDER BY id') == [
+        ("用户正在终端中运行测试", 3), ("用户在写文档", 1)]
+    assert rows(db, "SELECT COUNT(*) FROM activities WHERE description = ''") == [(4,)]
+    assert [a['description'] for a in db.get_activities_by_date(now.date())] == [
+        "用户正在终端中运行测试"] * 3 + ["用户在写文档"]
+    assert len(db.search_activities("写文档")) == 1
+
+
+def test_migration_converts_legacy_rows_and_cleanup_prunes(config):
+    legacy = DatabaseManager(dict(config, descriptions={'normalize': False}))
+    old = datetime.now() - timedelta(days=60)
+    legacy.add_activities([(old + timedelta(minutes=i), f"旧记录{i % 2}", None, None) for i in range(5)])
+    legacy.add_activity("新记录")
+
+    db = DatabaseManager(config)
+    assert db.migrate_descriptions(batch_size=2) == 6
+    assert db.migrate_descriptions() == 0
+    stats = db.get_description_stats()
+    assert (stats['legacy_rows'], stats['unique_descriptions'], stats['references']) == (0, 3, 6)
+    assert [a['description'] for a in db.get_activities_by_date(old.date())] == [
+        "旧记录0", "旧记录1", "旧记录0", "旧记录1", "旧记录0"]
+
+    exported = [row for chunk in db.iter_export_rows('activities') for row in chunk]
+    assert [row[3] for row in exported] == ["旧记录0", "旧记录1", "旧记录0", "旧记录1", "旧记录0", "新记录"]
+
+    db.cleanup_old_data(30)
+    assert rows(db, 'SELECT text, refcount FROM descriptions') == [("新记录", 1)]
+
+
+def test_old_descriptions_are_compressed_transparently(config):
+    pytest.importorskip('zstandard')
+    db = DatabaseManager(config)
+    old = datetime.now() - timedelta(days=40)
+    descriptions = [f"用户正在使用VS Code编辑第{i}个Python模块并在终端中运行单元测试" for i in range(300)]
+    db.add_activities([(old + timedelta(minutes=i), text, None, None) for i, text in enumerate(descriptions)])
+
+    assert db.compress_descriptions(older_than_days=30) > 0
+    assert rows(db, 'SELECT COUNT(*) FROM descriptions WHERE text IS NULL') != [(0,)]
+    fresh = DatabaseManager(config)
+    assert [a['description'] for a in fresh.get_activities_by_date(old.date())] == [
+        text for i, text in enumerate(descriptions) if (old + timedelta(minutes=i)).date() == old.date()]
+
+
+def test_reanalysis_updates_activities_and_spans(config):
+    db = DatabaseManager(config)
+    now = datetime.now().replace(microsecond=0)
+    db.add_activity("旧描述", "shot1.png", now)
+    db.open_span("旧描述", now, now + timedelta(minutes=5), "shot1.png")
+
+    assert db.apply_reanalysis([(now, "新描述", "shot1.png"),
+                                (now + timedelta(minutes=1), "补录的描述", "shot2.png")])
+    assert [a['description'] for a in db.get_activities_by_date(now.date())] == ["新描述", "补录的描述"]
+    assert [s['description'] for s in db.get_spans_by_date(now.date())] == ["新描述"]
+    assert rows(db, 'SELECT text, refcount FROM descriptions ORDER BY id') == [
+        ("旧描述", 0), ("新描述", 1), ("补录的描述", 1)]
@@ -0,0 +1,30 @@
+import json
+from datetime import datetime, date
+
+import pytest
+
+from database_manager import DatabaseManager
+from exporter import Exporter
+
+
+def test_incremental_export_continues_after_watermark(config, tmp_path):
+    db = DatabaseManager(config)
+    exporter = Exporter(config, db)
+    db.add_activity("第一条", timestamp=datetime(2024, 1, 1, 9))
+    path, count = exporter.export('activities', 'jsonl', str(tmp_path / 'a.jsonl'), incremental=True)
+    assert count == 1
+
+    db.add_activity("第二条", timestamp=datetime(2024, 1, 2, 9))
+    path, count = exporter.export('activities', 'jsonl', str(tmp_path / 'b.jsonl'), incremental=True)
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['description'] for line in f] == ["第二条"]
+
+
+def test_incremental_export_rejects_date_filter(config, tmp_path):
+    db = DatabaseManager(config)
+    db.add_activity("范围外", timestamp=datetime(2024, 1, 1, 9))
+    exporter = Exporter(config, db)
+    with pytest.raises(ValueError):
+        exporter.export('activities', 'jsonl', str(tmp_path / 'a.jsonl'),
+                        start_date=date(2024, 2, 1), incremental=True)
+    assert exporter.load_watermarks() == {}
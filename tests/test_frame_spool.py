@@ -0,0 +1,68 @@
+import threading
+import time
+from datetime import datetime
+
+from PIL import Image
+
+from frame_spool import FrameSpool, CatchUpWorker
+
+
+def make_spool(config, tmp_path, max_frames):
+    config['spool'] = {'dir': str(tmp_path / 'spool'), 'max_frames': max_frames}
+    return FrameSpool(config)
+
+
+def test_frames_being_caught_up_are_not_dropped(config, tmp_path):
+    spool = make_spool(config, tmp_path, max_frames=2)
+    image = Image.new('RGB', (64, 48), 'teal')
+    for second in range(2):
+        spool.put(image, datetime(2024, 1, 1, 9, 0, second))
+    oldest = spool.pending()[0]
+
+    started, proceed = threading.Event(), threading.Event()
+
+    def analyze(frame):
+        started.set()
+        proceed.wait(5)
+        return "编辑文档"
+
+    recorded = []
+    worker = CatchUpWorker(config, spool, lambda: True, analyze,
+                           lambda analysis, captured_at, path: recorded.append(captured_at))
+    worker.concurrency = 1
+    thread = threading.Thread(target=worker.drain)
+    thread.start()
+    assert started.wait(5)
+
+    # 补录中的最旧帧不会因超限被丢弃，改为丢弃下一帧
+    spool.put(image, datetime(2024, 1, 1, 9, 0, 5))
+    assert oldest in spool.pending()
+    assert len(spool) == 2
+
+    proceed.set()
+    thread.join(5)
+    assert recorded == [datetime(2024, 1, 1, 9, 0, 0)]
+    # 补录期间写入的帧留到下一轮
+    assert len(spool) == 1
+    assert not spool.in_flight
+
+
+def test_worker_survives_analysis_errors(config, tmp_path):
+    spool = make_spool(config, tmp_path, max_frames=10)
+    spool.put(Image.new('RGB', (64, 48), 'teal'), datetime(2024, 1, 1, 9, 0, 0))
+
+    def analyze(frame):
+        raise RuntimeError("模型崩溃")
+
+    def is_available():
+        raise RuntimeError("探测失败")
+
+    worker = CatchUpWorker(config, spool, is_available, analyze, lambda *args: None)
+    assert worker.drain() == 0
+    assert len(spool) == 1
+
+    worker.retry_interval = 0.01
+    worker.start()
+    time.sleep(0.1)
+    assert worker.thread.is_alive()
+    worker.stop()
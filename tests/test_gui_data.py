@@ -0,0 +1,35 @@
+import gui_data
+from gui_data import GuiDataLayer
+from query_client import QueryClient
+
+
+class StubRoot:
+    def after(self, delay, callback):
+        pass
+
+
+class ExitedTrackerClient(QueryClient):
+    def get_stats(self):
+        raise ConnectionRefusedError("追踪器已退出")
+
+
+class ReadOnlyDatabase:
+    def get_stats(self):
+        return {'total_records': 3}
+
+
+def test_backend_is_reprobed_after_tracker_exits(config, monkeypatch):
+    backends = [ExitedTrackerClient('127.0.0.1', 9), ReadOnlyDatabase()]
+    monkeypatch.setattr(gui_data, 'open_query_backend', lambda config: backends.pop(0))
+    layer = GuiDataLayer(StubRoot(), config)
+    try:
+        received = []
+        layer.query('stats', lambda db: db.get_stats(), received.append)
+        layer.executor.shutdown(wait=True)
+
+        callback, value, error = layer.results.get(timeout=5)
+        assert error is None and value == {'total_records': 3}
+        assert isinstance(layer.get_db_manager(), ReadOnlyDatabase)
+        assert not backends
+    finally:
+        layer.shutdown()
@@ -0,0 +1,25 @@
+import io
+
+from PIL import Image
+
+from image_encoder import ImageEncoder, copy_pixels
+
+
+def test_copy_pixels_matches_tobytes():
+    for mode, size in [('RGB', (1441, 901)), ('RGBA', (640, 480)), ('L', (33, 7))]:
+        image = Image.linear_gradient('L').resize(size).convert(mode)
+        target = bytearray(len(mode) * size[0] * size[1] + 16)
+        assert copy_pixels(image, target) == size[0] * size[1] * len(mode)
+        assert bytes(target[:-16]) == image.tobytes()
+
+
+def test_encoder_round_trip_through_shared_memory(config):
+    encoder = ImageEncoder(dict(config, encoder={'enabled': True, 'workers': 1}))
+    try:
+        image = Image.new('RGBA', (800, 600), (10, 200, 30, 255))
+        jpeg = encoder.encode_jpeg(image, quality=90)
+        decoded = Image.open(io.BytesIO(jpeg))
+        assert decoded.size == (800, 600)
+        assert abs(decoded.getpixel((400, 300))[1] - 200) < 8
+    finally:
+        encoder.shutdown()
@@ -0,0 +1,113 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import capture_agent
+from capture_agent import CaptureAgent
+from database_manager import DatabaseManager
+from ingest_server import IngestServer
+from soak import SyntheticFrames, SYNTHETIC_ACTIVITIES
+
+
+class FakeOllama:
+    """按调用顺序返回不同活动描述的分析后端"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_encoded(self, jpeg_bytes):
+        self.calls += 1
+        return SYNTHETIC_ACTIVITIES[self.calls % len(SYNTHETIC_ACTIVITIES)]
+
+    def get_call_metrics(self):
+        return {}
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+
+def start_server(config):
+    config['ingest'] = {'port': 0, 'flush_interval': 1, 'dedup_similarity': 1.1}
+    server = IngestServer(config, FakeOllama(), DatabaseManager(config))
+    assert server.start()
+    return server
+
+
+def make_agent(config, server, tmp_path):
+    agent_config = dict(config, agent={
+        'server_url': f"http://127.0.0.1:{server.port}",
+        'client_id': 'laptop',
+        # 每帧都完整上传
+        'dedup_distance': -1,
+        'timeout': 2,
+        'spool_dir': str(tmp_path / 'agent_spool'),
+    })
+    return CaptureAgent(agent_config, SyntheticFrames(size=(320, 200)).next_frame)
+
+
+def client_rows(config, query):
+    with sqlite3.connect(config['storage']['database']) as conn:
+        return conn.execute(query, ('laptop',)).fetchall()
+
+
+def test_reconnect_uploads_backlog_in_capture_order(config, tmp_path, monkeypatch):
+    clock = FakeClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0))
+    monkeypatch.setattr(capture_agent, 'datetime', clock)
+    server = start_server(config)
+    agent = make_agent(config, server, tmp_path)
+    server_url = agent.server_url
+    try:
+        for tick in range(8):
+            # 第3到5帧时分析节点不可用
+            agent.server_url = 'http://127.0.0.1:9' if 2 <= tick <= 4 else server_url
+            agent.tick()
+            clock.current += timedelta(minutes=1)
+        assert server.wait_idle(timeout=30)
+    finally:
+        server.stop()
+
+    assert agent.stats['spooled'] == 3
+    assert agent.stats['backlog_sent'] == 3
+    assert agent.spool.pending() == []
+
+    timestamps = [row[0] for row in client_rows(
+        config, 'SELECT timestamp FROM activities WHERE client_id = ? ORDER BY id')]
+    assert len(timestamps) == 8
+    assert timestamps == sorted(timestamps)
+
+    spans = client_rows(config, 'SELECT start_time, end_time FROM activity_spans WHERE client_id = ? ORDER BY id')
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        assert start >= previous_end
+
+
+def test_rejects_malformed_headers(config):
+    server = start_server(config)
+    try:
+        headers = {'X-Client-Id': 'laptop', 'X-Captured-At': datetime.now().isoformat()}
+        assert server.handle_frame(dict(headers, **{'X-Frame-Hash': '-1'}), b'x')[0] == 400
+        assert server.handle_frame(dict(headers, **{'X-Frame-Hash': 'zz'}), b'x')[0] == 400
+        assert server.handle_frame(dict(headers, **{'X-Captured-At': 'yesterday'}), b'x')[0] == 400
+        # 带时区的时间转换为本地时间
+        status, _ = server.handle_frame(
+            dict(headers, **{'X-Captured-At': datetime.now().astimezone().isoformat()}), b'x')
+        assert status == 202
+    finally:
+        server.stop()
+
+
+def test_idle_clients_are_evicted(config):
+    server = start_server(config)
+    server.max_clients = 2
+    server.client_idle_timeout = 0
+    try:
+        headers = {'X-Captured-At': datetime.now().isoformat()}
+        for client_id in ('a', 'b', 'c'):
+            status, _ = server.handle_frame(dict(headers, **{'X-Client-Id': client_id}), b'')
+            assert status == 409
+        assert len(server.clients) <= 2
+    finally:
+        server.stop()
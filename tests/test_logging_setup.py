@@ -0,0 +1,16 @@
+import logging
+
+import logging_setup
+
+
+def test_removed_level_override_is_reset_on_reload():
+    logger = logging.getLogger('backend_pool')
+    try:
+        logging_setup.apply_config({'logging': {'level': 'INFO', 'levels': {'backend_pool': 'DEBUG'}}})
+        assert logger.level == logging.DEBUG
+
+        logging_setup.apply_config({'logging': {'level': 'INFO'}})
+        assert logger.level == logging.NOTSET
+        assert logger.getEffectiveLevel() == logging.INFO
+    finally:
+        logger.setLevel(logging.NOTSET)
@@ -0,0 +1,54 @@
+import time
+import threading
+
+import pytest
+
+from model_manager import ModelManager, PhaseTimeout
+
+
+def test_vision_phase_gives_up_at_deadline_while_text_batch_runs(config):
+    manager = ModelManager(config)
+    manager.unload_text_after_batch = False
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_text_job():
+        started.set()
+        finish.wait(5)
+        return 'summary'
+
+    result = []
+    submitter = threading.Thread(target=lambda: result.append(manager.run_text(slow_text_job)), daemon=True)
+    submitter.start()
+    assert started.wait(2)
+
+    start = time.monotonic()
+    with pytest.raises(PhaseTimeout):
+        with manager.vision_phase(deadline=start + 0.2):
+            pass
+    assert time.monotonic() - start < 1
+    assert manager.vision_in_flight == 0
+
+    finish.set()
+    with manager.vision_phase(deadline=time.monotonic() + 5):
+        pass
+    submitter.join(5)
+    assert result == ['summary']
+
+
+def test_concurrent_submissions_start_one_worker(config):
+    manager = ModelManager(config)
+    manager.unload_text_after_batch = False
+    workers = set()
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        manager.run_text(lambda: None)
+        workers.add(manager.text_worker)
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(workers) == 1
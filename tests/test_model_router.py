@@ -0,0 +1,33 @@
+import threading
+
+from PIL import Image
+
+from model_router import ModelRouter, compute_frame_hash
+
+
+def test_route_keeps_frame_hash_for_reuse(config):
+    router = ModelRouter(config)
+    image = Image.linear_gradient('L').convert('RGB')
+    frame_hash, reason = router.route(image)
+    assert reason == 'novel'
+    assert router.last_frame_hash == frame_hash == compute_frame_hash(image)
+
+
+def test_stats_are_consistent_under_concurrent_updates(config):
+    router = ModelRouter(config)
+    router.stats_log_every = 0
+
+    def worker():
+        for _ in range(2000):
+            router.record('small', None, 0.01)
+            router.record_agreement("用户在写代码", "用户在写代码")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = router.get_stats()
+    assert stats['small_count'] == 16000
+    assert stats['reasons'] == {'routine': 16000}
+    assert stats['avg_agreement'] == 1.0
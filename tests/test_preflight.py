@@ -0,0 +1,35 @@
+import yaml
+
+from preflight import PreflightResult
+from soak import soak_config
+
+
+def make_tracker(config, tmp_path, ollama_result):
+    from main import ActivityTracker
+
+    path = tmp_path / 'tracker.yaml'
+    path.write_text(yaml.safe_dump(soak_config(config, str(tmp_path), 'http://127.0.0.1:9'), allow_unicode=True),
+                    encoding='utf-8')
+    tracker = ActivityTracker(str(path))
+    results = {'ollama': ollama_result, 'capture': PreflightResult(True, "截图权限正常")}
+    tracker.preflight.run = lambda force=False: results
+    return tracker
+
+
+def test_unreachable_ollama_starts_with_spool(config, tmp_path):
+    tracker = make_tracker(config, tmp_path, PreflightResult(False, "无法连接到Ollama服务"))
+    try:
+        assert tracker.frame_spool.enabled
+        assert tracker.check_dependencies()
+    finally:
+        tracker.image_encoder.shutdown()
+
+
+def test_missing_model_fails_fast_even_with_spool(config, tmp_path):
+    tracker = make_tracker(config, tmp_path, PreflightResult(
+        False, "指定的模型不在可用模型列表中", {'models': ['other:latest']}))
+    try:
+        assert tracker.frame_spool.enabled
+        assert not tracker.check_dependencies()
+    finally:
+        tracker.image_encoder.shutdown()
@@ -0,0 +1,14 @@
+from prompt_compactor import PromptCompactor, estimate_tokens
+
+
+def test_compacted_prompt_including_omitted_line_fits_budget(config):
+    config['summary'] = {'compaction': {'token_budget': 60}}
+    compactor = PromptCompactor(config)
+    topics = ['编写代码', '阅读邮件', '浏览网页', '参加会议', '整理文档', '查看日历', '回复消息', '观看视频']
+    activities = [{'timestamp': f"2024-01-01 09:{minute:02d}:00", 'description': f"{topics[minute % 8]}{minute}"}
+                  for minute in range(40)]
+
+    text, stats = compactor.compact(activities, 'llama2:latest')
+
+    assert '已省略' in text
+    assert sum(estimate_tokens(line) + 1 for line in text.split('\n')) <= 60
@@ -0,0 +1,43 @@
+import sqlite3
+from datetime import date, timedelta
+
+from database_manager import DatabaseManager
+from rollup import RollupBuilder, period_bounds
+
+
+class FakeTextModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_text(self, prompt):
+        self.calls += 1
+        return f"汇总{self.calls}"
+
+
+def test_rollup_is_not_regenerated_from_pruned_days(config):
+    db = DatabaseManager(config)
+    model = FakeTextModel()
+    builder = RollupBuilder(config, model, db)
+    start, end = period_bounds('week', date.today() - timedelta(days=70))
+    for offset in range(7):
+        db.save_daily_summary(start + timedelta(days=offset), f"第{offset}天的总结")
+    summary = builder.build('week', start)['summary']
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('DELETE FROM daily_summaries WHERE date < ?', (start + timedelta(days=3),))
+    calls = model.calls
+    assert builder.build('week', start)['summary'] == summary
+    assert builder.build('week', start, force=True)['summary'] == summary
+    assert model.calls == calls
+
+
+def test_cleanup_keeps_summaries_of_the_oldest_retained_month(config):
+    db = DatabaseManager(config)
+    today = date.today()
+    cutoff = today - timedelta(days=30)
+    month_start = cutoff.replace(day=1)
+    for day in (month_start - timedelta(days=10), month_start - timedelta(days=3), month_start, cutoff):
+        db.save_daily_summary(day, "总结")
+    db.cleanup_old_data(30)
+    kept = [day['date'] for day in db.get_daily_summaries_in_range(month_start - timedelta(days=30), today)]
+    assert kept == sorted({str(d) for d in (month_start - timedelta(days=3), month_start, cutoff)})
@@ -0,0 +1,31 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import Job, Scheduler, suspend_clock
+
+
+@pytest.fixture
+def scheduler(config):
+    scheduler = Scheduler(config)
+    scheduler.add_job(Job('capture', lambda: None, 'capture', interval=60))
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_wall_clock_step_does_not_shift_interval_jobs(scheduler):
+    deadline = scheduler.next_run('capture')
+    # 夏令时切换或向前校时: 本地时间快了一小时，单调时钟和休眠时钟都没有变化
+    scheduler._adjust_for_time_jump(time.monotonic(), datetime.now() - timedelta(hours=1), suspend_clock())
+
+    assert scheduler.next_run('capture') == deadline
+    assert scheduler.jobs['capture'].missed == 0
+
+
+def test_suspend_moves_interval_jobs_forward(scheduler):
+    deadline = scheduler.next_run('capture')
+    scheduler._adjust_for_time_jump(time.monotonic(), datetime.now() - timedelta(minutes=10),
+                                    suspend_clock() - 600)
+
+    assert scheduler.next_run('capture') == pytest.approx(deadline - 600, abs=1)
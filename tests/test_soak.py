@@ -0,0 +1,33 @@
+from datetime import date
+
+import yaml
+
+from soak import StubOllamaServer, SyntheticFrames, SoakRunner, soak_config
+
+
+def test_short_soak_keeps_memory_flat_and_records_activity(config, tmp_path):
+    from main import ActivityTracker
+
+    server = StubOllamaServer(config['ollama']['model'])
+    server.start()
+    tracker = None
+    try:
+        soak_path = tmp_path / 'soak.yaml'
+        soak = soak_config(config, str(tmp_path), server.url)
+        soak['encoder'] = {'enabled': True, 'workers': 1}
+        soak_path.write_text(yaml.safe_dump(soak, allow_unicode=True), encoding='utf-8')
+
+        tracker = ActivityTracker(str(soak_path))
+        tracker.screenshot_capture.get_screenshot_for_analysis = SyntheticFrames(size=(800, 500)).next_frame
+        passed, result = SoakRunner(tracker.analyze_current_activity, ticks=300, warmup=100, samples=5,
+                                    tolerance_mb=16).run()
+
+        assert passed, result
+        assert server.requests == 300
+        assert len(tracker.frame_spool) == 0
+        spans = tracker.db_manager.get_spans_by_date(date.today())
+        assert spans and sum(span['sample_count'] for span in spans) == 300
+    finally:
+        if tracker is not None:
+            tracker.image_encoder.shutdown()
+        server.stop()
@@ -0,0 +1,31 @@
+import time
+
+from PIL import Image
+
+from thumbnail_cache import ThumbnailLoader
+
+
+def wait_for(loader, requester, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        paths = loader.drain_completed(requester)
+        if paths:
+            return paths
+        time.sleep(0.01)
+    return []
+
+
+def test_completed_thumbnails_are_delivered_to_every_requester(config, tmp_path):
+    screenshot = str(tmp_path / 'shot.jpg')
+    Image.new('RGB', (1440, 900), 'navy').save(screenshot, 'JPEG')
+    loader = ThumbnailLoader(config)
+    first, second, closed = object(), object(), object()
+
+    for requester in (first, second, closed):
+        assert loader.request(screenshot, requester) is None
+    loader.forget(closed)
+
+    assert wait_for(loader, first) == [screenshot]
+    assert wait_for(loader, second) == [screenshot]
+    assert closed not in loader.completed
+    assert loader.request(screenshot, first).size[0] <= 240